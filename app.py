@@ -2,7 +2,14 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 from utils.storage import init_storage
-from utils.models import load_or_train_models
+from utils.retention import start_compaction_scheduler
+from utils.startup import start_import_warmup, get_import_timings
+from utils.models import load_or_train_models, start_model_warmup
+from utils.model_registry import get_model_registry
+from utils.model_bundle import get_current_version
+from utils.tuning import TUNING_BUDGET_SECONDS
+from utils.incremental import start_incremental_scheduler
+from utils.drift import start_drift_monitor
 
 # Page configuration
 st.set_page_config(
@@ -12,8 +19,13 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Initialize storage
+# Initialize storage, background history compaction, model updates, drift checks and library warm-up
 init_storage()
+start_compaction_scheduler()
+start_incremental_scheduler()
+start_drift_monitor()
+start_import_warmup()
+model_warmup = start_model_warmup()
 
 # Custom CSS for better dark theme
 st.markdown("""
@@ -44,6 +56,34 @@ def main():
     st.markdown('<h1 class="main-header">HeartSafe</h1>', unsafe_allow_html=True)
     st.markdown('<p style="text-align: center; font-size: 1.2rem; color: #FAFAFA;">AI-Powered Heart Disease Prediction & Health Management</p>', unsafe_allow_html=True)
     
+    # Model warm-up status
+    with st.sidebar:
+        if model_warmup.status in ("pending", "running"):
+            st.progress(model_warmup.progress, text=f"Warming up models: {model_warmup.message}")
+        elif model_warmup.duration is not None:
+            st.caption(f"{model_warmup.message} ({model_warmup.duration:.1f}s)")
+        
+        import_timings = get_import_timings()
+        if not import_timings.empty:
+            with st.expander("Library load times"):
+                st.dataframe(import_timings.style.format({'seconds': '{:.2f}'}), hide_index=True)
+        
+        registry = get_model_registry()
+        if registry.active_version:
+            st.caption(f"Model version: {registry.active_version}")
+        if registry.loading_version:
+            st.caption(f"Loading model version {registry.loading_version}...")
+        bundle = registry.get()
+        incremental = bundle.manifest.get('incremental') if bundle is not None else None
+        if incremental:
+            st.caption(f"Updated with {incremental['records']} new outcomes in {incremental['seconds']:.1f}s")
+            if incremental.get('estimated_full_retrain_seconds'):
+                st.caption(f"A full retrain is estimated (not measured) at about "
+                           f"{incremental['estimated_full_retrain_seconds']:.0f}s")
+            st.caption("Calibration, importances and dependence curves return with the next full retrain.")
+            if incremental['full_retrain_recommended']:
+                st.caption("Many outcomes added since the last full training; retraining is recommended.")
+    
     # Dataset upload section
     st.markdown("---")
     st.header("Dataset Management")
@@ -75,12 +115,24 @@ def main():
             st.subheader("Dataset Preview")
             st.dataframe(df.head())
             
+            # Optional hyperparameter search before training
+            tune = st.checkbox(
+                "Tune hyperparameters",
+                help="Search Random Forest and XGBoost settings with cross-validation before training. "
+                     "Results are saved, so retraining on the same dataset reuses the best settings."
+            )
+            tuning_budget = TUNING_BUDGET_SECONDS
+            if tune:
+                tuning_budget = st.slider("Tuning time budget (seconds)", 30, 600, TUNING_BUDGET_SECONDS, step=30)
+            
             # Train models with uploaded dataset
             if st.button("Train Prediction Models", type="primary"):
                 with st.spinner("Training models... This may take a few minutes."):
-                    models, accuracies, feature_names = load_or_train_models(df)
+                    models, accuracies, feature_names = load_or_train_models(df, tune=tune, tuning_budget=tuning_budget)
                     if models:
-                        st.session_state['models'] = models
+                        # Keep only the names: estimators are always served by the model registry,
+                        # so sessions pick up retrained versions instead of holding stale objects
+                        st.session_state['models'] = list(models)
                         st.session_state['model_accuracies'] = accuracies
                         st.session_state['feature_names'] = feature_names
                         st.success("Models trained successfully!")
@@ -94,6 +146,14 @@ def main():
                                 st.metric("Random Forest", f"{accuracies.get('random_forest', 0):.3f}")
                             with col3:
                                 st.metric("XGBoost", f"{accuracies.get('xgboost', 0):.3f}")
+                        
+                        # The registry swaps new versions in the background; wait so the settings shown are the new ones
+                        bundle = get_model_registry().wait_for_current()
+                        if bundle is not None and bundle.version != get_current_version():
+                            st.info("The new models are still loading and will be served shortly.")
+                        elif bundle is not None and bundle.manifest.get('hyperparameters'):
+                            with st.expander("Tuned hyperparameters"):
+                                st.json(bundle.manifest['hyperparameters'])
             
         except Exception as e:
             st.error(f"Error loading dataset: {str(e)}")
@@ -1,10 +1,15 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-from utils.models import make_prediction, get_risk_category, get_shap_explanation
-from utils.storage import save_vitals, save_prediction
+from datetime import datetime
+from utils.models import get_risk_category, get_shap_explanation, get_model_bundle, get_session_model_scores, map_feature_names
+from utils.drift import get_drift_monitor
+from utils.storage import save_vitals, save_prediction, submit_outcome, get_write_status
 from utils.visualizations import create_risk_gauge, create_shap_waterfall
 
+# Seconds to wait for the history writes before reporting them as still in progress
+WRITE_CONFIRM_TIMEOUT = 2.0
+
 st.set_page_config(page_title="Heart Disease Prediction", page_icon="H", layout="wide")
 
 st.title("Heart Disease Risk Prediction")
@@ -109,9 +114,10 @@ input_data = {
 st.markdown("---")
 model_choice = st.selectbox(
     "Select Prediction Model",
-    ["xgboost", "random_forest", "logistic"],
+    ["xgboost", "ensemble", "random_forest", "logistic"],
     format_func=lambda x: {
         "xgboost": "XGBoost (Recommended)",
+        "ensemble": "Stacked Ensemble",
         "random_forest": "Random Forest",
         "logistic": "Logistic Regression"
     }[x]
@@ -119,24 +125,41 @@ model_choice = st.selectbox(
 
 if st.button("Predict Risk", type="primary"):
     with st.spinner("Calculating risk..."):
-        # Make prediction
-        prediction, model = make_prediction(input_data, model_choice)
+        # Pin one model version for the whole request, even if a new one is swapped in meanwhile
+        bundle = get_model_bundle()
+        
+        # Score every model once; the chosen model's score is the prediction
+        model_scores = get_session_model_scores(input_data, bundle)
+        prediction = None
+        if model_scores:
+            # Bundles trained before the stacked model fall back to the average ensemble score
+            prediction = model_scores['scores'].get(
+                model_choice, model_scores['ensemble'] if model_choice == 'ensemble' else None
+            )
         
         if prediction is not None:
             risk_category = get_risk_category(prediction)
             
+            # Queue history writes; they are persisted by the background writer
+            # The prediction's timestamp also identifies it when a diagnosis is reported for it
+            prediction_date = datetime.now().isoformat()
+            vitals_offset = save_vitals(input_data, prediction, risk_category, background=True)
+            prediction_offset = save_prediction(model_choice, input_data, prediction, risk_category, background=True,
+                                                model_version=bundle.version, prediction_date=prediction_date)
+            # Live input and risk histograms for drift monitoring
+            get_drift_monitor().observe(bundle, map_feature_names(input_data), model_scores['scores'])
+            
             # Store results in session state
             st.session_state['latest_prediction'] = {
                 'score': prediction,
                 'category': risk_category,
                 'model': model_choice,
-                'input_data': input_data
+                'model_version': bundle.version,
+                'prediction_date': prediction_date,
+                'input_data': input_data,
+                'write_offsets': [vitals_offset, prediction_offset]
             }
             
-            # Save to database
-            save_vitals(input_data, prediction, risk_category)
-            save_prediction(model_choice, input_data, prediction, risk_category)
-            
             st.success("Prediction completed!")
             
             # Display results in columns
@@ -165,7 +188,7 @@ if st.button("Predict Risk", type="primary"):
                 st.subheader("Model Explanation")
                 
                 # Get SHAP explanation
-                shap_values = get_shap_explanation(input_data, model_choice)
+                shap_values = get_shap_explanation(input_data, model_choice, bundle)
                 
                 if shap_values is not None:
                     feature_names = list(input_data.keys())
@@ -192,34 +215,56 @@ if st.button("Predict Risk", type="primary"):
             st.markdown("---")
             st.subheader("All Model Predictions")
             
-            models = ["logistic", "random_forest", "xgboost"]
-            model_results = {}
-            
-            for model_name in models:
-                pred, _ = make_prediction(input_data, model_name)
-                if pred is not None:
-                    model_results[model_name] = {
-                        'score': pred,
-                        'category': get_risk_category(pred)
-                    }
-            
             # Display comparison table
+            latencies = bundle.manifest['metrics'].get('latency_ms', {})
             comparison_data = []
-            for model_name, result in model_results.items():
+            for model_name, score in model_scores['scores'].items():
                 comparison_data.append({
                     'Model': model_name.replace('_', ' ').title(),
-                    'Risk Score': f"{result['score']:.1%}",
-                    'Risk Category': result['category'],
-                    'Accuracy': f"{st.session_state.model_accuracies.get(model_name, 0):.3f}"
+                    'Risk Score': f"{score:.1%}",
+                    'Risk Category': get_risk_category(score),
+                    'Accuracy': f"{st.session_state.model_accuracies.get(model_name, 0):.3f}",
+                    'Latency': f"{latencies[model_name]:.2f} ms" if model_name in latencies else '-'
+                })
+            if 'ensemble' not in model_scores['scores']:
+                comparison_data.append({
+                    'Model': 'Ensemble (average)',
+                    'Risk Score': f"{model_scores['ensemble']:.1%}",
+                    'Risk Category': get_risk_category(model_scores['ensemble']),
+                    'Accuracy': '-',
+                    'Latency': '-'
                 })
             
             if comparison_data:
                 df_comparison = pd.DataFrame(comparison_data)
                 st.dataframe(df_comparison, use_container_width=True)
+            
+            # Confirm the queued history writes once the results are on screen
+            write_statuses = {get_write_status(offset, WRITE_CONFIRM_TIMEOUT)
+                              for offset in st.session_state['latest_prediction']['write_offsets']}
+            if write_statuses == {'saved'}:
+                st.caption("Saved to your history.")
+            elif 'failed' in write_statuses:
+                st.warning("This prediction could not be saved to your history.")
+            else:
+                st.caption("Saving to your history...")
         
         else:
             st.error("Unable to make prediction. Please check your input data and ensure models are trained.")
 
+# Reported diagnoses wait for a clinician's review; confirmed ones are folded into the models
+# by the scheduled incremental update
+latest_prediction = st.session_state.get('latest_prediction')
+if latest_prediction and latest_prediction.get('prediction_date'):
+    with st.expander("Report a diagnosis"):
+        st.write("If a clinician has confirmed or ruled out heart disease for the inputs of your latest "
+                 "prediction, report it here to help improve the models.")
+        confirmed = st.radio("Diagnosis", ["Heart disease confirmed", "No heart disease"], horizontal=True)
+        if st.button("Submit Diagnosis"):
+            submit_outcome(latest_prediction['input_data'], confirmed == "Heart disease confirmed",
+                           latest_prediction['prediction_date'])
+            st.success("Diagnosis submitted. It will be used in the next model update once a clinician confirms it.")
+
 # Quick actions
 st.markdown("---")
 st.subheader("Quick Actions")
@@ -3,10 +3,16 @@ import pandas as pd
 from utils.storage import get_vitals_history, get_community_stats
 from utils.visualizations import (
     create_risk_gauge, create_risk_trend_chart, create_vitals_correlation_matrix,
-    create_model_comparison_chart, create_age_risk_distribution, create_gender_risk_comparison
+    create_model_comparison_chart, create_age_risk_distribution, create_gender_risk_comparison,
+    create_dependence_chart
 )
-from utils.models import get_feature_importance
-import plotly.express as px
+from utils.models import (
+    get_feature_importance, get_permutation_importance_std, get_risk_category, get_model_bundle, map_feature_names
+)
+from utils.dependence import get_dependence_curves
+from utils.startup import lazy_import
+
+px = lazy_import('plotly.express')
 
 st.set_page_config(page_title="Health Dashboard", page_icon="H", layout="wide")
 
@@ -20,7 +26,9 @@ if 'latest_prediction' not in st.session_state:
     st.stop()
 
 # Get data
-vitals_history = get_vitals_history()
+TREND_COLUMNS = ['date_recorded', 'age', 'resting_bp', 'cholesterol', 'max_heart_rate', 'st_depression', 'prediction_result']
+vitals_history = get_vitals_history(columns=TREND_COLUMNS)
+recent_vitals = get_vitals_history(limit=10)
 community_stats = get_community_stats()
 
 # Dashboard header with key metrics
@@ -52,9 +60,9 @@ with col3:
     )
 
 with col4:
-    if not vitals_history.empty and len(vitals_history) > 1:
-        current_risk = vitals_history.iloc[0]['prediction_result']
-        previous_risk = vitals_history.iloc[1]['prediction_result']
+    if len(recent_vitals) > 1:
+        current_risk = recent_vitals.iloc[0]['prediction_result']
+        previous_risk = recent_vitals.iloc[1]['prediction_result']
         change = current_risk - previous_risk
         st.metric(
             "Risk Change", 
@@ -76,10 +84,10 @@ with col1:
     st.plotly_chart(fig, use_container_width=True)
     
     # Risk interpretation
-    risk_score = latest_prediction['score']
-    if risk_score < 0.3:
+    risk_level = get_risk_category(latest_prediction['score'])
+    if risk_level == "Low Risk":
         st.success("Low Risk: Continue maintaining healthy lifestyle habits.")
-    elif risk_score < 0.7:
+    elif risk_level == "Medium Risk":
         st.warning("Medium Risk: Consider implementing preventive measures.")
     else:
         st.error("High Risk: Recommend immediate consultation with healthcare provider.")
@@ -98,16 +106,28 @@ col1, col2 = st.columns(2)
 
 with col1:
     st.subheader("Feature Importance")
-    feature_names, importances = get_feature_importance(latest_prediction['model'])
+    importance_method = st.radio(
+        "Importance measure",
+        ["permutation", "shap"],
+        format_func=lambda x: {"permutation": "Permutation (AUC drop)", "shap": "Mean |SHAP|"}[x],
+        horizontal=True
+    )
+    # Precomputed at training time and read from the model bundle
+    feature_names, importances = get_feature_importance(latest_prediction['model'], method=importance_method)
     
     if feature_names and importances is not None:
         # Create feature importance chart
         from utils.visualizations import create_feature_importance_chart
-        fig = create_feature_importance_chart(feature_names, importances)
+        if importance_method == "permutation":
+            errors = get_permutation_importance_std(latest_prediction['model'])
+            xaxis_title = "Drop in ROC AUC when shuffled" if errors is not None else "Importance Score"
+        else:
+            errors, xaxis_title = None, "Mean |SHAP value|"
+        fig = create_feature_importance_chart(feature_names, importances, errors, xaxis_title)
         if fig:
             st.plotly_chart(fig, use_container_width=True)
     else:
-        st.info("Feature importance data not available")
+        st.info("Feature importance not computed for the current model version. Retrain the models on the main page to compute it.")
 
 with col2:
     st.subheader("Risk Factors Analysis")
@@ -150,6 +170,21 @@ with col2:
         for factor in protective_factors:
             st.write(f"• {factor}")
 
+# Effect of each factor, from curves precomputed with the model bundle
+bundle = get_model_bundle()
+mapped_input = map_feature_names(input_data)
+model_feature_names = dict(zip(input_data, mapped_input))
+if bundle is not None and get_dependence_curves(bundle, latest_prediction['model'], bundle.feature_names[0]) is not None:
+    st.subheader("How Each Factor Affects Your Risk")
+    factor = st.selectbox(
+        "Factor",
+        [name for name in input_data if model_feature_names[name] in bundle.feature_names],
+        format_func=lambda x: x.replace('_', ' ').title()
+    )
+    curves = get_dependence_curves(bundle, latest_prediction['model'], model_feature_names[factor], mapped_input)
+    fig = create_dependence_chart(curves, factor.replace('_', ' ').title(), input_data[factor], latest_prediction['score'])
+    st.plotly_chart(fig, use_container_width=True)
+
 # Row 3: Trends and History
 if not vitals_history.empty:
     st.markdown("---")
@@ -174,9 +209,6 @@ if not vitals_history.empty:
     # Vitals summary table
     st.subheader("Recent Vitals Summary")
     
-    # Display recent entries
-    recent_vitals = vitals_history.head(10)
-    
     # Select and format columns for display
     display_columns = ['date_recorded', 'age', 'resting_bp', 'cholesterol', 'max_heart_rate', 'prediction_result', 'risk_category']
     available_columns = [col for col in display_columns if col in recent_vitals.columns]
@@ -218,9 +250,9 @@ st.subheader("Key Insights")
 insights = []
 
 # Risk trend insight
-if not vitals_history.empty and len(vitals_history) > 1:
-    current_risk = vitals_history.iloc[0]['prediction_result']
-    previous_risk = vitals_history.iloc[1]['prediction_result']
+if len(recent_vitals) > 1:
+    current_risk = recent_vitals.iloc[0]['prediction_result']
+    previous_risk = recent_vitals.iloc[1]['prediction_result']
     
     if current_risk > previous_risk:
         insights.append(" Your risk score has increased since last assessment. Consider reviewing your lifestyle factors.")
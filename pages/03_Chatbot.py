@@ -1,5 +1,6 @@
 import streamlit as st
-from utils.chatbot import initialize_chatbot, add_to_chat_history, display_chat_history, get_contextual_suggestions
+from utils.chatbot import initialize_chatbot, add_to_chat_history, display_chat_history, get_contextual_suggestions, reset_chat_history
+from utils.storage import count_chat_messages
 
 st.set_page_config(page_title="AI Health Chatbot", page_icon="H", layout="wide")
 
@@ -12,6 +13,29 @@ initialize_chatbot()
 # Main chat interface
 col1, col2 = st.columns([3, 1])
 
+def stream_reply(user_message, chunks):
+    """Show a user message and stream the assistant's reply into the chat, then save both"""
+    add_to_chat_history("user", user_message)
+    
+    with chat_container:
+        with st.chat_message("user"):
+            st.write(user_message)
+        
+        with st.chat_message("assistant"):
+            response_placeholder = st.empty()
+            
+            # Stream response
+            response_text = ""
+            for chunk in chunks:
+                response_text += chunk
+                response_placeholder.markdown(response_text)
+            
+            timing = st.session_state.chatbot.stream_metrics[-1]
+            st.caption(f"First chunk in {timing['first_chunk_ms']:.1f} ms, complete in {timing['total_ms']:.1f} ms")
+    
+    # Add assistant response to history
+    add_to_chat_history("assistant", response_text)
+
 with col1:
     st.subheader("Chat with HeartSafe AI")
     
@@ -24,13 +48,6 @@ with col1:
         
         # Chat input
         if prompt := st.chat_input("Ask me anything about heart health..."):
-            # Add user message to history
-            add_to_chat_history("user", prompt)
-            
-            # Display user message
-            with st.chat_message("user"):
-                st.write(prompt)
-            
             # Generate context from latest prediction if available
             context = None
             if 'latest_prediction' in st.session_state:
@@ -43,18 +60,7 @@ with col1:
                 Cholesterol {latest['input_data'].get('cholesterol')}
                 """
             
-            # Generate and display AI response
-            with st.chat_message("assistant"):
-                response_placeholder = st.empty()
-                
-                # Stream response
-                response_text = ""
-                for chunk in st.session_state.chatbot.stream_response(prompt, context):
-                    response_text += chunk
-                    response_placeholder.write(response_text)
-                
-                # Add assistant response to history
-                add_to_chat_history("assistant", response_text)
+            stream_reply(prompt, st.session_state.chatbot.stream_response(prompt, context))
 
 with col2:
     st.subheader("Quick Questions")
@@ -105,15 +111,11 @@ with col2:
             if input_data.get('resting_bp', 0) > 140:
                 top_factors.append("High Blood Pressure")
             
-            explanation = st.session_state.chatbot.get_prediction_explanation(
-                latest['score'], 
-                latest['category'], 
-                top_factors
-            )
-            
-            add_to_chat_history("user", "Please explain my heart disease prediction")
-            add_to_chat_history("assistant", explanation)
-            st.rerun()
+            chatbot = st.session_state.chatbot
+            stream_reply("Please explain my heart disease prediction", chatbot.stream_parts(
+                chatbot.iter_prediction_explanation(latest['score'], latest['category'], top_factors),
+                label="Explain My Prediction"
+            ))
         else:
             st.warning("Make a prediction first to get an explanation.")
     
@@ -151,11 +153,9 @@ with col2:
     
     if st.button("Analyze Symptoms", use_container_width=True):
         if symptoms:
-            response = st.session_state.chatbot.get_symptom_guidance(symptoms)
-            
-            add_to_chat_history("user", f"I'm experiencing: {symptoms}")
-            add_to_chat_history("assistant", response)
-            st.rerun()
+            chatbot = st.session_state.chatbot
+            stream_reply(f"I'm experiencing: {symptoms}",
+                         chatbot.stream_parts(chatbot.iter_symptom_guidance(symptoms), label="Analyze Symptoms"))
         else:
             st.warning("Please describe your symptoms first.")
 
@@ -165,17 +165,21 @@ col1, col2, col3 = st.columns(3)
 
 with col1:
     if st.button("Clear Chat History"):
-        st.session_state.chat_history = []
+        reset_chat_history()
         st.success("Chat history cleared!")
         st.rerun()
 
 with col2:
-    total_messages = len(st.session_state.get('chat_history', []))
+    total_messages = count_chat_messages(exact=False)
     st.metric("Total Messages", total_messages)
 
 with col3:
     user_messages = len([msg for msg in st.session_state.get('chat_history', []) if msg['role'] == 'user'])
-    st.metric("Your Messages", user_messages)
+    st.metric("Your Recent Messages", user_messages)
+
+cache_stats = st.session_state.chatbot.response_cache.stats()
+st.caption(f"Response cache: {cache_stats['size']} entries, {cache_stats['hit_rate']:.0%} hit rate "
+           f"({cache_stats['hits']} hits / {cache_stats['misses']} misses)")
 
 # Help section
 with st.expander("How to use the AI Chatbot"):
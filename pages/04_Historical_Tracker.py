@@ -1,10 +1,14 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
 from utils.storage import get_vitals_history, get_predictions_history
+from utils.retention import get_vitals_trend
+from utils.models import categorize_risk
 from utils.visualizations import create_risk_trend_chart, create_vitals_correlation_matrix
 from datetime import datetime, timedelta
 import numpy as np
+from utils.startup import lazy_import
+
+px = lazy_import('plotly.express')
 
 st.set_page_config(page_title="Historical Health Tracker", page_icon="H", layout="wide")
 
@@ -12,10 +16,10 @@ st.title("Historical Health Tracker")
 st.markdown("Track your health metrics and risk predictions over time.")
 
 # Get historical data
-vitals_history = get_vitals_history()
+latest_record = get_vitals_history(limit=1)
 predictions_history = get_predictions_history()
 
-if vitals_history.empty:
+if latest_record.empty:
     st.info("No historical data available yet. Make some predictions to start tracking your health trends!")
     if st.button("Make Your First Prediction"):
         st.switch_page("pages/01_Prediction.py")
@@ -43,12 +47,14 @@ with col2:
     else:
         start_date = datetime(2020, 1, 1)  # All time
     
-    st.metric("Records Found", len(vitals_history))
+    # Only the selected window is read from storage
+    filtered_data = get_vitals_history(since=start_date, until=end_date)
+    st.metric("Records Found", len(filtered_data))
 
 with col3:
     # Export option
     if st.button("Export Data"):
-        csv = vitals_history.to_csv(index=False)
+        csv = get_vitals_history().to_csv(index=False)
         st.download_button(
             label="Download CSV",
             data=csv,
@@ -56,15 +62,15 @@ with col3:
             mime="text/csv"
         )
 
-# Filter data by date range
-if 'date_recorded' in vitals_history.columns:
-    vitals_history['date_recorded'] = pd.to_datetime(vitals_history['date_recorded'])
-    filtered_data = vitals_history[
-        (vitals_history['date_recorded'] >= start_date) & 
-        (vitals_history['date_recorded'] <= end_date)
-    ]
-else:
-    filtered_data = vitals_history
+# Parse record dates for charts and display
+if 'date_recorded' in filtered_data.columns:
+    filtered_data['date_recorded'] = pd.to_datetime(filtered_data['date_recorded'])
+
+# Categorize all scores in one vectorized pass
+filtered_risk_categories = categorize_risk(filtered_data.get('prediction_result', pd.Series(dtype=float)))
+
+# Trend charts read roll-ups for ranges beyond the raw retention window
+trend_data = get_vitals_trend(since=start_date, until=end_date)
 
 # Main dashboard
 st.markdown("---")
@@ -94,7 +100,7 @@ with col2:
 
 with col3:
     if not filtered_data.empty:
-        high_risk_count = sum(filtered_data['prediction_result'] > 0.7)
+        high_risk_count = int((filtered_risk_categories == "High Risk").sum())
         st.metric("High Risk Days", high_risk_count)
     else:
         st.metric("High Risk Days", "N/A")
@@ -110,8 +116,8 @@ st.subheader("Risk Score Trends")
 col1, col2 = st.columns(2)
 
 with col1:
-    if not filtered_data.empty:
-        fig = create_risk_trend_chart(filtered_data)
+    if not trend_data.empty:
+        fig = create_risk_trend_chart(trend_data)
         if fig:
             st.plotly_chart(fig, use_container_width=True)
         else:
@@ -122,16 +128,8 @@ with col1:
 with col2:
     if not filtered_data.empty and len(filtered_data) > 5:
         # Risk category distribution
-        risk_categories = []
-        for risk_score in filtered_data['prediction_result']:
-            if risk_score < 0.3:
-                risk_categories.append("Low Risk")
-            elif risk_score < 0.7:
-                risk_categories.append("Medium Risk")
-            else:
-                risk_categories.append("High Risk")
-        
-        category_counts = pd.Series(risk_categories).value_counts()
+        category_counts = filtered_risk_categories.value_counts()
+        category_counts = category_counts[category_counts > 0]
         
         fig = px.pie(
             values=category_counts.values,
@@ -156,10 +154,10 @@ with col2:
 st.markdown("---")
 st.subheader("Vitals Trends Over Time")
 
-if not filtered_data.empty:
+if not trend_data.empty:
     # Select vitals to display
     vital_options = [col for col in ['resting_bp', 'cholesterol', 'max_heart_rate', 'age'] 
-                    if col in filtered_data.columns]
+                    if col in trend_data.columns]
     
     selected_vitals = st.multiselect(
         "Select vitals to display:",
@@ -170,7 +168,7 @@ if not filtered_data.empty:
     if selected_vitals:
         # Create subplots for selected vitals
         fig_vitals = px.line(
-            filtered_data, 
+            trend_data, 
             x='date_recorded', 
             y=selected_vitals,
             title="Vitals Trends",
@@ -229,12 +227,7 @@ with col2:
 display_data = filtered_data.copy()
 
 if risk_filter != "All":
-    if risk_filter == "Low Risk":
-        display_data = display_data[display_data['prediction_result'] < 0.3]
-    elif risk_filter == "Medium Risk":
-        display_data = display_data[(display_data['prediction_result'] >= 0.3) & (display_data['prediction_result'] < 0.7)]
-    else:  # High Risk
-        display_data = display_data[display_data['prediction_result'] >= 0.7]
+    display_data = display_data[filtered_risk_categories == risk_filter]
 
 # Format data for display
 if not display_data.empty:
@@ -1,9 +1,10 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-from utils.models import make_prediction, get_risk_category
-from utils.visualizations import create_risk_gauge
-import plotly.graph_objects as go
+from utils.models import make_prediction, get_risk_category, get_model_bundle, map_feature_names
+from utils.dependence import get_dependence_curves
+from utils.cohort import SUBGROUPS, CONDITION_OPERATORS, simulate_cohort, iter_vitals_cohort, iter_csv_cohort
+from utils.visualizations import create_risk_gauge, create_dependence_chart, create_risk_shift_chart
 from copy import deepcopy
 
 st.set_page_config(page_title="What-If Scenario Simulator", page_icon="H", layout="wide")
@@ -16,6 +17,12 @@ if 'models' not in st.session_state:
     st.warning("Please upload and train models on the main page first.")
     st.stop()
 
+# Simulate with the model of the latest prediction, else the default one, so risks and curves agree
+bundle = get_model_bundle()
+simulation_model = st.session_state.get('latest_prediction', {}).get('model', 'xgboost')
+if bundle is not None and simulation_model not in bundle.models:
+    simulation_model = 'xgboost'
+
 # Get baseline data from latest prediction or use default
 if 'latest_prediction' in st.session_state:
     baseline_data = st.session_state['latest_prediction']['input_data'].copy()
@@ -38,7 +45,7 @@ else:
         'ca': 0,
         'thal': 2
     }
-    baseline_risk, _ = make_prediction(baseline_data)
+    baseline_risk, _ = make_prediction(baseline_data, simulation_model)
     st.info("Using default baseline data. Make a prediction first for personalized simulation.")
 
 # Initialize simulation data
@@ -207,7 +214,7 @@ with col2:
     st.subheader("Live Risk Assessment")
     
     # Calculate current risk
-    current_risk, _ = make_prediction(st.session_state.simulation_data)
+    current_risk, _ = make_prediction(st.session_state.simulation_data, simulation_model)
     
     if current_risk is not None:
         # Risk gauge
@@ -253,7 +260,7 @@ with col1:
             'chest_pain_type': 4  # Asymptomatic
         })
         
-        optimal_risk, _ = make_prediction(optimal_data)
+        optimal_risk, _ = make_prediction(optimal_data, simulation_model)
         if optimal_risk is not None:
             st.success(f"Optimal Risk: {optimal_risk:.1%}")
             improvement = baseline_risk - optimal_risk
@@ -269,7 +276,7 @@ with col2:
             'fasting_blood_sugar': 0
         })
         
-        improved_risk, _ = make_prediction(improved_data)
+        improved_risk, _ = make_prediction(improved_data, simulation_model)
         if improved_risk is not None:
             st.info(f"Improved Risk: {improved_risk:.1%}")
             improvement = baseline_risk - improved_risk
@@ -286,54 +293,37 @@ st.subheader("Factor Impact Analysis")
 
 st.markdown("See how individual factors affect your risk when changed in isolation:")
 
-# Calculate individual factor impacts
-factor_impacts = {}
-factors_to_test = {
-    'resting_bp': [(100, 'Optimal BP'), (120, 'Normal BP'), (140, 'High BP'), (160, 'Very High BP')],
-    'cholesterol': [(150, 'Optimal'), (200, 'Good'), (240, 'Borderline'), (280, 'High')],
-    'max_heart_rate': [(120, 'Poor Fitness'), (140, 'Fair'), (160, 'Good'), (180, 'Excellent')],
-    'exercise_angina': [(0, 'No Angina'), (1, 'With Angina')]
-}
-
-for factor, values in factors_to_test.items():
-    factor_risks = []
-    factor_labels = []
-    
-    for value, label in values:
-        test_data = deepcopy(baseline_data)
-        test_data[factor] = value
-        
-        test_risk, _ = make_prediction(test_data)
-        if test_risk is not None:
-            factor_risks.append(test_risk * 100)
-            factor_labels.append(label)
-    
-    if factor_risks:
-        factor_impacts[factor] = (factor_labels, factor_risks)
+# Curves are precomputed with the model bundle; only your position is placed on them here
+sim_data = st.session_state.simulation_data
+mapped_sim_data = map_feature_names(sim_data)
+model_feature_names = dict(zip(sim_data, mapped_sim_data))
+factors_to_show = ['resting_bp', 'cholesterol', 'max_heart_rate', 'exercise_angina', 'st_depression', 'age']
+
+factor_curves = {}
+for factor in factors_to_show:
+    curves = get_dependence_curves(bundle, simulation_model, model_feature_names[factor], mapped_sim_data) if bundle else None
+    if curves is not None:
+        factor_curves[factor] = curves
 
 # Display impact charts
-if factor_impacts:
+if factor_curves:
+    show_individual = st.checkbox("Show individual patient curves", value=True)
     cols = st.columns(2)
     
-    for i, (factor, (labels, risks)) in enumerate(factor_impacts.items()):
+    for i, (factor, curves) in enumerate(factor_curves.items()):
         col_idx = i % 2
         
         with cols[col_idx]:
-            fig = go.Figure(data=[
-                go.Bar(x=labels, y=risks, marker_color='lightcoral')
-            ])
-            
-            fig.update_layout(
-                title=f"Impact of {factor.replace('_', ' ').title()}",
-                xaxis_title=factor.replace('_', ' ').title(),
-                yaxis_title="Risk (%)",
-                paper_bgcolor="rgba(0,0,0,0)",
-                plot_bgcolor="rgba(0,0,0,0)",
-                font={'color': "white"},
-                height=300
-            )
-            
+            if not show_individual:
+                curves = {**curves, 'ice': curves['ice'][:0]}
+            fig = create_dependence_chart(curves, factor.replace('_', ' ').title(), sim_data[factor], current_risk)
             st.plotly_chart(fig, use_container_width=True)
+    
+    st.caption("The solid line is the average effect of each factor across training patients, with every other "
+               "factor left as it was; faint lines are individual patients, and the dashed line follows the "
+               "patient most similar to you.")
+else:
+    st.info("Factor impact curves are computed when the models are trained. Retrain the models on the main page to enable them.")
 
 # Recommendations based on simulation
 st.markdown("---")
@@ -342,7 +332,7 @@ st.subheader("Personalized Recommendations")
 recommendations = []
 
 # Analyze current simulation vs baseline
-current_risk, _ = make_prediction(st.session_state.simulation_data)
+current_risk, _ = make_prediction(st.session_state.simulation_data, simulation_model)
 
 if current_risk is not None:
     sim_data = st.session_state.simulation_data
@@ -388,6 +378,118 @@ if recommendations:
 else:
     st.success("Your current parameters look good! Continue maintaining healthy lifestyle habits.")
 
+# Cohort simulation
+st.markdown("---")
+st.subheader("Cohort Simulation")
+st.markdown("Apply the same changes to a whole population and see how its risk distribution shifts, "
+            "for example everyone lowering their blood pressure by 10 mmHg.")
+
+cohort_source = st.radio("Cohort", ["Stored vitals history", "Upload a CSV"], horizontal=True)
+cohort_file = None
+if cohort_source == "Upload a CSV":
+    cohort_file = st.file_uploader(
+        "Cohort CSV with the prediction inputs as columns (app names such as resting_bp, or dataset names such as trestbps)",
+        type=['csv']
+    )
+
+factor_options = list(baseline_data.keys())
+operation_labels = {'add': "Add", 'multiply': "Multiply by", 'set': "Set to", 'at_most': "At most", 'at_least': "At least"}
+rules_table = st.data_editor(
+    pd.DataFrame([{'factor': 'resting_bp', 'change': 'add', 'amount': -10.0,
+                   'only_if': None, 'comparison': None, 'threshold': np.nan}]),
+    num_rows="dynamic",
+    use_container_width=True,
+    column_config={
+        'factor': st.column_config.SelectboxColumn("Factor", options=factor_options, required=True),
+        'change': st.column_config.SelectboxColumn("Change", options=list(operation_labels), required=True,
+                                                   help=", ".join(f"{key}: {label}" for key, label in operation_labels.items())),
+        'amount': st.column_config.NumberColumn("Amount", required=True),
+        'only_if': st.column_config.SelectboxColumn("Only if", options=factor_options,
+                                                    help="Optionally limit the change to people matching a condition"),
+        'comparison': st.column_config.SelectboxColumn("Comparison", options=list(CONDITION_OPERATORS)),
+        'threshold': st.column_config.NumberColumn("Threshold")
+    }
+)
+
+col1, col2 = st.columns([1, 3])
+with col1:
+    cohort_bundle = get_model_bundle()
+    cohort_models = list(cohort_bundle.models) if cohort_bundle else ['xgboost']
+    cohort_model = st.selectbox("Model", cohort_models,
+                                index=cohort_models.index(simulation_model) if simulation_model in cohort_models else 0,
+                                format_func=lambda x: x.replace('_', ' ').title())
+
+if st.button("Run Cohort Simulation", type="primary"):
+    interventions = []
+    for rule in rules_table.dropna(subset=['factor', 'change', 'amount']).to_dict('records'):
+        intervention = {'feature': rule['factor'], 'operation': rule['change'], 'value': rule['amount']}
+        if pd.notna(rule['only_if']) and pd.notna(rule['comparison']) and pd.notna(rule['threshold']):
+            intervention['where'] = {'feature': rule['only_if'], 'operator': rule['comparison'], 'value': rule['threshold']}
+        interventions.append(intervention)
+    
+    if cohort_bundle is None:
+        st.warning("Please upload and train models on the main page first.")
+    elif not interventions:
+        st.warning("Add at least one change to simulate.")
+    elif cohort_source == "Upload a CSV" and cohort_file is None:
+        st.warning("Upload a cohort CSV first.")
+    else:
+        chunks = iter_csv_cohort(cohort_file) if cohort_file is not None else iter_vitals_cohort()
+        progress = st.empty()
+        partial = st.empty()
+        summary = None
+        try:
+            # Partial results are shown while the rest of the cohort is still being scored
+            for summary in simulate_cohort(chunks, interventions, cohort_model, cohort_bundle):
+                progress.caption(f"Scored {summary.rows:,} people in {summary.seconds:.1f} s "
+                                 f"({summary.rows / max(summary.seconds, 1e-9):,.0f} per second)...")
+                partial.dataframe(summary.table('All'), use_container_width=True, hide_index=True)
+        except ValueError as e:
+            st.error(f"Cohort simulation failed: {e}")
+            summary = None
+        progress.empty()
+        partial.empty()
+        if summary is None or summary.rows == 0:
+            st.session_state.pop('cohort_summary', None)
+            st.info("No complete records found in the cohort.")
+        else:
+            st.session_state['cohort_summary'] = summary
+
+if 'cohort_summary' in st.session_state:
+    summary = st.session_state['cohort_summary']
+    col1, col2, col3, col4 = st.columns(4)
+    overall = summary.table('All').iloc[0]
+    with col1:
+        st.metric("People", f"{summary.rows:,}")
+    with col2:
+        st.metric("Affected by the changes", f"{summary.changed_rows / summary.rows:.1%}")
+    with col3:
+        st.metric("Average Risk", f"{overall['scenario_risk']:.1%}", delta=f"{overall['risk_change']:.1%}", delta_color="inverse")
+    with col4:
+        st.metric("High Risk Share", f"{overall['scenario_high_risk']:.1%}",
+                  delta=f"{overall['scenario_high_risk'] - overall['baseline_high_risk']:.1%}", delta_color="inverse")
+    st.caption(f"{summary.rows:,} people scored in {summary.seconds:.1f} s"
+               + (f"; {summary.skipped_rows:,} incomplete records skipped." if summary.skipped_rows else "."))
+    
+    subgroup = st.selectbox("Break down by", [name for name in SUBGROUPS if name != 'All'])
+    table = summary.table(subgroup)
+    col1, col2 = st.columns([3, 2])
+    with col1:
+        display_table = table.rename(columns={
+            'group': subgroup, 'rows': "People", 'baseline_risk': "Current Risk", 'scenario_risk': "New Risk",
+            'risk_change': "Change", 'baseline_high_risk': "Current High Risk", 'scenario_high_risk': "New High Risk",
+            'improved': "Moved to Lower Category", 'worsened': "Moved to Higher Category"
+        })
+        percent_columns = [column for column in display_table.columns if column not in (subgroup, "People")]
+        st.dataframe(display_table.style.format({column: "{:.1%}" for column in percent_columns}),
+                     use_container_width=True, hide_index=True)
+    with col2:
+        group = st.selectbox("Distribution for", ['All'] + list(table['group']))
+        edges, baseline_counts, scenario_counts = summary.distribution(*(('All', 'All') if group == 'All' else (subgroup, group)))
+        fig = create_risk_shift_chart(edges, baseline_counts, scenario_counts, title=f"Risk Distribution: {group}")
+        if fig:
+            st.plotly_chart(fig, use_container_width=True)
+
 # Action buttons
 st.markdown("---")
 col1, col2, col3 = st.columns(3)
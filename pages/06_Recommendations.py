@@ -3,7 +3,9 @@ import pandas as pd
 import numpy as np
 from utils.storage import get_vitals_history, save_vitals
 from utils.models import get_risk_category
-import plotly.express as px
+from utils.startup import lazy_import
+
+px = lazy_import('plotly.express')
 
 st.set_page_config(page_title="Health Recommendations", page_icon="H", layout="wide")
 
@@ -31,7 +33,7 @@ with col1:
 with col2:
     st.metric("Risk Category", risk_category)
 with col3:
-    priority_level = "HIGH" if risk_score > 0.7 else "MEDIUM" if risk_score > 0.3 else "LOW"
+    priority_level = {"High Risk": "HIGH", "Medium Risk": "MEDIUM", "Low Risk": "LOW"}[get_risk_category(risk_score)]
     st.metric("Priority Level", priority_level)
 
 # Risk-based alert
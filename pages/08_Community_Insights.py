@@ -1,11 +1,14 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-from utils.storage import get_community_stats, get_vitals_history, get_predictions_history
+from utils.storage import get_community_stats, get_community_vitals, get_community_predictions
 from utils.visualizations import create_age_risk_distribution, create_gender_risk_comparison
-import plotly.express as px
-import plotly.graph_objects as go
+from utils.models import categorize_risk
 from datetime import datetime, timedelta
+from utils.startup import lazy_import
+
+px = lazy_import('plotly.express')
+go = lazy_import('plotly.graph_objects')
 
 st.set_page_config(page_title="Community Health Insights", page_icon="H", layout="wide")
 
@@ -14,11 +17,11 @@ st.markdown("Explore anonymized health trends and compare your risk profile with
 
 # Get community data
 age_stats, gender_stats = get_community_stats()
-vitals_history = get_vitals_history()
-predictions_history = get_predictions_history()
+vitals_history = get_community_vitals()
+predictions_history = get_community_predictions(columns=['model_used', 'prediction_score'])
 
 # Check if we have enough data for community insights
-total_users = len(vitals_history['id'].unique()) if not vitals_history.empty else 0
+total_users = vitals_history['user_id'].nunique() if not vitals_history.empty else 0
 
 if total_users < 5:
     st.info("Community insights will be available when more users contribute data. Your data helps create valuable insights while maintaining complete privacy.")
@@ -115,9 +118,7 @@ if not vitals_history.empty:
     st.subheader("Detailed Community Statistics")
     
     # Create risk categories
-    vitals_history['risk_category'] = vitals_history['prediction_result'].apply(
-        lambda x: 'Low Risk' if x < 0.3 else 'Medium Risk' if x < 0.7 else 'High Risk'
-    )
+    vitals_history['risk_category'] = categorize_risk(vitals_history['prediction_result'])
     
     col1, col2 = st.columns(2)
     
@@ -77,10 +77,10 @@ with col2:
 st.markdown("---")
 st.subheader("Report Preview")
 
-def get_filtered_data(vitals_df, date_range):
-    """Filter data based on selected date range"""
-    if vitals_df.empty or date_range == "All available data":
-        return vitals_df
+def get_filtered_data(date_range, limit=None):
+    """Load vitals for the selected date range"""
+    if date_range == "All available data":
+        return get_vitals_history(limit=limit)
     
     current_date = datetime.now()
     
@@ -91,11 +91,10 @@ def get_filtered_data(vitals_df, date_range):
     else:  # Last year
         cutoff_date = current_date - pd.DateOffset(years=1)
     
-    vitals_df['date_recorded'] = pd.to_datetime(vitals_df['date_recorded'])
-    return vitals_df[vitals_df['date_recorded'] >= cutoff_date]
+    return get_vitals_history(limit=limit, since=cutoff_date)
 
 # Filter data based on selection
-filtered_vitals = get_filtered_data(vitals_history, date_range)
+filtered_vitals = get_filtered_data(date_range)
 
 # Show what will be included
 with st.expander("Report Contents Preview", expanded=True):
@@ -208,17 +207,19 @@ recommendations = generate_report_recommendations(
 prediction_results = {}
 
 # Get predictions for all models if available
+model_scores = None
 if 'model_accuracies' in st.session_state:
-    from utils.models import make_prediction
+    from utils.models import get_session_model_scores
     
-    models = ['logistic', 'random_forest', 'xgboost']
-    for model_name in models:
-        pred, _ = make_prediction(user_data, model_name)
-        if pred is not None:
-            prediction_results[model_name] = {
-                'score': pred,
-                'category': get_risk_category(pred)
-            }
+    # Reuses the scores computed on the Prediction page for this input
+    model_scores = get_session_model_scores(user_data)
+
+if model_scores:
+    for model_name, score in model_scores['scores'].items():
+        prediction_results[model_name] = {
+            'score': score,
+            'category': get_risk_category(score)
+        }
 else:
     # Use current prediction only
     prediction_results[latest_prediction['model']] = {
@@ -255,8 +256,8 @@ with col2:
     if st.button("Generate PDF Report", type="primary"):
         with st.spinner("Generating your health report..."):
             try:
-                # Prepare data for PDF generation
-                pdf_vitals = filtered_vitals if include_vitals else pd.DataFrame()
+                # Prepare data for PDF generation (the report only lists the latest entries)
+                pdf_vitals = get_filtered_data(date_range, limit=5) if include_vitals else pd.DataFrame()
                 
                 # Generate PDF
                 pdf_buffer = generate_health_report(
@@ -1,7 +1,5 @@
 import streamlit as st
 import pandas as pd
-import plotly.graph_objects as go
-import plotly.express as px
 from datetime import datetime, timedelta
 import sys
 import os
@@ -10,6 +8,10 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.storage import (
     init_storage, save_mental_health, get_mental_health_history, get_vitals_history
 )
+from utils.startup import lazy_import
+
+go = lazy_import('plotly.graph_objects')
+px = lazy_import('plotly.express')
 
 st.set_page_config(page_title="Mental Health - HeartSafe", layout="wide")
 
@@ -205,7 +207,7 @@ with tab3:
     st.markdown("### Correlation Between Mental Health and Heart Risk")
     
     mental_health_df = get_mental_health_history()
-    vitals_df = get_vitals_history()
+    vitals_df = get_vitals_history(columns=['date_recorded', 'prediction_result', 'resting_bp', 'max_heart_rate'])
     
     if not mental_health_df.empty and not vitals_df.empty:
         mental_health_df['date_recorded'] = pd.to_datetime(mental_health_df['date_recorded']).dt.date
@@ -0,0 +1,109 @@
+import json
+import streamlit as st
+import pandas as pd
+import numpy as np
+from utils.models import get_model_bundle
+from utils.storage import verify_reviewer_key
+from utils.drift import get_drift_monitor, run_drift_check, export_metrics, DRIFT_INTERVAL, RISK_BIN_EDGES
+from utils.startup import lazy_import
+
+go = lazy_import('plotly.graph_objects')
+
+st.set_page_config(page_title="Model Monitoring", page_icon="H", layout="wide")
+
+st.title("Model Monitoring")
+st.markdown("Compare the inputs and risk scores seen in production with the data the models were trained on.")
+
+# Drift statistics describe other users' inputs, so the page is for clinicians and admins like outcome review
+if not verify_reviewer_key(st.session_state.get('reviewer_key')):
+    key = st.text_input("Reviewer key", type="password",
+                        help="Print it with: python -c \"from utils.storage import reviewer_access_key; "
+                             "print(reviewer_access_key())\"")
+    if not verify_reviewer_key(key):
+        if key:
+            st.error("Invalid reviewer key.")
+        st.stop()
+    st.session_state['reviewer_key'] = key
+
+bundle = get_model_bundle()
+if bundle is None:
+    st.warning("No trained models yet. Upload a dataset and train the models on the main page.")
+    st.stop()
+
+if 'drift' not in bundle.manifest:
+    st.info("This model version was trained before drift monitoring was added. Retrain the models on the main page to enable it.")
+    st.stop()
+
+monitor = get_drift_monitor()
+
+col1, col2 = st.columns([3, 1])
+with col1:
+    st.caption(f"Model version: {bundle.version}")
+with col2:
+    if st.button("Recompute now"):
+        run_drift_check(monitor)
+
+report = monitor.report if monitor.report and monitor.report['model_version'] == bundle.version else run_drift_check(monitor)
+
+# Summary
+st.markdown("---")
+col1, col2, col3 = st.columns(3)
+with col1:
+    st.metric("Live Predictions", report['observations'])
+with col2:
+    st.metric("Drifting Features", sum(row['status'] in ("moderate", "significant") for row in report['features']))
+with col3:
+    st.metric("Training Rows", bundle.manifest['drift']['rows'])
+st.caption(f"Computed at {report['computed_at'][:19].replace('T', ' ')}; refreshed every {DRIFT_INTERVAL // 60} minutes. "
+           "Live counts are those of this server process plus the saved state it last merged with; "
+           "predictions served by other processes appear once they save.")
+
+def drift_table(rows, label):
+    table = pd.DataFrame(rows).rename(columns={
+        'name': label, 'observations': 'Observations', 'psi': 'PSI', 'ks': 'KS',
+        'ks_p_value': 'KS p-value', 'status': 'Status', 'train_mean': 'Training Mean', 'live_mean': 'Live Mean'
+    })
+    columns = [col for col in [label, 'Status', 'PSI', 'KS', 'KS p-value', 'Training Mean', 'Live Mean', 'Observations']
+               if col in table.columns]
+    return table[columns].sort_values('PSI', ascending=False)
+
+st.subheader("Feature Drift")
+st.dataframe(drift_table(report['features'], 'Feature'), use_container_width=True, hide_index=True)
+
+st.subheader("Predicted Risk Drift")
+st.dataframe(drift_table(report['risk'], 'Model'), use_container_width=True, hide_index=True)
+
+# Training vs live histogram
+st.markdown("---")
+st.subheader("Distribution Comparison")
+
+reference = bundle.manifest['drift']
+choices = [('feature', name) for name in reference['features']] + [('risk', name) for name in reference['risk']]
+kind, name = st.selectbox(
+    "Distribution",
+    choices,
+    format_func=lambda choice: choice[1] if choice[0] == 'feature' else f"Predicted risk ({choice[1]})"
+)
+
+ref = reference['features'][name] if kind == 'feature' else reference['risk'][name]
+edges = np.array(ref['edges']) if kind == 'feature' else RISK_BIN_EDGES
+live = monitor.live_histogram(name, risk=(kind == 'risk'))
+if len(edges):
+    bin_labels = [f"< {edges[0]:.3g}"] + [f"{low:.3g} – {high:.3g}" for low, high in zip(edges[:-1], edges[1:])] + [f"≥ {edges[-1]:.3g}"]
+else:
+    bin_labels = ["All values"]
+
+fig = go.Figure()
+training_counts = np.array(ref['counts'], dtype=float)
+fig.add_trace(go.Bar(x=bin_labels, y=training_counts / training_counts.sum(), name="Training"))
+if live is not None and live.sum():
+    fig.add_trace(go.Bar(x=bin_labels, y=live / live.sum(), name="Live"))
+fig.update_layout(barmode='group', yaxis_title="Share of records", xaxis_title="Bin", height=400)
+st.plotly_chart(fig, use_container_width=True)
+
+# Export
+st.markdown("---")
+st.subheader("Export")
+st.download_button("Download Prometheus metrics", export_metrics(report), file_name="drift_metrics.prom", mime="text/plain")
+st.download_button("Download drift report (JSON)", json.dumps(report, indent=2), file_name="drift_report.json",
+                   mime="application/json")
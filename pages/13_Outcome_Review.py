@@ -0,0 +1,53 @@
+import streamlit as st
+import pandas as pd
+from utils.storage import get_pending_outcomes, review_outcome, verify_reviewer_key
+
+st.set_page_config(page_title="Outcome Review", page_icon="H", layout="wide")
+
+st.title("Outcome Review")
+st.markdown("Confirm or reject diagnoses reported by users. Only confirmed diagnoses are used to update the models.")
+
+# Clinicians and admins unlock the page with the reviewer key
+if not verify_reviewer_key(st.session_state.get('reviewer_key')):
+    key = st.text_input("Reviewer key", type="password",
+                        help="Print it with: python -c \"from utils.storage import reviewer_access_key; "
+                             "print(reviewer_access_key())\"")
+    if not verify_reviewer_key(key):
+        if key:
+            st.error("Invalid reviewer key.")
+        st.stop()
+    st.session_state['reviewer_key'] = key
+
+reviewer = st.text_input("Your name", key="reviewer_name")
+if not reviewer:
+    st.info("Enter your name; it is recorded with every decision.")
+    st.stop()
+
+pending = get_pending_outcomes()
+st.metric("Pending Diagnoses", len(pending))
+if not pending:
+    st.success("Nothing to review.")
+    st.stop()
+
+hidden_fields = {'id', 'user_id', 'prediction_date', 'date_submitted', 'outcome'}
+for submission in pending:
+    key = f"{submission['user_id']}|{submission['prediction_date']}"
+    diagnosis = "Heart disease" if submission['outcome'] else "No heart disease"
+    with st.expander(f"{submission['user_id']}: {diagnosis} (prediction of {submission['prediction_date'][:16].replace('T', ' ')})"):
+        inputs = {name: value for name, value in submission.items() if name not in hidden_fields}
+        st.dataframe(pd.DataFrame([inputs]), use_container_width=True, hide_index=True)
+        st.caption(f"Submitted {submission['date_submitted'][:16].replace('T', ' ')}")
+        
+        col1, col2 = st.columns(2)
+        decision = None
+        with col1:
+            if st.button("Confirm", key=f"confirm_{key}", type="primary"):
+                decision = True
+        with col2:
+            if st.button("Reject", key=f"reject_{key}"):
+                decision = False
+        
+        if decision is not None:
+            if review_outcome(submission, decision, reviewer):
+                st.rerun()
+            st.warning("This prediction was already reviewed.")
@@ -0,0 +1,52 @@
+import os
+import shutil
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run a test from an empty directory; data/ and models/ paths are relative to it"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+def make_heart_data(n=200, seed=0):
+    """Small synthetic heart disease dataset with the usual column names"""
+    import numpy as np
+    import pandas as pd
+    
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame({
+        'age': rng.integers(30, 80, n), 'sex': rng.integers(0, 2, n), 'cp': rng.integers(0, 4, n),
+        'trestbps': rng.normal(130, 15, n).round(), 'chol': rng.normal(240, 40, n).round(),
+        'fbs': rng.integers(0, 2, n), 'restecg': rng.integers(0, 3, n), 'thalach': rng.normal(150, 20, n).round(),
+        'exang': rng.integers(0, 2, n), 'oldpeak': rng.gamma(1.0, 1.0, n).round(1), 'slope': rng.integers(0, 3, n),
+        'ca': rng.integers(0, 4, n), 'thal': rng.integers(0, 4, n)
+    })
+    logit = 0.05 * (X['age'] - 55) + 0.8 * (X['cp'] - 1.5) - 0.03 * (X['thalach'] - 150)
+    y = pd.Series((logit + rng.normal(0, 1, n) > 0).astype(int), name='target')
+    return X, y
+
+@pytest.fixture(scope="session")
+def trained_models_dir(tmp_path_factory):
+    """A models/ directory holding one trained bundle, trained once per test session"""
+    from utils.models import train_models
+    
+    root = tmp_path_factory.mktemp("trained")
+    previous = os.getcwd()
+    os.chdir(root)
+    try:
+        train_models(*make_heart_data())
+    finally:
+        os.chdir(previous)
+    return root / "models"
+
+@pytest.fixture
+def trained_workdir(workdir, trained_models_dir, monkeypatch):
+    """An empty working directory with a copy of the trained models, served by a fresh registry"""
+    from utils import model_registry
+    
+    shutil.copytree(trained_models_dir, workdir / "models")
+    monkeypatch.setattr(model_registry, '_registry', model_registry.ModelRegistry())
+    return workdir
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from utils.calibration import fit_calibration, apply_calibration, brier_score
+
+def overconfident_predictions(n, seed=0):
+    """Raw probabilities pushed towards 0 and 1 relative to the true event rate"""
+    rng = np.random.default_rng(seed)
+    true_rate = rng.uniform(0.05, 0.95, n)
+    y = (rng.uniform(size=n) < true_rate).astype(int)
+    raw = 1 / (1 + np.exp(-3 * np.log(true_rate / (1 - true_rate))))
+    return raw, y
+
+@pytest.mark.parametrize("method, n", [('platt', 300), ('isotonic', 2000)])
+def test_calibration_table_is_monotone_and_within_unit_interval(method, n):
+    raw, y = overconfident_predictions(n)
+    table = fit_calibration(raw, y, method=method)
+    
+    assert table['method'] == method
+    assert np.all(np.diff(table['x']) > 0)
+    assert np.all(np.diff(table['y']) >= 0)
+    assert table['y'].min() >= 0 and table['y'].max() <= 1
+    
+    # Monotone over the whole range, including values outside the fitted knots
+    grid = np.linspace(0, 1, 501)
+    calibrated = apply_calibration(grid, table['x'], table['y'])
+    assert np.all(np.diff(calibrated) >= 0)
+    assert calibrated.min() >= 0 and calibrated.max() <= 1
+
+def test_calibration_improves_overconfident_predictions():
+    raw, y = overconfident_predictions(3000)
+    table = fit_calibration(raw[:2000], y[:2000])
+    held_out = apply_calibration(raw[2000:], table['x'], table['y'])
+    assert brier_score(held_out, y[2000:]) < brier_score(raw[2000:], y[2000:])
+
+def test_default_method_depends_on_sample_size():
+    raw, y = overconfident_predictions(2000)
+    assert fit_calibration(raw[:200], y[:200])['method'] == 'platt'
+    assert fit_calibration(raw, y)['method'] == 'isotonic'
+
+def test_apply_calibration_keeps_the_input_shape():
+    raw, y = overconfident_predictions(300)
+    table = fit_calibration(raw, y)
+    assert apply_calibration(raw.reshape(30, 10), table['x'], table['y']).shape == (30, 10)
@@ -0,0 +1,78 @@
+import os
+import pytest
+import streamlit as st
+from utils import chatbot as chat, storage
+from utils.chatbot import HeartHealthChatbot, ResponseCache
+
+@pytest.fixture
+def chatbot(workdir):
+    return HeartHealthChatbot()
+
+def test_unrelated_message_matches_no_topic(chatbot):
+    assert chatbot.find_topic("I feel great today") is None
+
+def test_retrieval_still_finds_topics_without_keywords(chatbot):
+    for message in ["is smoking bad", "I have pain in my arm"]:
+        assert chatbot.rank_topics(message) == []
+        assert chatbot.find_topic(message) is not None
+
+def test_response_cache_keeps_entries_of_each_knowledge_version():
+    cache = ResponseCache()
+    cache.put('v1', 'hello', "old answer")
+    cache.put('v2', 'hello', "new answer")
+    assert cache.get('v2', 'hello') == "new answer"
+    assert cache.get('v1', 'hello') == "old answer"
+    assert cache.get('v3', 'hello') is None
+
+def test_response_cache_evicts_the_least_recently_used_entry():
+    cache = ResponseCache(max_size=2)
+    cache.put('v1', 'a', "A")
+    cache.put('v1', 'b', "B")
+    cache.get('v1', 'a')
+    cache.put('v1', 'c', "C")
+    assert cache.get('v1', 'b') is None
+    assert cache.get('v1', 'a') == "A" and cache.get('v1', 'c') == "C"
+
+def test_edited_topics_are_not_served_from_the_cache(chatbot):
+    chatbot.response_cache = ResponseCache()
+    message = "what does my risk score mean"
+    before = chatbot.get_response(message)
+    assert chatbot.get_response(message) == before
+    assert chatbot.response_cache.stats()['hits'] == 1
+    
+    topic = dict(chatbot.knowledge_base['risk_score'], response="The score was recalibrated.")
+    chatbot.update_knowledge_base({'risk_score': topic})
+    after = chatbot.get_response(message)
+    assert after != before and "recalibrated" in after
+
+@pytest.fixture
+def chat_session(workdir, monkeypatch):
+    write_queue = storage.WriteBehindQueue()
+    monkeypatch.setattr(storage, '_write_queue', write_queue)
+    st.session_state.clear()
+    yield write_queue
+    st.session_state.clear()
+    write_queue.close(timeout=5)
+
+def test_paging_skips_buffered_messages_that_were_never_saved(chat_session, monkeypatch):
+    for i in range(chat.CHAT_BUFFER_SIZE + 10):
+        storage.save_chat_message("user", f"message {i}", background=False)
+    chat.initialize_chatbot()
+    assert st.session_state.chat_log_older == 10
+    
+    # A reply whose write fails stays on screen but is not in the log
+    failed = chat_session.submit(os.path.join("data", "unsaved.jsonl"), {'value': object()})
+    assert chat_session.write_status(failed, timeout=5) == 'failed'
+    monkeypatch.setattr(chat, 'save_chat_message', lambda role, message: failed)
+    chat.add_to_chat_history("assistant", "unsaved reply")
+    assert st.session_state.chat_log_older == 11
+    
+    st.session_state.chat_window = chat.CHAT_BUFFER_SIZE + 1
+    messages, has_more = chat.get_visible_messages()
+    assert messages[0]['message'] == "message 10"
+    assert messages[-1]['message'] == "unsaved reply"
+    assert has_more
+
+def test_message_count_can_skip_waiting_for_queued_writes(chat_session, monkeypatch):
+    monkeypatch.setattr(storage, '_wait_for_pending_writes', lambda *args, **kwargs: pytest.fail("waited"))
+    assert storage.count_chat_messages(exact=False) == 0
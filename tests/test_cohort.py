@@ -0,0 +1,23 @@
+import pandas as pd
+from utils import storage
+from utils.cohort import iter_vitals_cohort
+
+def save_readings(user_count=5, readings=3):
+    for user in range(user_count):
+        for reading in range(readings):
+            storage.save_vitals({'age': 40 + user, 'resting_bp': 120 + reading}, 0.1, 'Low', user_id=f"user{user}")
+
+def test_vitals_cohort_streams_each_users_latest_record_in_chunks(workdir):
+    save_readings()
+    
+    chunks = list(iter_vitals_cohort(chunk_rows=2))
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    cohort = pd.concat(chunks)
+    assert sorted(cohort['user_id']) == [f"user{user}" for user in range(5)]
+    assert set(cohort['resting_bp']) == {122}
+
+def test_vitals_cohort_can_include_every_record(workdir):
+    save_readings()
+    chunks = list(iter_vitals_cohort(latest_only=False, chunk_rows=4))
+    assert [len(chunk) for chunk in chunks] == [4, 4, 4, 3]
+    assert pd.concat(chunks)['id'].notna().all()
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import StandardScaler
+from conftest import make_heart_data
+from utils.dependence import (
+    DEPENDENCE_GRID, DEPENDENCE_OFFSETS, DEPENDENCE_ICE_ROWS, PARTIAL_DEPENDENCE, ICE_CURVES,
+    compute_dependence, get_dependence_curves
+)
+from utils.model_bundle import load_bundle
+
+BACKGROUND = 30
+
+def fitted_models():
+    X, y = make_heart_data()
+    scaler = StandardScaler().fit(X)
+    models = {
+        'logistic': LogisticRegression().fit(scaler.transform(X), y),
+        'random_forest': RandomForestClassifier(n_estimators=10, max_depth=4, random_state=0).fit(X, y)
+    }
+    return models, scaler, X
+
+def test_curves_are_laid_out_along_each_features_grid():
+    models, scaler, X = fitted_models()
+    arrays = compute_dependence(models, scaler, X, background_size=BACKGROUND, grid_points=20, ice_samples=BACKGROUND)
+    
+    offsets = arrays[DEPENDENCE_OFFSETS]
+    grid = arrays[DEPENDENCE_GRID]
+    assert len(offsets) == X.shape[1] + 1 and offsets[-1] == len(grid)
+    sizes = dict(zip(X.columns, np.diff(offsets)))
+    # Discrete features use their values, continuous ones the full grid
+    assert sizes['sex'] == 2 and sizes['cp'] == 4 and sizes['chol'] == 20
+    assert arrays[DEPENDENCE_ICE_ROWS].shape == (BACKGROUND, X.shape[1])
+    
+    for name in models:
+        partial = arrays[f"{name}.{PARTIAL_DEPENDENCE}"]
+        ice = arrays[f"{name}.{ICE_CURVES}"]
+        assert partial.shape == grid.shape
+        assert ice.shape == (BACKGROUND, len(grid))
+        assert np.all((ice >= 0) & (ice <= 1))
+        # With every background row kept, the partial dependence is the mean ICE curve
+        assert np.allclose(ice.astype(float).mean(axis=0), partial, atol=1e-3)
+
+def test_ice_curve_is_the_model_scored_along_the_grid():
+    models, scaler, X = fitted_models()
+    arrays = compute_dependence(models, scaler, X, background_size=BACKGROUND, grid_points=20, ice_samples=5)
+    
+    feature = list(X.columns).index('age')
+    start, end = arrays[DEPENDENCE_OFFSETS][feature:feature + 2]
+    rows = np.repeat(arrays[DEPENDENCE_ICE_ROWS][[2]], end - start, axis=0)
+    rows[:, feature] = arrays[DEPENDENCE_GRID][start:end]
+    expected = models['logistic'].predict_proba(scaler.transform(pd.DataFrame(rows, columns=X.columns)))[:, 1]
+    assert np.allclose(arrays[f"logistic.{ICE_CURVES}"][2, start:end], expected, atol=1e-3)
+    # A linear model's curves all move in the direction of its coefficient
+    direction = np.sign(models['logistic'].coef_[0][feature])
+    assert np.all(direction * np.diff(arrays[f"logistic.{PARTIAL_DEPENDENCE}"][start:end]) >= 0)
+
+def test_curves_are_read_back_from_the_bundle(trained_workdir):
+    bundle = load_bundle()
+    features = dict(zip(bundle.feature_names, bundle.array(DEPENDENCE_ICE_ROWS)[0]))
+    curves = get_dependence_curves(bundle, 'xgboost', 'age', features)
+    
+    assert curves['partial_dependence'].shape == curves['grid'].shape
+    assert curves['ice'].shape[1] == len(curves['grid'])
+    # The input is itself a background row, so its own ICE curve is the nearest
+    assert np.array_equal(curves['nearest_ice'], curves['ice'][0])
+    assert get_dependence_curves(bundle, 'xgboost', 'not_a_feature') is None
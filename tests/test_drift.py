@@ -0,0 +1,33 @@
+from types import SimpleNamespace
+import numpy as np
+from conftest import make_heart_data
+from utils.drift import DriftMonitor, build_drift_reference
+
+def make_bundle():
+    X, _ = make_heart_data(n=100)
+    reference = build_drift_reference(X, {'logistic': np.linspace(0, 1, len(X))}, reference_id='train-1')
+    return SimpleNamespace(version='v1', manifest={'drift': reference}), X.to_dict('records')
+
+def test_processes_sharing_the_state_file_add_up(tmp_path):
+    bundle, rows = make_bundle()
+    state_file = str(tmp_path / "drift_state.json")
+    first, second = DriftMonitor(state_file), DriftMonitor(state_file)
+    
+    for row in rows[:30]:
+        first.observe(bundle, row, {'logistic': 0.2})
+    for row in rows[30:50]:
+        second.observe(bundle, row, {'logistic': 0.8})
+    first.save_state()
+    second.save_state()
+    # Saving again adds only what was observed since, not the whole history twice
+    first.observe(bundle, rows[50], {'logistic': 0.2})
+    first.save_state()
+    
+    merged = DriftMonitor(state_file)
+    report = merged.compute(bundle)
+    assert report['observations'] == 51
+    assert merged.live_histogram('logistic', risk=True).sum() == 51
+    ages = [row['age'] for row in rows[:51]]
+    age = next(row for row in report['features'] if row['name'] == 'age')
+    assert age['observations'] == 51
+    assert np.isclose(age['live_mean'], np.mean(ages))
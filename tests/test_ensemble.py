@@ -0,0 +1,51 @@
+import numpy as np
+from sklearn.base import BaseEstimator, ClassifierMixin
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import StandardScaler
+from conftest import make_heart_data
+from utils.ensemble import out_of_fold_probabilities, train_stacked_ensemble
+
+class Memorizer(ClassifierMixin, BaseEstimator):
+    """Predicts the label of rows it was trained on and 0.5 for every other row"""
+    
+    def fit(self, X, y):
+        self.classes_ = np.array([0, 1])
+        self.seen_ = {tuple(row): label for row, label in zip(np.asarray(X), np.asarray(y))}
+        return self
+    
+    def predict_proba(self, X):
+        positive = np.array([self.seen_.get(tuple(row), 0.5) for row in np.asarray(X)], dtype=float)
+        return np.column_stack([1 - positive, positive])
+    
+    def predict(self, X):
+        return (self.predict_proba(X)[:, 1] >= 0.5).astype(int)
+
+def training_data():
+    X, y = make_heart_data()
+    # Jittered so no two rows are equal and the memorizer cannot recall a row it has not seen
+    X = X + np.random.default_rng(1).normal(0, 1e-3, X.shape)
+    return X, y, StandardScaler().fit(X)
+
+def fitted_base_models(X, X_scaled, y):
+    return {'logistic': LogisticRegression().fit(X_scaled, y), 'memorizer': Memorizer().fit(X, y)}
+
+def test_out_of_fold_predictions_never_come_from_a_model_trained_on_the_row():
+    X, y, scaler = training_data()
+    models = fitted_base_models(X, scaler.transform(X), y)
+    
+    oof = out_of_fold_probabilities(models, X, scaler.transform(X), y)
+    assert oof.shape == (len(X), 2)
+    # In sample the memorizer is perfect; out of fold it has never seen any row it predicts
+    assert np.array_equal(models['memorizer'].predict_proba(X)[:, 1], y)
+    assert np.all(oof[:, 1] == 0.5)
+
+def test_meta_model_does_not_trust_a_memorizing_base_model():
+    X, y, scaler = training_data()
+    ensemble = train_stacked_ensemble(fitted_base_models(X, scaler.transform(X), y), scaler, X, y)
+    
+    # Its out-of-fold predictions carry no information, so the weight goes to the logistic model
+    logistic_weight, memorizer_weight = ensemble.meta_coef
+    assert abs(memorizer_weight) < 1e-6 < logistic_weight
+    probabilities = ensemble.predict_proba(X)
+    assert probabilities.shape == (len(X), 2)
+    assert np.allclose(probabilities.sum(axis=1), 1)
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import StandardScaler
+from utils.importance import (
+    PERMUTATION_IMPORTANCE, PERMUTATION_IMPORTANCE_STD, MEAN_ABS_SHAP, compute_importances, permutation_importances
+)
+
+def signal_and_noise(n, seed):
+    """Outcome driven by 'signal' only; 'noise' is unrelated to it"""
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame({'signal': rng.normal(size=n), 'noise': rng.normal(size=n)})
+    y = (X['signal'] + rng.normal(0, 0.5, n) > 0).astype(int)
+    return X, y
+
+def fitted_models():
+    X, y = signal_and_noise(400, seed=0)
+    scaler = StandardScaler().fit(X)
+    models = {
+        'logistic': LogisticRegression().fit(scaler.transform(X), y),
+        'random_forest': RandomForestClassifier(n_estimators=20, max_depth=4, random_state=0).fit(X, y)
+    }
+    return models, scaler
+
+def test_shuffling_the_informative_feature_costs_the_most_auc():
+    models, scaler = fitted_models()
+    X_held_out, y_held_out = signal_and_noise(300, seed=1)
+    
+    importances = permutation_importances(models, scaler, X_held_out, y_held_out, repeats=5)
+    for name, (mean, std) in importances.items():
+        signal, noise = mean
+        assert signal > 0.2, name
+        assert abs(noise) < 0.05, name
+        assert np.all(std >= 0)
+
+def test_importance_arrays_are_named_per_model_and_feature():
+    models, scaler = fitted_models()
+    X_held_out, y_held_out = signal_and_noise(100, seed=1)
+    
+    arrays = compute_importances(models, scaler, X_held_out, y_held_out, repeats=2)
+    for name in models:
+        for array in (PERMUTATION_IMPORTANCE, PERMUTATION_IMPORTANCE_STD, MEAN_ABS_SHAP):
+            assert arrays[f"{name}.{array}"].shape == (2,)
+        # SHAP agrees on which feature matters
+        assert arrays[f"{name}.{MEAN_ABS_SHAP}"].argmax() == 0
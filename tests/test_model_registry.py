@@ -0,0 +1,56 @@
+from utils import model_registry
+from utils.model_bundle import load_bundle, save_bundle, set_current_version
+
+def test_warm_up_compiles_builtin_tree_shap_without_shap(trained_workdir, monkeypatch):
+    monkeypatch.setattr(model_registry, 'SHAP_AVAILABLE', False)
+    bundle = load_bundle()
+    steps = []
+    model_registry.warm_up_bundle(bundle, on_step=lambda label, *args: steps.append(label))
+    
+    assert "Building xgboost explainer" in steps
+    assert ('builtin', 'random_forest') in bundle._explainers
+    assert ('builtin', 'xgboost') in bundle._explainers
+
+def test_wait_for_current_returns_the_newly_saved_version(trained_workdir):
+    registry = model_registry.ModelRegistry()
+    first = registry.get()
+    version = save_bundle(first.models, first.scaler, first.feature_names,
+                          extra={'hyperparameters': {'xgboost': {'max_depth': 3}}})
+    
+    # A plain get() keeps serving the previous bundle while the new one warms up
+    assert registry.get().version == first.version
+    current = registry.wait_for_current(timeout=30)
+    assert current.version == version
+    assert current.manifest['hyperparameters'] == {'xgboost': {'max_depth': 3}}
+    assert registry.last_swap['from_version'] == first.version
+    assert registry.get() is current
+
+def test_failed_swap_keeps_serving_the_previous_bundle(trained_workdir):
+    registry = model_registry.ModelRegistry()
+    first = registry.get()
+    set_current_version("missing-version")
+    
+    assert registry.wait_for_current(timeout=30) is first
+    assert "missing-version" in registry.last_error
+
+def test_model_warmup_loads_and_warms_the_current_bundle(trained_workdir):
+    from utils.models import ModelWarmup
+    warmup = ModelWarmup().start()
+    warmup.join(60)
+    
+    assert warmup.status == "done" and warmup.progress == 1.0
+    bundle = model_registry.get_model_registry().get()
+    assert bundle.version == load_bundle().version
+    # The explainers requests would otherwise build on first use are already there
+    assert bundle._explainers
+    assert "Loading model bundle" in warmup.step_timings
+
+def test_model_warmup_without_models_is_skipped(workdir, monkeypatch):
+    from utils import models
+    monkeypatch.setattr(model_registry, '_registry', model_registry.ModelRegistry())
+    monkeypatch.setattr(models, '_model_warmup', None)
+    
+    warmup = models.start_model_warmup()
+    assert models.start_model_warmup() is warmup
+    warmup.join(10)
+    assert warmup.status == "skipped"
@@ -0,0 +1,20 @@
+from conftest import make_heart_data
+from utils.dependence import DEPENDENCE_GRID, PARTIAL_DEPENDENCE, ICE_CURVES
+from utils.model_bundle import load_bundle
+from utils.models import load_or_train_models
+
+def test_training_from_a_dataset_replaces_the_existing_bundle(trained_workdir):
+    previous = load_bundle()
+    X, y = make_heart_data(seed=1)
+    models, accuracies, feature_names = load_or_train_models(X.assign(target=y))
+    
+    bundle = load_bundle()
+    assert bundle.version != previous.version
+    assert 'drift' in bundle.manifest
+    arrays = bundle.manifest['arrays']
+    assert DEPENDENCE_GRID in arrays
+    assert all(f"{name}.{array}" in arrays for name in models for array in (PARTIAL_DEPENDENCE, ICE_CURVES))
+
+def test_without_a_dataset_the_existing_bundle_is_loaded(trained_workdir):
+    models, accuracies, feature_names = load_or_train_models()
+    assert set(models) == set(load_bundle().models)
@@ -0,0 +1,87 @@
+import json
+import os
+import threading
+from utils import storage
+from utils.incremental import load_new_outcomes
+
+FEATURES = ['age', 'chol']
+
+def submit(user_id, prediction_date, outcome, age=50):
+    storage.submit_outcome({'age': age, 'cholesterol': 200}, outcome, prediction_date, user_id=user_id)
+
+def test_resubmitting_a_prediction_replaces_the_pending_diagnosis(workdir):
+    submit('alice', '2026-01-01T10:00:00', 1)
+    submit('alice', '2026-01-01T10:00:00', 0)
+    submit('bob', '2026-01-01T10:00:00', 1)
+    
+    pending = storage.get_pending_outcomes()
+    assert [(record['user_id'], record['outcome']) for record in pending] == [('alice', 0), ('bob', 1)]
+
+def test_each_prediction_is_reviewed_once(workdir):
+    submit('alice', '2026-01-01T10:00:00', 1)
+    submission = storage.get_pending_outcomes()[0]
+    
+    assert storage.review_outcome(submission, True, 'dr. lee')
+    assert not storage.review_outcome(submission, False, 'dr. lee')
+    assert storage.get_pending_outcomes() == []
+    
+    # A later report for an already reviewed prediction does not reopen it
+    submit('alice', '2026-01-01T10:00:00', 0)
+    assert storage.get_pending_outcomes() == []
+
+def test_only_confirmed_outcomes_reach_the_update(workdir):
+    submit('alice', '2026-01-01T10:00:00', 1, age=61)
+    submit('alice', '2026-01-02T10:00:00', 0, age=62)
+    submit('bob', '2026-01-01T10:00:00', 1, age=70)
+    for submission in storage.get_pending_outcomes():
+        storage.review_outcome(submission, submission['age'] != 62, 'dr. lee')
+    
+    # Outcomes saved before review existed carry no status and are left out
+    legacy_path = storage.get_user_file(storage.OUTCOMES_FILE, 'carol')
+    os.makedirs(os.path.dirname(legacy_path))
+    with open(legacy_path, 'w') as f:
+        f.write(json.dumps({'id': 1, 'user_id': 'carol', 'date_recorded': '2026-01-01T00:00:00',
+                            'age': 80, 'chol': 300, 'outcome': 1}) + "\n")
+    
+    X, y, latest = load_new_outcomes(FEATURES)
+    assert sorted(X['age']) == [61, 70]
+    assert list(y) == [1, 1]
+    assert load_new_outcomes(FEATURES, after=latest) == (None, None, None)
+
+def test_an_incremental_update_drops_what_described_the_previous_models(trained_workdir):
+    from conftest import make_heart_data
+    from utils.model_bundle import load_bundle
+    from utils.models import get_feature_importance
+    from utils.incremental import run_incremental_update, MIN_NEW_OUTCOMES
+    parent = load_bundle()
+    X, y = make_heart_data(n=MIN_NEW_OUTCOMES, seed=1)
+    for i, (row, outcome) in enumerate(zip(X.to_dict('records'), y)):
+        storage.submit_outcome(row, int(outcome), f"2026-01-01T10:00:{i:02d}", user_id=f"user{i}")
+    for submission in storage.get_pending_outcomes():
+        storage.review_outcome(submission, True, 'dr. lee')
+    
+    report = run_incremental_update()
+    
+    assert report['parent_version'] == parent.version
+    for result in report['new_outcome_accuracy'].values():
+        assert 0 <= result['accuracy'] <= 1 and result['stderr'] >= 0
+    assert 'estimated_full_retrain_seconds' in report
+    bundle = load_bundle()
+    assert bundle.version == report['version']
+    assert not bundle.manifest.get('calibration')
+    assert not [name for name in bundle.manifest['arrays'] if name.endswith(('calibration_x', 'partial_dependence', 'ice'))]
+    assert get_feature_importance('xgboost', bundle=bundle) == (None, None)
+    # Nothing new since, so a second run has nothing to do
+    assert run_incremental_update() is None
+
+def test_the_scheduler_updates_at_startup_and_stops_on_request(monkeypatch):
+    from utils import incremental
+    ran = threading.Event()
+    monkeypatch.setattr(incremental, 'run_incremental_update', ran.set)
+    
+    thread = incremental.start_incremental_scheduler(interval=3600)
+    try:
+        assert ran.wait(5)
+    finally:
+        incremental.stop_incremental_scheduler(timeout=5)
+    assert not thread.is_alive()
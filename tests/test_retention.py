@@ -0,0 +1,80 @@
+import os
+from datetime import datetime, timedelta
+import pytest
+from utils import retention, storage
+
+POLICY = {'date_key': 'date_recorded', 'raw_days': 30, 'rollup': 'D', 'group_by': []}
+NOW = datetime(2024, 6, 1)
+
+@pytest.fixture
+def history(workdir):
+    """A raw vitals file with 40 expired records (two per day) and 5 recent ones"""
+    path = storage.get_user_file(storage.VITALS_FILE, "alice")
+    old = [{'date_recorded': (NOW - timedelta(days=60) + timedelta(hours=12 * i)).isoformat(), 'resting_bp': 120 + i}
+           for i in range(40)]
+    recent = [{'date_recorded': (NOW - timedelta(days=5 - i)).isoformat(), 'resting_bp': 130} for i in range(5)]
+    storage.write_records(path, old + recent)
+    return path
+
+def _rolled_up_count(path):
+    return sum(record['record_count'] for record in retention.read_rollups(retention.get_rollup_file(path), 'date_recorded'))
+
+def _raw_count(path):
+    return len(storage.read_records(path, 'date_recorded'))
+
+def test_compaction_moves_expired_records_into_rollups(history):
+    assert retention.compact_file(history, POLICY, NOW) == 40
+    assert _rolled_up_count(history) == 40
+    assert _raw_count(history) == 5
+
+def test_compaction_is_idempotent(history):
+    retention.compact_file(history, POLICY, NOW)
+    assert retention.compact_file(history, POLICY, NOW) == 0
+    assert _rolled_up_count(history) == 40
+    assert _raw_count(history) == 5
+
+def test_crash_between_rollup_and_raw_replace_does_not_double_count(history, monkeypatch):
+    def crash(*args):
+        raise RuntimeError("stopped before the raw file was replaced")
+    
+    with monkeypatch.context() as patch:
+        patch.setattr(retention, '_truncate_raw', crash)
+        with pytest.raises(RuntimeError):
+            retention.compact_file(history, POLICY, NOW)
+    
+    # The roll-ups already hold the expired records while the raw file still has them too
+    assert _rolled_up_count(history) == 40
+    assert _raw_count(history) == 45
+    
+    # Trend readers skip raw records the roll-ups already include
+    monkeypatch.setattr(retention, 'datetime', type('FixedNow', (datetime,), {'now': staticmethod(lambda: NOW)}))
+    trend = retention.get_vitals_trend(user_id="alice")
+    assert trend['record_count'].sum() == 45
+    
+    # The next run only finishes dropping them from the raw file
+    assert retention.compact_file(history, POLICY, NOW) == 0
+    assert _rolled_up_count(history) == 40
+    assert _raw_count(history) == 5
+
+def test_later_compactions_merge_into_existing_rollups(history):
+    retention.compact_file(history, POLICY, NOW)
+    # The cutoff moves to three days before NOW: two more records expire
+    assert retention.compact_file(history, POLICY, NOW + timedelta(days=27)) == 2
+    assert _rolled_up_count(history) == 42
+    assert _raw_count(history) == 3
+
+def test_an_unterminated_last_line_stays_after_the_newest_record(workdir):
+    path = storage.get_user_file(storage.VITALS_FILE, "alice")
+    storage.write_records(path, [{'date_recorded': (NOW - timedelta(days=60 - i)).isoformat(), 'resting_bp': 120 + i}
+                                 for i in range(3)])
+    # A write cut off mid-line
+    with open(path, 'ab') as f:
+        f.write(b'{"date_recorded": "2024-')
+    
+    # Every parsed record expired, so only the newest is kept, whole
+    assert retention.compact_file(path, POLICY, NOW) == 2
+    with open(path, 'rb') as f:
+        lines = f.read().split(b"\n")
+    assert storage.read_records(path, 'date_recorded')[0]['resting_bp'] == 122
+    assert lines[-1] == b'{"date_recorded": "2024-'
+    assert len(lines) == 2
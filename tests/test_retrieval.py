@@ -0,0 +1,42 @@
+import pytest
+from utils import retrieval
+from utils.retrieval import BM25Index, load_or_build_index
+
+DOCUMENTS = [('diet', "eat vegetables and less salt"), ('exercise', "walk thirty minutes a day")]
+
+def forget_loaded_indexes(monkeypatch):
+    """Drop indexes held in memory, so the next load goes through the .npz cache"""
+    monkeypatch.setattr(retrieval, '_loaded_indexes', {})
+
+@pytest.fixture
+def cache_path(workdir, monkeypatch):
+    forget_loaded_indexes(monkeypatch)
+    return str(workdir / "data" / "index.npz")
+
+def test_cached_index_is_loaded_for_unchanged_documents(cache_path, monkeypatch):
+    built = load_or_build_index(DOCUMENTS, cache_path)
+    
+    forget_loaded_indexes(monkeypatch)
+    monkeypatch.setattr(BM25Index, 'build', classmethod(lambda cls, *args, **kwargs: pytest.fail("index was rebuilt")))
+    loaded = load_or_build_index(DOCUMENTS, cache_path)
+    assert loaded.fingerprint == built.fingerprint
+    assert loaded.search("salt")[0][0] == 'diet'
+
+def test_changed_documents_rebuild_the_cached_index(cache_path, monkeypatch):
+    old = load_or_build_index(DOCUMENTS, cache_path)
+    edited = DOCUMENTS + [('sleep', "sleep seven hours")]
+    
+    forget_loaded_indexes(monkeypatch)
+    new = load_or_build_index(edited, cache_path)
+    assert new.fingerprint != old.fingerprint
+    assert new.search("sleep hours")[0][0] == 'sleep'
+    assert BM25Index.load(cache_path).fingerprint == new.fingerprint
+
+def test_unreadable_cache_is_rebuilt(cache_path, monkeypatch):
+    load_or_build_index(DOCUMENTS, cache_path)
+    with open(cache_path, 'wb') as f:
+        f.write(b"not an npz file")
+    
+    forget_loaded_indexes(monkeypatch)
+    assert load_or_build_index(DOCUMENTS, cache_path).search("walk")[0][0] == 'exercise'
+    assert BM25Index.load(cache_path).fingerprint == retrieval.documents_fingerprint(DOCUMENTS)
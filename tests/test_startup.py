@@ -0,0 +1,22 @@
+import sys
+from utils import startup
+
+def test_import_warmup_loads_modules_once_in_the_background(monkeypatch):
+    monkeypatch.delitem(sys.modules, 'colorsys', raising=False)
+    monkeypatch.setattr(startup, '_import_timings', {})
+    monkeypatch.setattr(startup, '_warmup_thread', None)
+    
+    thread = startup.start_import_warmup(['missing_optional_dependency', 'colorsys'])
+    assert startup.start_import_warmup() is thread
+    thread.join(10)
+    
+    # A missing optional dependency is skipped without stopping the modules after it
+    assert 'colorsys' in sys.modules
+    assert list(startup.get_import_timings()['module']) == ['colorsys']
+
+def test_lazy_module_imports_on_first_attribute_access(monkeypatch):
+    monkeypatch.delitem(sys.modules, 'colorsys', raising=False)
+    colorsys = startup.lazy_import('colorsys')
+    assert 'colorsys' not in sys.modules
+    assert colorsys.rgb_to_hsv(1.0, 0.0, 0.0) == (0.0, 1.0, 1.0)
+    assert 'colorsys' in sys.modules
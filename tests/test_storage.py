@@ -0,0 +1,60 @@
+import os
+from datetime import date
+from utils import storage
+
+def test_partition_keys_are_namespaced(workdir):
+    assert storage._partition_key("alice") == "u-alice"
+    hashed = storage._partition_key("alice@example.com")
+    assert hashed.startswith("h-") and len(hashed) == 66
+
+def test_raw_id_cannot_collide_with_hashed_id(workdir):
+    other = "bob@example.com"
+    digest = storage._partition_key(other)[2:]
+    # A readable id spelled like another id's hash still gets its own partition
+    assert storage._partition_key(digest) != storage._partition_key(other)
+
+def test_user_token_is_required_to_switch_users(workdir, monkeypatch):
+    monkeypatch.setenv(storage.USER_SECRET_ENV, "test-secret")
+    token = storage.user_access_token("alice")
+    assert storage.verify_user_token("alice", token)
+    assert not storage.verify_user_token("alice", None)
+    assert not storage.verify_user_token("alice", "0" * 64)
+    assert not storage.verify_user_token("mallory", token)
+
+def test_generated_secret_is_reused(workdir, monkeypatch):
+    monkeypatch.delenv(storage.USER_SECRET_ENV, raising=False)
+    assert storage.user_access_token("alice") == storage.user_access_token("alice")
+    assert os.path.exists(storage.USER_SECRET_FILE)
+
+def test_legacy_partitions_are_prefixed_once(workdir):
+    os.makedirs(os.path.join(storage.USERS_DIR, "alice"))
+    os.makedirs(os.path.join(storage.USERS_DIR, "a" * 64))
+    storage.migrate_partition_names()
+    storage.migrate_partition_names()
+    assert sorted(os.path.basename(path) for path in storage.list_partitions()) == ["h-" + "a" * 64, "u-alice"]
+
+def _dated_history(days):
+    """A vitals file with one record at noon on each of the first days of January 2026"""
+    path = storage.get_user_file(storage.VITALS_FILE, "alice")
+    storage.write_records(path, [{'date_recorded': f"2026-01-{day:02d}T12:00:00"} for day in range(1, days + 1)])
+    return path
+
+def _days(records):
+    return [int(record['date_recorded'][8:10]) for record in records]
+
+def test_read_records_pages_newest_first(workdir):
+    path = _dated_history(10)
+    assert _days(storage.read_records(path, 'date_recorded', limit=3)) == [10, 9, 8]
+    assert _days(storage.read_records(path, 'date_recorded', limit=3, offset=3)) == [7, 6, 5]
+    assert _days(storage.read_records(path, 'date_recorded', limit=3, offset=9)) == [1]
+    assert storage.read_records(path, 'date_recorded', offset=10) == []
+
+def test_read_records_date_bounds_are_inclusive(workdir):
+    path = _dated_history(10)
+    # A date-only until covers the whole day, since too
+    assert _days(storage.read_records(path, 'date_recorded', since='2026-01-03', until='2026-01-05')) == [5, 4, 3]
+    assert _days(storage.read_records(path, 'date_recorded', since=date(2026, 1, 3), until=date(2026, 1, 5))) == [5, 4, 3]
+    # A bound with a time of day is taken as it is
+    assert _days(storage.read_records(path, 'date_recorded', until='2026-01-05T11:00:00', limit=2)) == [4, 3]
+    assert _days(storage.read_records(path, 'date_recorded', since='2026-01-03', until='2026-01-05',
+                                      limit=2, offset=1)) == [4, 3]
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from conftest import make_heart_data
+from utils.ensemble import logit
+from utils.model_bundle import load_bundle
+from utils.treeshap import explain
+
+@pytest.fixture
+def bundle_and_rows(trained_workdir):
+    bundle = load_bundle()
+    X, _ = make_heart_data(n=50, seed=3)
+    return bundle, X[bundle.feature_names]
+
+def test_xgboost_attributions_match_its_native_contributions(bundle_and_rows):
+    import xgboost as xgb
+    bundle, X = bundle_and_rows
+    values, expected = explain(bundle, 'xgboost', X)
+    
+    booster = bundle.models['xgboost'].get_booster()
+    contributions = booster.predict(xgb.DMatrix(X), pred_contribs=True)
+    assert np.allclose(values, contributions[:, :-1], rtol=0, atol=2e-6)
+    assert np.allclose(expected, contributions[:, -1], rtol=0, atol=2e-6)
+    # XGBoost accumulates margins in float32
+    margin = booster.predict(xgb.DMatrix(X), output_margin=True)
+    assert np.allclose(expected + values.sum(axis=1), margin, rtol=0, atol=1e-5)
+
+def test_forest_attributions_sum_to_the_predicted_probability(bundle_and_rows):
+    bundle, X = bundle_and_rows
+    values, expected = explain(bundle, 'random_forest', X)
+    assert values.shape == X.shape
+    assert np.allclose(expected + values.sum(axis=1), bundle.models['random_forest'].predict_proba(X)[:, 1], atol=1e-9)
+
+def test_linear_and_stacked_attributions_sum_to_the_log_odds(bundle_and_rows):
+    bundle, X = bundle_and_rows
+    values, expected = explain(bundle, 'logistic', X)
+    model = bundle.models['logistic']
+    assert np.allclose(expected + values.sum(axis=1), model.decision_function(bundle.scaler.transform(X)))
+    
+    # The stacked model's attributions are in the meta-model's log-odds
+    values, expected = explain(bundle, 'ensemble', X)
+    assert np.allclose(expected + values.sum(axis=1), logit(bundle.models['ensemble'].predict_proba(X)[:, 1]), atol=1e-4)
@@ -0,0 +1,33 @@
+import pytest
+from utils.triage import TriageClassifier, triage_symptoms, EMERGENCY, URGENT
+
+@pytest.mark.parametrize("message, expected", [
+    ("I am not sure if this is chest pain", 'emergency'),
+    ("I can not breathe", 'emergency'),
+    ("I cannot breathe", 'emergency'),
+    ("no chest pain", 'routine'),
+    ("patient denies chest pain", 'routine'),
+    ("not severe, just a mild headache", 'routine'),
+    ("never passed out", 'routine'),
+    ("no chest pain but it is crushing", 'emergency'),
+    ("no, I can't breathe", 'emergency'),
+    ("no I cannot breathe", 'emergency'),
+    ("I'm not certain whether I feel dizzy", 'urgent'),
+    ("I do not have any pain", 'routine'),
+    ("denies palpitations", 'routine'),
+    ("no pain but I feel dizzy", 'urgent'),
+    ("I haven't slept well and now I feel dizzy", 'urgent'),
+    ("feeling great today", 'routine'),
+])
+def test_triage_levels(message, expected):
+    assert triage_symptoms([message])[0] == expected
+
+def test_batch_keeps_messages_apart():
+    assert list(triage_symptoms(["not", "dizzy", "chest pain"])) == ['routine', 'urgent', 'emergency']
+
+def test_phrases_too_long_for_int64_codes_still_match():
+    long_phrase = ' '.join(f"word{i}" for i in range(20))
+    classifier = TriageClassifier({EMERGENCY: [long_phrase], URGENT: ['dizzy']})
+    assert classifier.long_phrases
+    assert list(classifier.classify([f"today {long_phrase} again", "dizzy", "word0 word1"])) == \
+        ['emergency', 'urgent', 'routine']
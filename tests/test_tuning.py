@@ -0,0 +1,36 @@
+import time
+import numpy as np
+from conftest import make_heart_data
+from utils import tuning
+
+def test_early_stopping_never_sees_the_scoring_fold(monkeypatch):
+    X, y = make_heart_data()
+    train_index, test_index = np.arange(150), np.arange(150, 200)
+    seen = {}
+    original_fit = tuning.xgb.XGBClassifier.fit
+    
+    def recording_fit(self, X_fit, y_fit, eval_set=None, **kwargs):
+        seen['fit'] = set(X_fit.index)
+        seen['eval'] = set(eval_set[0][0].index)
+        return original_fit(self, X_fit, y_fit, eval_set=eval_set, **kwargs)
+    
+    monkeypatch.setattr(tuning.xgb.XGBClassifier, 'fit', recording_fit)
+    score, rounds = tuning._fit_and_score('xgboost', {'n_estimators': 50}, X, y, train_index, test_index,
+                                          time.monotonic() + 60)
+    
+    assert 0 <= score <= 1 and 1 <= rounds <= 50
+    assert seen['eval'] and seen['eval'] <= set(train_index)
+    assert not seen['fit'] & seen['eval']
+
+def test_xgboost_fit_stops_at_the_deadline():
+    X, y = make_heart_data()
+    result = tuning._fit_and_score('xgboost', {'n_estimators': 100000, 'learning_rate': 1e-5}, X, y,
+                                   np.arange(150), np.arange(150, 200), time.monotonic() + 0.3)
+    assert result is None
+
+def test_search_finishes_within_its_budget():
+    X, y = make_heart_data()
+    start = time.monotonic()
+    found = tuning.successive_halving('random_forest', X, y, start + 5, folds=3)
+    assert time.monotonic() - start < 15
+    assert found is None or found['params']['n_estimators'] <= 400
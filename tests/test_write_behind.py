@@ -0,0 +1,66 @@
+import os
+import threading
+import pytest
+from utils import storage
+
+@pytest.fixture
+def write_queue(workdir, monkeypatch):
+    write_queue = storage.WriteBehindQueue()
+    monkeypatch.setattr(storage, '_write_queue', write_queue)
+    yield write_queue
+    write_queue.close(timeout=5)
+
+def test_records_are_persisted_in_order(write_queue):
+    path = os.path.join("data", "history.jsonl")
+    offsets = [write_queue.submit(path, {'value': i}) for i in range(5)]
+    assert write_queue.write_status(offsets[-1], timeout=5) == 'saved'
+    records = storage.read_records(path, 'id')
+    assert [record['value'] for record in records] == [4, 3, 2, 1, 0]
+
+def test_unserializable_record_fails_without_stopping_the_writer(write_queue):
+    path = os.path.join("data", "history.jsonl")
+    bad = write_queue.submit(path, {'value': object()})
+    assert write_queue.write_status(bad, timeout=5) == 'failed'
+    assert "TypeError" in write_queue.last_error
+    
+    good = write_queue.submit(path, {'value': 1})
+    assert write_queue.write_status(good, timeout=5) == 'saved'
+    assert [record['value'] for record in storage.read_records(path, 'id')] == [1]
+    assert write_queue.stats()['failed_records'] == 1
+
+def test_unexpected_writer_error_keeps_the_thread_alive(write_queue, monkeypatch):
+    calls = []
+    original = storage.WriteBehindQueue._write_batch
+    
+    def failing_once(self, items):
+        calls.append(len(items))
+        if len(calls) == 1:
+            raise ValueError("boom")
+        return original(self, items)
+    
+    monkeypatch.setattr(storage.WriteBehindQueue, '_write_batch', failing_once)
+    path = os.path.join("data", "history.jsonl")
+    first = write_queue.submit(path, {'value': 1})
+    assert write_queue.write_status(first, timeout=5) == 'failed'
+    assert "boom" in write_queue.last_error
+    
+    second = write_queue.submit(path, {'value': 2})
+    assert write_queue.write_status(second, timeout=5) == 'saved'
+
+def test_reads_time_out_instead_of_hanging(write_queue, monkeypatch):
+    release = threading.Event()
+    original = storage.write_records
+    
+    def stuck(file_path, records):
+        release.wait(10)
+        return original(file_path, records)
+    
+    monkeypatch.setattr(storage, 'write_records', stuck)
+    path = os.path.join("data", "history.jsonl")
+    offset = write_queue.submit(path, {'value': 1})
+    with pytest.raises(storage.WriteBehindError):
+        storage._wait_for_pending_writes(path, timeout=0.2)
+    assert write_queue.write_status(offset) == 'pending'
+    
+    release.set()
+    assert write_queue.write_status(offset, timeout=5) == 'saved'
@@ -0,0 +1,47 @@
+import numpy as np
+from utils.ensemble import logit
+
+# Isotonic regression overfits small calibration sets; below this many
+# out-of-fold predictions a Platt sigmoid is fitted instead
+ISOTONIC_MIN_SAMPLES = 1000
+# Knots a Platt sigmoid is tabulated on, evenly spaced in log-odds
+PLATT_GRID_POINTS = 101
+PLATT_GRID_LOGIT_RANGE = 10
+
+def fit_isotonic_table(probabilities, y):
+    """Isotonic calibration as (raw, calibrated) knots; linear between knots, as scikit-learn predicts"""
+    from sklearn.isotonic import IsotonicRegression
+    
+    isotonic = IsotonicRegression(y_min=0, y_max=1, out_of_bounds='clip').fit(probabilities, y)
+    return isotonic.X_thresholds_, isotonic.y_thresholds_
+
+def fit_platt_table(probabilities, y):
+    """Platt scaling on the log-odds, tabulated as (raw, calibrated) knots"""
+    from sklearn.linear_model import LogisticRegression
+    
+    platt = LogisticRegression().fit(logit(probabilities)[:, None], y)
+    grid_logits = np.linspace(-PLATT_GRID_LOGIT_RANGE, PLATT_GRID_LOGIT_RANGE, PLATT_GRID_POINTS)
+    grid = np.concatenate([[0.0], 1 / (1 + np.exp(-grid_logits)), [1.0]])
+    return grid, platt.predict_proba(logit(grid)[:, None])[:, 1]
+
+def fit_calibration(probabilities, y, method=None):
+    """Fit a monotone lookup table mapping raw probabilities to calibrated ones.
+    
+    method is 'isotonic' or 'platt'; by default isotonic when there are at
+    least ISOTONIC_MIN_SAMPLES predictions. Fit on out-of-fold predictions,
+    never on the rows the model was trained on. Returns
+    {'method', 'x', 'y'} with x increasing and y non-decreasing.
+    """
+    probabilities = np.asarray(probabilities, dtype=float)
+    method = method or ('isotonic' if len(probabilities) >= ISOTONIC_MIN_SAMPLES else 'platt')
+    fit = fit_isotonic_table if method == 'isotonic' else fit_platt_table
+    x, calibrated = fit(probabilities, np.asarray(y))
+    return {'method': method, 'x': np.asarray(x, dtype=np.float64), 'y': np.asarray(calibrated, dtype=np.float64)}
+
+def apply_calibration(probabilities, x, y):
+    """Map raw probabilities through a calibration table (any shape, one np.interp)"""
+    return np.interp(probabilities, x, y)
+
+def brier_score(probabilities, y):
+    """Mean squared error of predicted probabilities against 0/1 outcomes"""
+    return float(np.mean((np.asarray(probabilities, dtype=float) - np.asarray(y)) ** 2))
@@ -1,4 +1,109 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
 import streamlit as st
+from utils.storage import (load_data, save_chat_message, get_chat_history, count_chat_messages, clear_chat_history,
+                           get_write_status, WRITE_WAIT_TIMEOUT)
+from utils.keyword_matcher import KeywordAutomaton
+from utils.retrieval import load_or_build_index
+from utils.triage import get_triage_classifier, EMERGENCY, URGENT
+
+# Optional extra topics, same shape as the built-in knowledge base:
+# {"topic": {"keywords": [...], "response": "..."}}
+HEALTH_ARTICLES_FILE = os.path.join("data", "health_articles.json")
+
+# Minimum share of the query's best possible BM25 score for a retrieved article
+# to be used when no keyword matches; raw scores are not comparable across queries
+MIN_RETRIEVAL_SHARE = 0.4
+
+# Number of per-message streaming timings kept on the chatbot
+STREAM_METRICS_HISTORY = 100
+
+# Split after each newline so streamed chunks keep the markdown layout intact
+CHUNK_PATTERN = re.compile(r"[^\n]*\n|[^\n]+")
+
+# Chat messages kept in the session ring buffer, rendered by default, and paged in per click
+CHAT_BUFFER_SIZE = 50
+CHAT_RENDER_WINDOW = 20
+CHAT_PAGE_SIZE = 20
+
+# Responses kept in the shared LRU cache
+RESPONSE_CACHE_SIZE = 512
+
+class ResponseCache:
+    """Thread-safe LRU cache of chatbot responses shared by all sessions.
+    
+    Entries are keyed by knowledge base version as well as message, so edited
+    topics are never served stale, while sessions still on another version keep
+    their own entries; entries of retired versions age out like any other.
+    """
+    
+    def __init__(self, max_size=RESPONSE_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, version, key):
+        """Return the cached response or None, marking it most recently used"""
+        with self._lock:
+            response = self._entries.get((version, key))
+            if response is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((version, key))
+            self.hits += 1
+            return response
+    
+    def put(self, version, key, response):
+        """Store a response, evicting the least recently used entry when full"""
+        with self._lock:
+            self._entries[(version, key)] = response
+            self._entries.move_to_end((version, key))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+    
+    def stats(self):
+        """Get hit/miss counts, current size and hit rate"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+_response_cache = ResponseCache()
+
+def get_response_cache():
+    """Get the response cache shared by every chatbot instance"""
+    return _response_cache
+
+def normalize_message(message):
+    """Normalize a message for cache lookups: lowercase, single spaces, no trailing punctuation"""
+    return ' '.join(message.lower().split()).rstrip('?!. ')
+
+def get_risk_bucket(context):
+    """Reduce a prediction context to the risk level that changes the response"""
+    if not context:
+        return None
+    context_lower = context.lower()
+    if 'high risk' in context_lower:
+        return 'high'
+    if 'medium risk' in context_lower:
+        return 'medium'
+    return None
 
 class HeartHealthChatbot:
     def __init__(self):
@@ -286,26 +391,91 @@ High cholesterol often has no symptoms, so regular testing is important!"""
 Uncontrolled high blood pressure is a major heart disease risk factor!"""
             }
         }
+        
+        if os.path.exists(HEALTH_ARTICLES_FILE):
+            self.knowledge_base.update(load_data(HEALTH_ARTICLES_FILE))
+        
+        self.stream_metrics = deque(maxlen=STREAM_METRICS_HISTORY)
+        self.response_cache = get_response_cache()
+        
+        self.build_keyword_index()
+        self.build_retrieval_index()
     
-    def get_response(self, user_message, context=None):
-        """Get chatbot response based on keywords"""
-        user_message_lower = user_message.lower()
+    @property
+    def knowledge_version(self):
+        """Content fingerprint of the knowledge base, used to version cached responses"""
+        return self.retrieval_index.fingerprint
+    
+    def update_knowledge_base(self, topics):
+        """Add or replace topics and rebuild the indexes; cached responses expire with the old version"""
+        self.knowledge_base.update(topics)
+        self.build_keyword_index()
+        self.build_retrieval_index()
+    
+    def build_keyword_index(self):
+        """Compile every topic keyword into a single matching automaton"""
+        self.topic_order = {topic: i for i, topic in enumerate(self.knowledge_base)}
+        self.keyword_automaton = KeywordAutomaton(
+            (keyword.lower(), topic)
+            for topic, data in self.knowledge_base.items()
+            for keyword in data['keywords']
+        )
+    
+    def build_retrieval_index(self):
+        """Index every topic's keywords and response text for BM25 retrieval"""
+        self.retrieval_index = load_or_build_index(
+            (topic, ' '.join(data['keywords']) + '\n' + data['response'])
+            for topic, data in self.knowledge_base.items()
+        )
+    
+    def search_topics(self, user_message, k=3):
+        """Retrieve the k topics whose content best matches the message"""
+        return self.retrieval_index.search(user_message, k)
+    
+    def find_topic(self, user_message):
+        """Pick the topic for a message: best keyword match, else best retrieval hit"""
+        ranked_topics = self.rank_topics(user_message)
+        if ranked_topics:
+            return ranked_topics[0][0]
+        
+        retrieved = self.search_topics(user_message, k=1)
+        if retrieved and retrieved[0][1] >= MIN_RETRIEVAL_SHARE * self.retrieval_index.max_score(user_message):
+            return retrieved[0][0]
+        return None
+    
+    def rank_topics(self, user_message):
+        """Score every topic whose keywords appear in the message, best match first.
+        
+        Each distinct keyword counts once, weighted by its number of words so
+        specific phrases outrank generic single words. Ties keep knowledge base order.
+        """
+        matched = set()
+        for _, keyword, topic in self.keyword_automaton.iter_word_matches(user_message.lower()):
+            matched.add((keyword, topic))
+        
+        scores = {}
+        for keyword, topic in matched:
+            scores[topic] = scores.get(topic, 0) + len(keyword.split())
+        
+        return sorted(scores.items(), key=lambda item: (-item[1], self.topic_order[item[0]]))
+    
+    def iter_response(self, user_message, context=None):
+        """Yield the chatbot response part by part, each as soon as it is ready"""
+        best_topic = self.find_topic(user_message)
         
-        # Check for matches in knowledge base
-        for topic, data in self.knowledge_base.items():
-            if any(keyword in user_message_lower for keyword in data['keywords']):
-                response = data['response']
-                
-                # Add context-specific information if available
-                if context and 'high risk' in context.lower():
-                    response += "\n\n**Note:** Your assessment shows elevated risk. Please consult a healthcare professional for personalized guidance."
-                elif context and 'medium risk' in context.lower():
-                    response += "\n\n**Note:** Your assessment shows moderate risk. Implementing lifestyle changes could be beneficial."
-                
-                return response
+        if best_topic is not None:
+            yield self.knowledge_base[best_topic]['response']
+            
+            # Add context-specific information if available
+            risk_bucket = get_risk_bucket(context)
+            if risk_bucket == 'high':
+                yield "\n\n**Note:** Your assessment shows elevated risk. Please consult a healthcare professional for personalized guidance."
+            elif risk_bucket == 'medium':
+                yield "\n\n**Note:** Your assessment shows moderate risk. Implementing lifestyle changes could be beneficial."
+            return
         
         # Default response if no match found
-        default_response = """I can help you understand heart health and your risk assessment. Here are some topics I can discuss:
+        yield """I can help you understand heart health and your risk assessment. Here are some topics I can discuss:
 
 - Understanding your risk score and what it means
 - Ways to improve heart health and reduce risk
@@ -317,12 +487,22 @@ Uncontrolled high blood pressure is a major heart disease risk factor!"""
 - Stress management
 
 Please ask me about any of these topics, and I'll provide detailed information!"""
-        
-        return default_response
     
-    def get_prediction_explanation(self, prediction_score, risk_category, top_factors):
-        """Get explanation for prediction results"""
-        explanation = f"""**Your Heart Disease Risk Assessment:**
+    def _cache_key(self, user_message, context):
+        return normalize_message(user_message), get_risk_bucket(context)
+    
+    def get_response(self, user_message, context=None):
+        """Get chatbot response from keyword matches, falling back to article retrieval"""
+        key = self._cache_key(user_message, context)
+        response = self.response_cache.get(self.knowledge_version, key)
+        if response is None:
+            response = ''.join(self.iter_response(user_message, context))
+            self.response_cache.put(self.knowledge_version, key, response)
+        return response
+    
+    def iter_prediction_explanation(self, prediction_score, risk_category, top_factors):
+        """Yield the explanation for prediction results section by section"""
+        yield f"""**Your Heart Disease Risk Assessment:**
 
 **Risk Score:** {prediction_score:.1%}
 **Category:** {risk_category}
@@ -330,7 +510,7 @@ Please ask me about any of these topics, and I'll provide detailed information!"
 """
         
         if risk_category == "Low Risk":
-            explanation += """**What This Means:**
+            yield """**What This Means:**
 Your assessment suggests a lower probability of heart disease. This is encouraging! Continue maintaining your healthy habits.
 
 **Next Steps:**
@@ -340,7 +520,7 @@ Your assessment suggests a lower probability of heart disease. This is encouragi
 - Stay physically active
 """
         elif risk_category == "Medium Risk":
-            explanation += """**What This Means:**
+            yield """**What This Means:**
 Your assessment shows moderate risk. Some health factors may need attention, but there's significant room for improvement.
 
 **Next Steps:**
@@ -351,7 +531,7 @@ Your assessment shows moderate risk. Some health factors may need attention, but
 - Consider stress management techniques
 """
         else:  # High Risk
-            explanation += """**What This Means:**
+            yield """**What This Means:**
 Your assessment indicates elevated risk. This doesn't mean you have heart disease, but several risk factors need attention.
 
 **Immediate Actions:**
@@ -368,12 +548,14 @@ Your assessment indicates elevated risk. This doesn't mean you have heart diseas
 """
         
         if top_factors:
-            explanation += f"\n**Key Contributing Factors:** {', '.join(top_factors)}\n"
-            explanation += "\nFocusing on these areas could help improve your heart health.\n"
+            yield f"\n**Key Contributing Factors:** {', '.join(top_factors)}\n"
+            yield "\nFocusing on these areas could help improve your heart health.\n"
         
-        explanation += "\n**Important:** This assessment provides information only. Always consult healthcare professionals for medical decisions."
-        
-        return explanation
+        yield "\n**Important:** This assessment provides information only. Always consult healthcare professionals for medical decisions."
+    
+    def get_prediction_explanation(self, prediction_score, risk_category, top_factors):
+        """Get explanation for prediction results"""
+        return ''.join(self.iter_prediction_explanation(prediction_score, risk_category, top_factors))
     
     def get_lifestyle_recommendations(self, risk_factors):
         """Get personalized lifestyle recommendations"""
@@ -423,18 +605,15 @@ Consult your healthcare provider before making major lifestyle changes, especial
         
         return recommendations
     
-    def get_symptom_guidance(self, symptoms):
-        """Get guidance for reported symptoms"""
-        symptoms_lower = symptoms.lower()
+    def iter_symptom_guidance(self, symptoms):
+        """Yield guidance for reported symptoms section by section"""
+        triage_level = get_triage_classifier().levels([symptoms])[0]
         
-        emergency_keywords = ['severe', 'chest pain', 'difficulty breathing', 'unconscious', 'crushing']
-        urgent_keywords = ['pain', 'shortness of breath', 'dizzy', 'irregular heartbeat', 'palpitation']
-        
-        response = "**Symptom Guidance:**\n\n"
+        yield "**Symptom Guidance:**\n\n"
         
         # Check for emergency symptoms
-        if any(keyword in symptoms_lower for keyword in emergency_keywords):
-            response += """🚨 **EMERGENCY:** Your symptoms may require immediate medical attention!
+        if triage_level == EMERGENCY:
+            yield """🚨 **EMERGENCY:** Your symptoms may require immediate medical attention!
 
 **Call 911 or go to the emergency room immediately if you have:**
 - Severe chest pain or pressure
@@ -447,11 +626,11 @@ Consult your healthcare provider before making major lifestyle changes, especial
 
 This is NOT a substitute for emergency medical care.
 """
-            return response
+            return
         
         # Check for urgent symptoms
-        if any(keyword in symptoms_lower for keyword in urgent_keywords):
-            response += """⚠️ **Important:** Your symptoms warrant medical evaluation.
+        if triage_level == URGENT:
+            yield """⚠️ **Important:** Your symptoms warrant medical evaluation.
 
 **You should contact your healthcare provider soon if experiencing:**
 - Chest discomfort or unusual sensations
@@ -467,7 +646,7 @@ This is NOT a substitute for emergency medical care.
 
 """
         
-        response += """**General Symptom Information:**
+        yield """**General Symptom Information:**
 
 Common heart-related symptoms include:
 - Chest pressure or discomfort
@@ -490,22 +669,63 @@ Common heart-related symptoms include:
 - Better safe than sorry with heart symptoms!
 
 Would you like information about any specific aspect of heart health?"""
+    
+    def get_symptom_guidance(self, symptoms):
+        """Get guidance for reported symptoms"""
+        return ''.join(self.iter_symptom_guidance(symptoms))
+    
+    def stream_parts(self, parts, label=None, split_lines=True):
+        """Stream response parts line by line, recording timing for the message.
         
-        return response
+        Each part is forwarded as soon as the generator produces it, split after
+        newlines so markdown renders progressively with its formatting intact.
+        Time to first chunk and total time are appended to stream_metrics.
+        """
+        start = time.perf_counter()
+        first_chunk = None
+        chunks = 0
+        try:
+            for part in parts:
+                for chunk in (CHUNK_PATTERN.findall(part) if split_lines else [part]):
+                    if first_chunk is None:
+                        first_chunk = time.perf_counter() - start
+                    chunks += 1
+                    yield chunk
+        finally:
+            self.stream_metrics.append({
+                'label': label,
+                'first_chunk_ms': None if first_chunk is None else first_chunk * 1000,
+                'total_ms': (time.perf_counter() - start) * 1000,
+                'chunks': chunks
+            })
     
     def stream_response(self, user_message, context=None):
-        """Stream chatbot response for better UX"""
-        response = self.get_response(user_message, context)
-        
-        # Simulate streaming by yielding in chunks
-        words = response.split()
-        current_chunk = ""
-        
-        for i, word in enumerate(words):
-            current_chunk += word + " "
-            if (i + 1) % 3 == 0 or i == len(words) - 1:  # Yield every 3 words
-                yield current_chunk
-                current_chunk = ""
+        """Stream chatbot response for better UX; cached responses are replayed at once"""
+        key = self._cache_key(user_message, context)
+        version = self.knowledge_version
+        cached = self.response_cache.get(version, key)
+        if cached is not None:
+            return self.stream_parts([cached], label=user_message, split_lines=False)
+        return self.stream_parts(self._iter_and_cache(version, key, user_message, context), label=user_message)
+    
+    def _iter_and_cache(self, version, key, user_message, context):
+        parts = []
+        for part in self.iter_response(user_message, context):
+            parts.append(part)
+            yield part
+        self.response_cache.put(version, key, ''.join(parts))
+    
+    def get_stream_stats(self):
+        """Summarize recorded streaming timings"""
+        if not self.stream_metrics:
+            return None
+        first_chunks = [m['first_chunk_ms'] for m in self.stream_metrics if m['first_chunk_ms'] is not None]
+        return {
+            'messages': len(self.stream_metrics),
+            'avg_first_chunk_ms': sum(first_chunks) / len(first_chunks) if first_chunks else None,
+            'avg_total_ms': sum(m['total_ms'] for m in self.stream_metrics) / len(self.stream_metrics),
+            'last': self.stream_metrics[-1]
+        }
 
 def initialize_chatbot():
     """Initialize chatbot in session state"""
@@ -513,20 +733,75 @@ def initialize_chatbot():
         st.session_state.chatbot = HeartHealthChatbot()
     
     if 'chat_history' not in st.session_state:
-        st.session_state.chat_history = []
+        # Seed the ring buffer with the newest messages of the persisted log
+        recent = get_chat_history(limit=CHAT_BUFFER_SIZE)
+        st.session_state.chat_history = deque(reversed(recent), maxlen=CHAT_BUFFER_SIZE)
+        st.session_state.chat_window = CHAT_RENDER_WINDOW
+        # Logged messages older than the buffer; kept up to date as the buffer drops messages
+        st.session_state.chat_log_older = count_chat_messages() - len(recent)
+
+def _is_persisted(chat, timeout=0):
+    """Whether a buffered message is in the chat log; queued messages count as saved unless timeout is given"""
+    write_offset = chat.get('write_offset')
+    return write_offset is None or get_write_status(write_offset, timeout) != 'failed'
 
 def add_to_chat_history(role, message):
-    """Add message to chat history"""
-    st.session_state.chat_history.append({
+    """Add message to the session buffer and the persisted chat log"""
+    buffer = st.session_state.chat_history
+    if len(buffer) == buffer.maxlen and _is_persisted(buffer[0]):
+        # The oldest buffered message is about to drop out and now lives only in the log
+        st.session_state.chat_log_older = st.session_state.get('chat_log_older', 0) + 1
+    buffer.append({
         "role": role,
         "message": message,
-        "timestamp": st.session_state.get('timestamp_counter', 0)
+        "write_offset": save_chat_message(role, message)
     })
-    st.session_state.timestamp_counter = st.session_state.get('timestamp_counter', 0) + 1
+
+def reset_chat_history():
+    """Clear the session buffer and the persisted chat log"""
+    st.session_state.chat_history.clear()
+    st.session_state.chat_window = CHAT_RENDER_WINDOW
+    st.session_state.chat_log_older = 0
+    clear_chat_history()
+
+def show_older_messages():
+    """Extend the rendered window by one page of older messages"""
+    st.session_state.chat_window += CHAT_PAGE_SIZE
+
+def get_persisted_offset():
+    """Log offset, newest first, of the newest message older than the session buffer.
+    
+    Buffered messages whose write failed are not in the log, so this can be
+    smaller than the buffer; queued writes are waited for to settle it.
+    """
+    return sum(_is_persisted(chat, WRITE_WAIT_TIMEOUT) for chat in st.session_state.chat_history)
+
+def get_visible_messages():
+    """Get the messages inside the rendered window, oldest first.
+    
+    The newest messages come from the session buffer; once the window reaches
+    past it, older messages are paged in from the chat log. Also returns
+    whether even older messages exist.
+    """
+    buffer = st.session_state.chat_history
+    window = st.session_state.get('chat_window', CHAT_RENDER_WINDOW)
+    
+    if window <= len(buffer):
+        return list(buffer)[-window:], window < len(buffer) or st.session_state.get('chat_log_older', 0) > 0
+    
+    # Fetch one extra record to learn whether there is more history
+    older = get_chat_history(limit=window - len(buffer) + 1, offset=get_persisted_offset())
+    has_more = len(older) > window - len(buffer)
+    older = older[:window - len(buffer)]
+    return list(reversed(older)) + list(buffer), has_more
 
 def display_chat_history():
-    """Display chat history"""
-    for chat in st.session_state.chat_history:
+    """Display the windowed chat history"""
+    messages, has_more = get_visible_messages()
+    if has_more:
+        st.button("Show older messages", on_click=show_older_messages)
+    
+    for chat in messages:
         if chat["role"] == "user":
             with st.chat_message("user"):
                 st.write(chat["message"])
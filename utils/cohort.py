@@ -0,0 +1,239 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from utils.storage import AGE_GROUP_BINS, AGE_GROUP_LABELS, iter_community_vitals
+from utils.models import RISK_THRESHOLDS, RISK_CATEGORIES, get_model_bundle, map_feature_names, score_batch
+
+# Rows read and scored per task
+COHORT_CHUNK_ROWS = 50_000
+# Chunks scored at once; tree prediction releases the GIL, so worker threads share one copy of the models
+COHORT_WORKERS = min(8, os.cpu_count() or 1)
+# Risk distributions are histograms of equal-width bins over [0, 1]
+RISK_HISTOGRAM_BINS = 20
+
+# Intervention rules: {'feature', 'operation', 'value'} with an optional
+# 'where': {'feature', 'operator', 'value'} limiting the rule to matching rows.
+# Feature names are the app's (resting_bp, cholesterol, ...)
+INTERVENTION_OPERATIONS = {
+    'add': np.add,
+    'multiply': np.multiply,
+    'set': lambda column, value: np.full_like(column, value),
+    'at_most': np.minimum,
+    'at_least': np.maximum
+}
+CONDITION_OPERATORS = {
+    '>': np.greater, '>=': np.greater_equal, '<': np.less, '<=': np.less_equal, '==': np.equal, '!=': np.not_equal
+}
+
+# Subgroups reported by the simulator: name -> (group labels, function of (model-named frame, baseline risk) -> group codes)
+SUBGROUPS = {
+    'All': (['All'], lambda X, risk: np.zeros(len(X), dtype=np.int64)),
+    # Same right-closed bins as the community age groups
+    'Age group': (AGE_GROUP_LABELS, lambda X, risk: np.searchsorted(AGE_GROUP_BINS[1:-1], X['age'].to_numpy(), side='left')),
+    'Sex': (['Female', 'Male'], lambda X, risk: (X['sex'].to_numpy() > 0).astype(np.int64)),
+    'Baseline risk': (RISK_CATEGORIES, lambda X, risk: np.searchsorted(RISK_THRESHOLDS, risk, side='right'))
+}
+# Per-group running totals kept by CohortSummary
+TOTAL_FIELDS = ['rows', 'baseline_sum', 'scenario_sum', 'baseline_high', 'scenario_high', 'improved', 'worsened']
+
+def _model_feature(name):
+    return next(iter(map_feature_names({name: None})))
+
+def validate_interventions(interventions, feature_names):
+    """Raise ValueError for rules naming an unknown feature, operation or operator"""
+    for rule in interventions:
+        conditions = [rule['where']] if rule.get('where') else []
+        for part in [rule] + conditions:
+            if _model_feature(part['feature']) not in feature_names:
+                raise ValueError(f"Unknown feature in intervention: {part['feature']}")
+        if rule['operation'] not in INTERVENTION_OPERATIONS:
+            raise ValueError(f"Unknown intervention operation: {rule['operation']}")
+        if conditions and conditions[0]['operator'] not in CONDITION_OPERATORS:
+            raise ValueError(f"Unknown condition operator: {conditions[0]['operator']}")
+
+def apply_interventions(X, interventions):
+    """Apply intervention rules to a model-named frame, one whole column at a time.
+    
+    Rules run in order, so a condition sees the changes of earlier rules.
+    Returns a new frame; X is untouched.
+    """
+    X = X.copy()
+    for rule in interventions:
+        feature = _model_feature(rule['feature'])
+        column = X[feature].to_numpy(dtype=float)
+        changed = INTERVENTION_OPERATIONS[rule['operation']](column, float(rule['value']))
+        condition = rule.get('where')
+        if condition:
+            mask = CONDITION_OPERATORS[condition['operator']](
+                X[_model_feature(condition['feature'])].to_numpy(dtype=float), float(condition['value']))
+            changed = np.where(mask, changed, column)
+        X[feature] = changed
+    return X
+
+def to_model_frame(df, feature_names):
+    """Model-ready rows of a cohort frame with app-named or model-named columns.
+    
+    Returns (X, skipped): complete rows in training column order, and the
+    number of rows dropped for missing or non-numeric values.
+    """
+    renamed = df.rename(columns={column: mapped for mapped, column in map_feature_names({c: c for c in df.columns}).items()})
+    missing = [name for name in feature_names if name not in renamed.columns]
+    if missing:
+        raise ValueError(f"Cohort is missing columns: {', '.join(missing)}")
+    X = renamed[feature_names].apply(pd.to_numeric, errors='coerce')
+    complete = X.notna().all(axis=1).to_numpy()
+    return X[complete].astype(float), int((~complete).sum())
+
+class CohortSummary:
+    """Running per-subgroup totals and risk histograms of a cohort simulation.
+    
+    Totals only ever add up, so the summary of a partly processed cohort is a
+    consistent result for the rows seen so far, and chunk summaries computed
+    in parallel are merged in any order.
+    """
+    
+    def __init__(self, subgroups=SUBGROUPS):
+        self.subgroups = subgroups
+        self.rows = 0
+        self.changed_rows = 0
+        self.skipped_rows = 0
+        self.seconds = 0.0
+        self.totals = {name: np.zeros((len(labels), len(TOTAL_FIELDS))) for name, (labels, _) in subgroups.items()}
+        # [group, 0] holds the baseline histogram and [group, 1] the scenario histogram
+        self.histograms = {name: np.zeros((len(labels), 2, RISK_HISTOGRAM_BINS), dtype=np.int64)
+                           for name, (labels, _) in subgroups.items()}
+    
+    def add(self, X, baseline, scenario, changed_rows=0, skipped_rows=0):
+        """Add one scored chunk: the baseline frame and each row's baseline and scenario risk"""
+        self.rows += len(X)
+        self.changed_rows += changed_rows
+        self.skipped_rows += skipped_rows
+        baseline_category = np.searchsorted(RISK_THRESHOLDS, baseline, side='right')
+        scenario_category = np.searchsorted(RISK_THRESHOLDS, scenario, side='right')
+        high = len(RISK_THRESHOLDS)
+        fields = np.column_stack([
+            np.ones(len(X)), baseline, scenario, baseline_category == high, scenario_category == high,
+            scenario_category < baseline_category, scenario_category > baseline_category
+        ])
+        bins = [np.minimum((risk * RISK_HISTOGRAM_BINS).astype(np.int64), RISK_HISTOGRAM_BINS - 1)
+                for risk in (baseline, scenario)]
+        for name, (labels, group_codes) in self.subgroups.items():
+            codes = group_codes(X, baseline)
+            for field in range(fields.shape[1]):
+                self.totals[name][:, field] += np.bincount(codes, weights=fields[:, field], minlength=len(labels))
+            for which, risk_bins in enumerate(bins):
+                self.histograms[name][:, which] += np.bincount(
+                    codes * RISK_HISTOGRAM_BINS + risk_bins, minlength=len(labels) * RISK_HISTOGRAM_BINS
+                ).reshape(len(labels), RISK_HISTOGRAM_BINS)
+    
+    def merge(self, other):
+        self.rows += other.rows
+        self.changed_rows += other.changed_rows
+        self.skipped_rows += other.skipped_rows
+        for name in self.subgroups:
+            self.totals[name] += other.totals[name]
+            self.histograms[name] += other.histograms[name]
+    
+    def table(self, subgroup):
+        """Mean risk before and after, high-risk shares and category moves for each group with rows"""
+        labels, _ = self.subgroups[subgroup]
+        totals = self.totals[subgroup]
+        rows = totals[:, 0]
+        
+        def share(field):
+            return np.divide(totals[:, TOTAL_FIELDS.index(field)], rows, out=np.full(len(rows), np.nan), where=rows > 0)
+        
+        table = pd.DataFrame({
+            'group': labels,
+            'rows': rows.astype(np.int64),
+            'baseline_risk': share('baseline_sum'),
+            'scenario_risk': share('scenario_sum'),
+            'baseline_high_risk': share('baseline_high'),
+            'scenario_high_risk': share('scenario_high'),
+            'improved': share('improved'),
+            'worsened': share('worsened')
+        })
+        table.insert(4, 'risk_change', table['scenario_risk'] - table['baseline_risk'])
+        return table[table['rows'] > 0].reset_index(drop=True)
+    
+    def distribution(self, subgroup='All', group='All'):
+        """(bin edges, baseline counts, scenario counts) of one group's risk"""
+        labels, _ = self.subgroups[subgroup]
+        counts = self.histograms[subgroup][list(labels).index(group)]
+        return np.linspace(0, 1, RISK_HISTOGRAM_BINS + 1), counts[0], counts[1]
+
+def _simulate_chunk(bundle, model_name, chunk, interventions):
+    X, skipped = to_model_frame(chunk, bundle.feature_names)
+    summary = CohortSummary()
+    if X.empty:
+        summary.skipped_rows = skipped
+        return summary
+    
+    X_scenario = apply_interventions(X, interventions)
+    baseline = score_batch(X, model_name, bundle)
+    # Rows the rules leave untouched keep their baseline risk without being scored again
+    changed = (X_scenario.to_numpy() != X.to_numpy()).any(axis=1)
+    scenario = baseline.copy()
+    if changed.any():
+        scenario[changed] = score_batch(X_scenario[changed], model_name, bundle)
+    summary.add(X, baseline, scenario, int(changed.sum()), skipped)
+    return summary
+
+def simulate_cohort(chunks, interventions, model_name='xgboost', bundle=None, workers=COHORT_WORKERS):
+    """Score a cohort before and after intervention rules, yielding the running summary.
+    
+    chunks is any iterable of DataFrames (see iter_vitals_cohort and
+    iter_csv_cohort), so cohorts far larger than memory stream through.
+    Chunks are scored in parallel threads with a bounded read-ahead, and the
+    same CohortSummary is yielded after each chunk is merged, so callers can
+    show partial results; the last one yielded is the final result.
+    """
+    bundle = bundle or get_model_bundle()
+    validate_interventions(interventions, bundle.feature_names)
+    summary = CohortSummary()
+    start = time.perf_counter()
+    pending = deque()
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            for chunk in chunks:
+                pending.append(executor.submit(_simulate_chunk, bundle, model_name, chunk, interventions))
+                # Hold at most two chunks per worker, so memory stays flat however long the cohort is
+                if len(pending) >= 2 * workers:
+                    summary.merge(pending.popleft().result())
+                    summary.seconds = time.perf_counter() - start
+                    yield summary
+            while pending:
+                summary.merge(pending.popleft().result())
+                summary.seconds = time.perf_counter() - start
+                yield summary
+        finally:
+            # The caller may stop early; drop chunks that have not started
+            for future in pending:
+                future.cancel()
+
+def iter_vitals_cohort(latest_only=True, chunk_rows=COHORT_CHUNK_ROWS):
+    """The stored vitals of every user as chunks, by default only each user's latest record.
+    
+    Partitions are read one at a time and buffered only up to chunk_rows, so
+    memory stays flat however many users are stored.
+    """
+    buffered = []
+    buffered_rows = 0
+    for frame in iter_community_vitals(latest_only=latest_only):
+        buffered.append(frame)
+        buffered_rows += len(frame)
+        while buffered_rows >= chunk_rows:
+            combined = pd.concat(buffered, ignore_index=True)
+            yield combined.iloc[:chunk_rows]
+            buffered = [combined.iloc[chunk_rows:]]
+            buffered_rows -= chunk_rows
+    if buffered_rows:
+        yield pd.concat(buffered, ignore_index=True)
+
+def iter_csv_cohort(file, chunk_rows=COHORT_CHUNK_ROWS):
+    """Read a cohort CSV (a path or an uploaded file) lazily, chunk_rows rows at a time"""
+    yield from pd.read_csv(file, chunksize=chunk_rows)
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+from utils.calibration import apply_calibration
+from utils.ensemble import ENSEMBLE_MODEL
+
+# Grid points per continuous feature; features with fewer distinct values use each value
+DEPENDENCE_GRID_POINTS = 50
+# Training rows averaged into each partial dependence curve
+DEPENDENCE_BACKGROUND = 300
+# Individual (ICE) curves kept per feature, the first rows of the background sample
+ICE_SAMPLES = 40
+
+# Shared arrays: every feature's grid concatenated, with offsets, and the inputs of the ICE rows
+DEPENDENCE_GRID = "dependence.grid"
+DEPENDENCE_OFFSETS = "dependence.offsets"
+DEPENDENCE_ICE_ROWS = "dependence.ice_rows"
+# Per-model arrays, named '<model>.<array>', laid out like the grid
+PARTIAL_DEPENDENCE = "partial_dependence"
+ICE_CURVES = "ice"
+DEPENDENCE_ARRAYS = [PARTIAL_DEPENDENCE, ICE_CURVES]
+
+def feature_grid(values, points=DEPENDENCE_GRID_POINTS):
+    """Grid over a feature's training range: its distinct values when there are few, else evenly spaced"""
+    unique = np.unique(values)
+    if len(unique) <= points:
+        return unique.astype(np.float64)
+    return np.linspace(unique[0], unique[-1], points)
+
+def _calibrated_scores(models, scaler, X, calibration):
+    """Calibrated class-1 probability of every model for one large frame, one predict call per model"""
+    X_scaled = scaler.transform(X)
+    raw = {name: model.predict_proba(X_scaled if name == 'logistic' else X)[:, 1]
+           for name, model in models.items() if name != ENSEMBLE_MODEL}
+    if ENSEMBLE_MODEL in models:
+        # The stacked model only needs the raw base scores computed above
+        ensemble = models[ENSEMBLE_MODEL]
+        raw[ENSEMBLE_MODEL] = ensemble.combine(np.column_stack([raw[name] for name in ensemble.base_names]))
+    scores = {}
+    for name, values in raw.items():
+        table = (calibration or {}).get(name)
+        scores[name] = apply_calibration(values, table['x'], table['y']) if table else values
+    return scores
+
+def compute_dependence(models, scaler, X, calibration=None, background_size=DEPENDENCE_BACKGROUND,
+                       grid_points=DEPENDENCE_GRID_POINTS, ice_samples=ICE_SAMPLES, seed=0):
+    """Partial dependence and ICE curves of every model over every feature, as bundle arrays.
+    
+    Each background row is repeated once per grid point of each feature with
+    that feature overwritten, so all curves of a model come from a single
+    batch prediction. Scores are calibrated like the served predictions
+    (calibration as passed to save_bundle). The partial dependence curve is
+    the mean over the background rows; ICE curves are kept for the first
+    ice_samples rows, in float16, which is ample for charting probabilities.
+    """
+    X = X.astype(float)
+    grids = [feature_grid(X[name].to_numpy(), grid_points) for name in X.columns]
+    offsets = np.cumsum([0] + [len(grid) for grid in grids]).astype(np.int64)
+    background = X.sample(min(background_size, len(X)), random_state=seed).to_numpy()
+    
+    blocks = []
+    for feature, grid in enumerate(grids):
+        block = np.repeat(background, len(grid), axis=0)
+        block[:, feature] = np.tile(grid, len(background))
+        blocks.append(block)
+    scores = _calibrated_scores(models, scaler, pd.DataFrame(np.concatenate(blocks), columns=X.columns), calibration)
+    
+    arrays = {
+        DEPENDENCE_GRID: np.concatenate(grids),
+        DEPENDENCE_OFFSETS: offsets,
+        DEPENDENCE_ICE_ROWS: background[:ice_samples]
+    }
+    for name, values in scores.items():
+        # Rows of feature f's block are background-major: reshape to (background rows, grid points)
+        curves = [values[len(background) * start:len(background) * end].reshape(len(background), end - start)
+                  for start, end in zip(offsets[:-1], offsets[1:])]
+        arrays[f"{name}.{PARTIAL_DEPENDENCE}"] = np.concatenate([curve.mean(axis=0) for curve in curves]).astype(np.float32)
+        arrays[f"{name}.{ICE_CURVES}"] = np.concatenate([curve[:ice_samples] for curve in curves], axis=1).astype(np.float16)
+    return arrays
+
+def get_dependence_curves(bundle, model_name, feature, features=None):
+    """Precomputed curves of one model and one (model-named) feature, read from the bundle.
+    
+    Returns {'grid', 'partial_dependence', 'ice'} plus, when the input
+    features are given, 'nearest_ice': the ICE curve of the background row
+    closest to the input on the other features (in scaled units), a curve
+    shaped like the input's own. Returns None for bundles without curves.
+    """
+    pd_name = f"{model_name}.{PARTIAL_DEPENDENCE}"
+    if pd_name not in bundle.manifest['arrays'] or feature not in bundle.feature_names:
+        return None
+    index = bundle.feature_names.index(feature)
+    offsets = bundle.array(DEPENDENCE_OFFSETS)
+    start, end = int(offsets[index]), int(offsets[index + 1])
+    curves = {
+        'grid': bundle.array(DEPENDENCE_GRID)[start:end],
+        'partial_dependence': bundle.array(pd_name)[start:end],
+        'ice': bundle.array(f"{model_name}.{ICE_CURVES}")[:, start:end]
+    }
+    if features is not None:
+        rows = bundle.array(DEPENDENCE_ICE_ROWS)
+        point = np.array([float(features.get(name, 0)) for name in bundle.feature_names])
+        distance = np.delete((rows - point) / bundle.scaler.scale_, index, axis=1)
+        curves['nearest_ice'] = curves['ice'][np.argmin(np.square(distance).sum(axis=1))]
+    return curves
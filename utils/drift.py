@@ -0,0 +1,326 @@
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+import numpy as np
+from utils.storage import DATA_DIR, get_file_lock
+from utils.model_registry import get_model_registry
+
+DRIFT_STATE_FILE = os.path.join(DATA_DIR, "drift_state.json")
+DRIFT_REPORT_FILE = os.path.join(DATA_DIR, "drift_report.json")
+# Prometheus text exposition format, for a node exporter textfile collector or any scraper
+DRIFT_METRICS_FILE = os.path.join(DATA_DIR, "drift_metrics.prom")
+DRIFT_INTERVAL = 5 * 60  # seconds
+
+# Continuous features get quantile bins; features with at most this many values get one bin per value
+DRIFT_BINS = 10
+# Inner edges of the predicted-risk histogram; the outer bins are open-ended
+RISK_BIN_EDGES = np.linspace(0.1, 0.9, 9)
+# Added to every bin before taking PSI's log ratio, so empty bins stay finite
+PSI_SMOOTHING = 0.5
+# PSI below the first bound is stable, below the second moderate drift, otherwise significant
+PSI_THRESHOLDS = [0.1, 0.25]
+DRIFT_STATUSES = ["stable", "moderate", "significant"]
+# Fewer live observations than this are reported without a drift status
+MIN_DRIFT_OBSERVATIONS = 30
+
+logger = logging.getLogger(__name__)
+
+_monitor_thread = None
+_monitor_guard = threading.Lock()
+
+def _histogram_reference(values, edges):
+    values = np.asarray(values, dtype=float)
+    counts = np.bincount(np.searchsorted(edges, values, side='right'), minlength=len(edges) + 1)
+    return {
+        'edges': [float(edge) for edge in edges],
+        'counts': counts.tolist(),
+        'mean': float(values.mean()),
+        'std': float(values.std()),
+        'min': float(values.min()),
+        'max': float(values.max())
+    }
+
+def feature_bin_edges(values, bins=DRIFT_BINS):
+    """Inner bin edges for one feature: midpoints between values for discrete
+    features, training quantiles otherwise. Values past the outer edges fall
+    into the first or last bin."""
+    unique = np.unique(values)
+    if len(unique) <= bins:
+        return (unique[:-1] + unique[1:]) / 2
+    return np.unique(np.quantile(values, np.linspace(0, 1, bins + 1)[1:-1]))
+
+def build_drift_reference(X, risk_scores, reference_id):
+    """Summarize the training distribution for the bundle manifest.
+    
+    X is the training feature frame and risk_scores maps model names to the
+    (calibrated, out-of-fold) risk each model predicted for those rows.
+    reference_id identifies the training set; live histograms are kept
+    across bundle versions that share it.
+    """
+    return {
+        'reference_id': reference_id,
+        'rows': len(X),
+        'features': {name: _histogram_reference(X[name], feature_bin_edges(X[name].to_numpy())) for name in X.columns},
+        'risk': {name: _histogram_reference(scores, RISK_BIN_EDGES) for name, scores in risk_scores.items()}
+    }
+
+def population_stability_index(expected_counts, actual_counts):
+    """PSI between two histograms over the same bins"""
+    expected = np.asarray(expected_counts, dtype=float) + PSI_SMOOTHING
+    actual = np.asarray(actual_counts, dtype=float) + PSI_SMOOTHING
+    expected /= expected.sum()
+    actual /= actual.sum()
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+def binned_ks(expected_counts, actual_counts):
+    """Two-sample Kolmogorov-Smirnov statistic and asymptotic p-value from histograms.
+    
+    Comparing CDFs only at bin edges can only understate the statistic, so the
+    p-value errs towards reporting no drift.
+    """
+    from scipy.special import kolmogorov
+    
+    expected = np.asarray(expected_counts, dtype=float)
+    actual = np.asarray(actual_counts, dtype=float)
+    n, m = expected.sum(), actual.sum()
+    statistic = float(np.max(np.abs(np.cumsum(expected) / n - np.cumsum(actual) / m)))
+    return statistic, float(kolmogorov(statistic * np.sqrt(n * m / (n + m))))
+
+def drift_status(psi, observations):
+    if observations < MIN_DRIFT_OBSERVATIONS:
+        return "insufficient data"
+    return DRIFT_STATUSES[np.searchsorted(PSI_THRESHOLDS, psi, side='right')]
+
+class _Stream:
+    """Live histograms and running moments for the bins of one reference"""
+    
+    def __init__(self, reference):
+        self.reference_id = reference['reference_id']
+        # Plain lists: bisect on a dozen edges is much cheaper than a numpy call per value
+        self.edges = {name: list(ref['edges']) for name, ref in reference['features'].items()}
+        self.risk_edges = RISK_BIN_EDGES.tolist()
+        self.counts = {name: np.zeros(len(edges) + 1, dtype=np.int64) for name, edges in self.edges.items()}
+        # count, sum, sum of squares, min, max
+        self.moments = {name: [0, 0.0, 0.0, np.inf, -np.inf] for name in self.edges}
+        self.risk_counts = {name: np.zeros(len(RISK_BIN_EDGES) + 1, dtype=np.int64) for name in reference['risk']}
+        self.observations = 0
+        self.mark_saved()
+    
+    def observe(self, features, risk_scores):
+        for name, edges in self.edges.items():
+            value = features.get(name)
+            if value is None:
+                continue
+            value = float(value)
+            self.counts[name][bisect.bisect_right(edges, value)] += 1
+            moments = self.moments[name]
+            moments[0] += 1
+            moments[1] += value
+            moments[2] += value * value
+            moments[3] = min(moments[3], value)
+            moments[4] = max(moments[4], value)
+        for name, score in risk_scores.items():
+            if name in self.risk_counts:
+                self.risk_counts[name][bisect.bisect_right(self.risk_edges, score)] += 1
+        self.observations += 1
+    
+    def to_dict(self):
+        return {
+            'reference_id': self.reference_id,
+            'observations': self.observations,
+            'counts': {name: counts.tolist() for name, counts in self.counts.items()},
+            'moments': {name: [value if np.isfinite(value) else None for value in moments]
+                        for name, moments in self.moments.items()},
+            'risk_counts': {name: counts.tolist() for name, counts in self.risk_counts.items()}
+        }
+    
+    def mark_saved(self):
+        """Remember the current state as the one last read from or written to the state file"""
+        self._saved = ({name: counts.copy() for name, counts in self.counts.items()},
+                       {name: list(moments) for name, moments in self.moments.items()},
+                       {name: counts.copy() for name, counts in self.risk_counts.items()},
+                       self.observations)
+    
+    def rebase(self, saved):
+        """Replace what was last saved with a saved state, keeping the observations made since"""
+        saved_counts, saved_moments, saved_risk_counts, saved_observations = self._saved
+        self.observations += saved['observations'] - saved_observations
+        for name, counts in saved['counts'].items():
+            if name in self.counts and len(counts) == len(self.counts[name]):
+                self.counts[name] += np.asarray(counts, dtype=np.int64) - saved_counts[name]
+        for name, moments in saved['moments'].items():
+            if name in self.moments:
+                current, previous = self.moments[name], saved_moments[name]
+                moments = [value if value is not None else default for value, default in zip(moments, previous)]
+                self.moments[name] = [moments[i] + current[i] - previous[i] for i in range(3)] + [
+                    min(moments[3], current[3]), max(moments[4], current[4])]
+        for name, counts in saved['risk_counts'].items():
+            if name in self.risk_counts and len(counts) == len(self.risk_counts[name]):
+                self.risk_counts[name] += np.asarray(counts, dtype=np.int64) - saved_risk_counts[name]
+        self.mark_saved()
+
+class DriftMonitor:
+    """Streaming comparison of live prediction inputs with the training data.
+    
+    Every prediction adds one count per feature to fixed-bin histograms taken
+    from the bundle's training reference, so recording costs the same no matter
+    how much history exists. Drift scores are computed from the histograms
+    alone; the stored history is never rescanned. The live histograms are
+    saved to DRIFT_STATE_FILE, so they survive restarts, and start over when
+    a bundle trained on different data becomes active.
+    
+    Each process keeps its own histograms, so the report reflects the
+    predictions this process saw plus what was in the state file when it last
+    saved. Saving adds the observations made since the previous save to the
+    file's counts rather than overwriting them, so processes sharing the file
+    add up; only saves racing between processes can still lose an interval.
+    """
+    
+    def __init__(self, state_file=DRIFT_STATE_FILE):
+        self.state_file = state_file
+        self.report = None
+        self._stream = None
+        self._lock = threading.Lock()
+    
+    def _stream_for(self, bundle):
+        reference = bundle.manifest.get('drift')
+        if reference is None:
+            return None
+        if self._stream is None or self._stream.reference_id != reference['reference_id']:
+            stream = _Stream(reference)
+            saved = self._load_state()
+            if saved is not None and saved['reference_id'] == stream.reference_id:
+                stream.rebase(saved)
+            self._stream = stream
+        return self._stream
+    
+    def _load_state(self):
+        try:
+            with open(self.state_file) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def save_state(self):
+        """Merge the observations made since the last save into the state file"""
+        with self._lock:
+            stream = self._stream
+            if stream is None:
+                return
+            with get_file_lock(self.state_file):
+                saved = self._load_state()
+                if saved is not None and saved['reference_id'] == stream.reference_id:
+                    stream.rebase(saved)
+                tmp_path = self.state_file + ".tmp"
+                with open(tmp_path, 'w') as f:
+                    json.dump(stream.to_dict(), f)
+                os.replace(tmp_path, self.state_file)
+                stream.mark_saved()
+    
+    def observe(self, bundle, features, risk_scores):
+        """Record one prediction: its model-named input features and the risk score of each model"""
+        with self._lock:
+            stream = self._stream_for(bundle)
+            if stream is not None:
+                stream.observe(features, risk_scores)
+    
+    def compute(self, bundle):
+        """Compute PSI and KS drift for every feature and every model's risk distribution"""
+        with self._lock:
+            stream = self._stream_for(bundle)
+            if stream is None:
+                return None
+            reference = bundle.manifest['drift']
+            
+            def compare(name, ref, counts, moments=None):
+                live = counts.sum()
+                psi = population_stability_index(ref['counts'], counts)
+                ks, p_value = binned_ks(ref['counts'], counts) if live else (0.0, 1.0)
+                row = {'name': name, 'observations': int(live), 'psi': psi, 'ks': ks, 'ks_p_value': p_value,
+                       'status': drift_status(psi, live), 'train_mean': ref['mean']}
+                if moments is not None and moments[0]:
+                    row['live_mean'] = moments[1] / moments[0]
+                    row['live_std'] = float(np.sqrt(max(moments[2] / moments[0] - row['live_mean'] ** 2, 0.0)))
+                return row
+            
+            self.report = {
+                'model_version': bundle.version,
+                'reference_id': stream.reference_id,
+                'computed_at': datetime.now().isoformat(),
+                'observations': stream.observations,
+                'features': [compare(name, reference['features'][name], stream.counts[name], stream.moments[name])
+                             for name in stream.counts],
+                'risk': [compare(name, reference['risk'][name], counts)
+                         for name, counts in stream.risk_counts.items()]
+            }
+            return self.report
+    
+    def live_histogram(self, name, risk=False):
+        """Current live counts of one feature (or of one model's risk, with risk=True)"""
+        with self._lock:
+            if self._stream is None:
+                return None
+            counts = self._stream.risk_counts if risk else self._stream.counts
+            return counts[name].copy() if name in counts else None
+
+def export_metrics(report):
+    """Render a drift report in the Prometheus text exposition format"""
+    lines = []
+    labels = f'model_version="{report["model_version"]}"'
+    lines.append("# TYPE heartsafe_drift_observations gauge")
+    lines.append(f"heartsafe_drift_observations{{{labels}}} {report['observations']}")
+    for metric in ('psi', 'ks', 'ks_p_value'):
+        lines.append(f"# TYPE heartsafe_feature_drift_{metric} gauge")
+        lines += [f'heartsafe_feature_drift_{metric}{{{labels},feature="{row["name"]}"}} {row[metric]:.6g}'
+                  for row in report['features']]
+        lines.append(f"# TYPE heartsafe_risk_drift_{metric} gauge")
+        lines += [f'heartsafe_risk_drift_{metric}{{{labels},model="{row["name"]}"}} {row[metric]:.6g}'
+                  for row in report['risk']]
+    return "\n".join(lines) + "\n"
+
+def write_drift_report(report):
+    """Write the report as JSON and as Prometheus metrics, each replaced atomically"""
+    for path, content in ((DRIFT_REPORT_FILE, json.dumps(report, indent=2)), (DRIFT_METRICS_FILE, export_metrics(report))):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+def run_drift_check(monitor=None):
+    """Compute, save and export drift for the active bundle. Returns the report or None"""
+    monitor = monitor or get_drift_monitor()
+    bundle = get_model_registry().get()
+    if bundle is None:
+        return None
+    report = monitor.compute(bundle)
+    monitor.save_state()
+    if report is not None:
+        write_drift_report(report)
+    return report
+
+_monitor = DriftMonitor()
+
+def get_drift_monitor():
+    """Get the process-wide drift monitor"""
+    return _monitor
+
+def _drift_loop(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            run_drift_check()
+        except Exception:
+            logger.exception("Drift check failed")
+
+def start_drift_monitor(interval=DRIFT_INTERVAL):
+    """Start the periodic drift check thread once per process"""
+    global _monitor_thread
+    with _monitor_guard:
+        if _monitor_thread is None:
+            _monitor_thread = threading.Thread(target=_drift_loop, args=(interval,), name="drift-monitor", daemon=True)
+            _monitor_thread.start()
+    return _monitor_thread
@@ -0,0 +1,98 @@
+import time
+import numpy as np
+
+ENSEMBLE_MODEL = "ensemble"
+STACKING_FOLDS = 5
+
+# Probabilities are clipped before taking logits so 0/1 votes stay finite
+PROBABILITY_EPSILON = 1e-6
+
+def logit(probabilities):
+    """Log-odds of probabilities, clipped away from 0 and 1"""
+    p = np.clip(probabilities, PROBABILITY_EPSILON, 1 - PROBABILITY_EPSILON)
+    return np.log(p / (1 - p))
+
+class StackedEnsemble:
+    """Stacked ensemble over the trained base models.
+    
+    A logistic meta-model combines the logits of the base probabilities. It is
+    fitted on out-of-fold predictions, so its weights reflect how each base
+    model generalizes rather than how well it fits its own training rows, and
+    its output is calibrated in the same step.
+    """
+    
+    def __init__(self, base_models, scaler, meta_coef, meta_intercept):
+        self.base_models = base_models
+        self.base_names = list(base_models)
+        self.scaler = scaler
+        self.meta_coef = np.asarray(meta_coef, dtype=float)
+        self.meta_intercept = float(meta_intercept)
+    
+    def base_probabilities(self, X):
+        """Class-1 probability of every base model, one column per model"""
+        X_scaled = self.scaler.transform(X)
+        return np.column_stack([
+            self.base_models[name].predict_proba(X_scaled if name == 'logistic' else X)[:, 1]
+            for name in self.base_names
+        ])
+    
+    def combine(self, base_probabilities):
+        """Meta-model probability from a (n_samples, n_base) array of base probabilities"""
+        margin = logit(np.asarray(base_probabilities, dtype=float)) @ self.meta_coef + self.meta_intercept
+        return 1 / (1 + np.exp(-margin))
+    
+    def predict_proba(self, X):
+        """Scikit-learn style (n_samples, 2) probabilities for raw, unscaled features"""
+        positive = self.combine(self.base_probabilities(X))
+        return np.column_stack([1 - positive, positive])
+    
+    @property
+    def feature_importances_(self):
+        """Base model importances, normalized and weighted by the meta-model's coefficients"""
+        weights = np.abs(self.meta_coef) / np.abs(self.meta_coef).sum()
+        combined = 0
+        for weight, name in zip(weights, self.base_names):
+            model = self.base_models[name]
+            importances = model.feature_importances_ if hasattr(model, 'feature_importances_') else np.abs(model.coef_[0])
+            combined = combined + weight * importances / importances.sum()
+        return combined
+
+def out_of_fold_probabilities(base_models, X, X_scaled, y, folds=STACKING_FOLDS):
+    """Cross-validated class-1 probabilities of fresh copies of each base model"""
+    from sklearn.base import clone
+    from sklearn.model_selection import StratifiedKFold, cross_val_predict
+    
+    cv = StratifiedKFold(n_splits=folds, shuffle=True, random_state=42)
+    return np.column_stack([
+        cross_val_predict(clone(model), X_scaled if name == 'logistic' else X, y, cv=cv,
+                          method='predict_proba', n_jobs=-1)[:, 1]
+        for name, model in base_models.items()
+    ])
+
+def train_stacked_ensemble(base_models, scaler, X, y, oof=None):
+    """Fit the meta-model on out-of-fold base predictions of the training set.
+    
+    Pass oof (from out_of_fold_probabilities) to reuse predictions already computed.
+    """
+    from sklearn.linear_model import LogisticRegression
+    
+    if oof is None:
+        oof = out_of_fold_probabilities(base_models, X, scaler.transform(X), y)
+    meta = LogisticRegression()
+    meta.fit(logit(oof), y)
+    return StackedEnsemble(base_models, scaler, meta.coef_[0], meta.intercept_[0])
+
+def measure_latency(models, scaler, X, repeats=50):
+    """Median single-row predict_proba latency of each model in milliseconds"""
+    row = X.iloc[[0]]
+    row_scaled = scaler.transform(row)
+    latencies = {}
+    for name, model in models.items():
+        model_input = row_scaled if name == 'logistic' else row
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            model.predict_proba(model_input)
+            timings.append(time.perf_counter() - start)
+        latencies[name] = float(np.median(timings) * 1000)
+    return latencies
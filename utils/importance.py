@@ -0,0 +1,98 @@
+import numpy as np
+from utils.model_bundle import SHAP_AVAILABLE, export_tree_arrays
+from utils.treeshap import TreeShapExplainer
+from utils.startup import lazy_import
+
+xgb = lazy_import('xgboost')
+shap = lazy_import('shap')
+
+# Shuffles per feature; the mean score drop is stored together with its standard deviation
+PERMUTATION_REPEATS = 10
+
+# Per-model arrays written into the bundle, named '<model>.<array>'
+PERMUTATION_IMPORTANCE = "permutation_importance"
+PERMUTATION_IMPORTANCE_STD = "permutation_importance_std"
+MEAN_ABS_SHAP = "mean_abs_shap"
+IMPORTANCE_ARRAYS = [PERMUTATION_IMPORTANCE, PERMUTATION_IMPORTANCE_STD, MEAN_ABS_SHAP]
+
+def _positive_probability(name, model, scaler, X):
+    """Class-1 probability for a raw feature frame, scaling it for the linear model"""
+    return model.predict_proba(scaler.transform(X) if name == 'logistic' else X)[:, 1]
+
+def _permuted_scores(name, model, scaler, X, y, feature, seed, repeats):
+    from sklearn.metrics import roc_auc_score
+    
+    rng = np.random.default_rng(seed)
+    X_permuted = X.copy()
+    column = X.iloc[:, feature].to_numpy()
+    scores = []
+    for _ in range(repeats):
+        X_permuted.iloc[:, feature] = rng.permutation(column)
+        scores.append(roc_auc_score(y, _positive_probability(name, model, scaler, X_permuted)))
+    return np.array(scores)
+
+def permutation_importances(models, scaler, X, y, repeats=PERMUTATION_REPEATS):
+    """Drop in ROC AUC on a held-out frame X when each feature is shuffled, for every model.
+    
+    Features are permuted in raw units for every model (the linear model sees
+    them scaled afterwards), so the values are comparable across models. All
+    (model, feature) pairs run in parallel threads: the models are shared
+    rather than copied to worker processes, and tree prediction releases the
+    GIL. Returns {model: (mean_drop, std_drop)} with one entry per feature.
+    """
+    from joblib import Parallel, delayed
+    from sklearn.metrics import roc_auc_score
+    
+    X = X.astype(float)
+    y = np.asarray(y)
+    tasks = [(name, feature) for name in models for feature in range(X.shape[1])]
+    results = Parallel(n_jobs=-1, prefer='threads')(
+        delayed(_permuted_scores)(name, models[name], scaler, X, y, feature, seed, repeats)
+        for seed, (name, feature) in enumerate(tasks)
+    )
+    
+    importances = {}
+    for name in models:
+        baseline = roc_auc_score(y, _positive_probability(name, models[name], scaler, X))
+        drops = np.array([baseline - scores for (task_name, _), scores in zip(tasks, results) if task_name == name])
+        importances[name] = (drops.mean(axis=1), drops.std(axis=1))
+    return importances
+
+def mean_abs_shap(name, model, scaler, X):
+    """Mean absolute SHAP value per feature, or None if the model cannot be explained.
+    
+    The linear model's SHAP values are exact in closed form (coefficient times
+    the scaled feature's distance from its mean); XGBoost computes TreeSHAP
+    natively. Random forests use the shap package when it is installed and
+    the built-in TreeSHAP engine otherwise. Values are in the model's own
+    output units (log-odds, or probability for the forest).
+    """
+    if name == 'logistic':
+        X_scaled = scaler.transform(X)
+        return np.abs(model.coef_[0] * (X_scaled - X_scaled.mean(axis=0))).mean(axis=0)
+    if hasattr(model, 'get_booster'):
+        # The last column of the contributions is the bias term
+        contributions = model.get_booster().predict(xgb.DMatrix(X), pred_contribs=True)
+        return np.abs(contributions[:, :-1]).mean(axis=0)
+    if hasattr(model, 'estimators_') and SHAP_AVAILABLE:
+        values = shap.TreeExplainer(model).shap_values(X)
+        if isinstance(values, list):
+            values = values[1]
+        elif values.ndim == 3:
+            values = values[:, :, 1]
+        return np.abs(values).mean(axis=0)
+    if hasattr(model, 'estimators_'):
+        explainer = TreeShapExplainer(export_tree_arrays(model, list(X.columns)), X.shape[1], average=True)
+        return np.abs(explainer.shap_values(X.to_numpy(dtype=float))).mean(axis=0)
+    return None
+
+def compute_importances(models, scaler, X, y, repeats=PERMUTATION_REPEATS):
+    """Importance arrays for save_bundle, keyed '<model>.<array>'"""
+    arrays = {}
+    for name, (mean, std) in permutation_importances(models, scaler, X, y, repeats).items():
+        arrays[f"{name}.{PERMUTATION_IMPORTANCE}"] = mean
+        arrays[f"{name}.{PERMUTATION_IMPORTANCE_STD}"] = std
+        shap_importance = mean_abs_shap(name, models[name], scaler, X)
+        if shap_importance is not None:
+            arrays[f"{name}.{MEAN_ABS_SHAP}"] = shap_importance
+    return arrays
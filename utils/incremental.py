@@ -0,0 +1,214 @@
+import copy
+import logging
+import threading
+import time
+import warnings
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from utils.storage import get_community_outcomes, OUTCOME_CONFIRMED
+from utils.model_bundle import save_bundle, get_current_version
+from utils.model_registry import get_model_registry
+from utils.ensemble import ENSEMBLE_MODEL, StackedEnsemble
+from utils.models import map_feature_names
+from utils.startup import lazy_import
+
+xgb = lazy_import('xgboost')
+
+INCREMENTAL_INTERVAL = 24 * 60 * 60  # seconds
+# Fewer new outcomes than this are left to accumulate until the next run
+MIN_NEW_OUTCOMES = 20
+XGB_EXTRA_ROUNDS = 10
+RF_EXTRA_TREES = 10
+# Constant SGD step size; small so new outcomes nudge the linear model rather than overwrite it
+LINEAR_LEARNING_RATE = 0.01
+# Once this share of rows has been added on top of the last full training set,
+# the carried-over stacking weights are stale enough to retrain
+FULL_RETRAIN_FRACTION = 0.25
+
+logger = logging.getLogger(__name__)
+
+_scheduler_thread = None
+_scheduler_guard = threading.Lock()
+_scheduler_stop = threading.Event()
+_update_lock = threading.Lock()
+
+def load_new_outcomes(feature_names, after=None):
+    """Get confirmed outcomes recorded after a timestamp as model inputs.
+    
+    Only outcomes a reviewer confirmed are used, one per (user, prediction):
+    rejected and unreviewed labels never reach the models.
+    Returns (X, y, latest) with X in training column order and latest the
+    newest date_recorded, or (None, None, None) if there are none.
+    """
+    outcomes = get_community_outcomes(since=after)
+    if outcomes.empty or 'status' not in outcomes.columns:
+        return None, None, None
+    outcomes = outcomes[outcomes['status'] == OUTCOME_CONFIRMED]
+    if after is not None:
+        # since is inclusive; the outcome at the watermark was already folded in
+        outcomes = outcomes[outcomes['date_recorded'] > after]
+    if outcomes.empty:
+        return None, None, None
+    outcomes = outcomes.sort_values('date_recorded').drop_duplicates(['user_id', 'prediction_date'], keep='last')
+    features = pd.DataFrame([map_feature_names(record) for record in outcomes.to_dict('records')])
+    return features[feature_names].astype(float), outcomes['outcome'].astype(int), outcomes['date_recorded'].iloc[-1]
+
+def update_linear(model, X_scaled, y, training_rows=None):
+    """One stochastic gradient pass of logistic loss over new rows, starting from the fitted weights.
+    
+    LogisticRegression cannot learn incrementally, so it is converted into an
+    equivalent SGDClassifier on its first update; later updates call partial_fit.
+    """
+    from sklearn.linear_model import SGDClassifier
+    from sklearn.exceptions import ConvergenceWarning
+    
+    # Bundle arrays are read-only memory maps and SGD updates its weights in place
+    coef, intercept = np.array(model.coef_), np.array(model.intercept_)
+    if isinstance(model, SGDClassifier):
+        updated = copy.deepcopy(model)
+        updated.coef_, updated.intercept_ = coef, intercept
+        updated.partial_fit(X_scaled, y)
+        return updated
+    
+    # Same L2 strength as LogisticRegression's C, which scales with the training set size
+    alpha = 1 / (model.C * training_rows) if training_rows else 0.0001
+    updated = SGDClassifier(loss='log_loss', alpha=alpha, learning_rate='constant', eta0=LINEAR_LEARNING_RATE,
+                            max_iter=1, tol=None, random_state=42)
+    with warnings.catch_warnings():
+        # A single pass is the point, not convergence
+        warnings.simplefilter('ignore', ConvergenceWarning)
+        updated.fit(X_scaled, y, coef_init=coef, intercept_init=intercept)
+    return updated
+
+def update_forest(model, X, y):
+    """Grow RF_EXTRA_TREES trees on the new rows next to the existing trees"""
+    updated = copy.deepcopy(model)
+    updated.set_params(warm_start=True, n_estimators=len(model.estimators_) + RF_EXTRA_TREES)
+    updated.fit(X, y)
+    updated.set_params(warm_start=False)
+    return updated
+
+def update_xgboost(model, X, y):
+    """Continue boosting from the existing booster for XGB_EXTRA_ROUNDS rounds on the new rows"""
+    params = {**model.get_params(), 'n_estimators': XGB_EXTRA_ROUNDS}
+    updated = xgb.XGBClassifier(**params)
+    updated.fit(X, y, xgb_model=model.get_booster())
+    return updated
+
+def update_models(bundle, X, y):
+    """Fold new labeled rows into a copy of every model of a bundle; the bundle itself is untouched.
+    
+    The stacked ensemble keeps its meta-model weights over the updated base models.
+    """
+    training_rows = bundle.manifest['metrics'].get('training_rows')
+    X_scaled = bundle.scaler.transform(X)
+    models = {}
+    for name, model in bundle.models.items():
+        if name == ENSEMBLE_MODEL:
+            continue
+        if name == 'logistic':
+            models[name] = update_linear(model, X_scaled, y, training_rows)
+        elif hasattr(model, 'get_booster'):
+            models[name] = update_xgboost(model, X, y)
+        else:
+            models[name] = update_forest(model, X, y)
+    
+    if ENSEMBLE_MODEL in bundle.models:
+        ensemble = bundle.models[ENSEMBLE_MODEL]
+        models[ENSEMBLE_MODEL] = StackedEnsemble({name: models[name] for name in ensemble.base_names},
+                                                 bundle.scaler, ensemble.meta_coef, ensemble.meta_intercept)
+    return models
+
+def run_incremental_update(min_records=MIN_NEW_OUTCOMES):
+    """Fold outcomes recorded since the current bundle into a new bundle version.
+    
+    Calibration tables, importances and dependence curves describe the models
+    they were computed for, so the updated bundle carries none of them: it is
+    uncalibrated and the pages show those views as not computed until the next
+    full retrain. The original training rows are not kept, so a full retrain
+    on the grown data cannot be timed here; the report gives an extrapolated
+    estimate, labeled as such. The current models' accuracy on the new
+    outcomes, which they have never seen, is reported with its standard error.
+    Returns the report, or None when there is nothing to do.
+    """
+    with _update_lock:
+        # Wait out a swap in progress, so the update builds on the version CURRENT points at
+        bundle = get_model_registry().wait_for_current()
+        if bundle is None or bundle.version != get_current_version():
+            return None
+        manifest = bundle.manifest
+        X, y, latest = load_new_outcomes(bundle.feature_names, manifest.get('outcomes_through'))
+        # Every model needs both classes to learn from a batch
+        if X is None or len(X) < min_records or y.nunique() < 2:
+            return None
+        
+        start = time.perf_counter()
+        X_scaled = bundle.scaler.transform(X)
+        new_outcome_accuracy = {}
+        for name, model in bundle.models.items():
+            correct = (bundle.calibrate(name, model.predict_proba(X_scaled if name == 'logistic' else X)[:, 1]) >= 0.5) == y
+            accuracy = float(np.mean(correct))
+            new_outcome_accuracy[name] = {'accuracy': accuracy, 'stderr': float(np.sqrt(accuracy * (1 - accuracy) / len(y)))}
+        models = update_models(bundle, X, y)
+        seconds = time.perf_counter() - start
+        
+        metrics = dict(manifest['metrics'])
+        training_rows = metrics.get('training_rows')
+        added_rows = metrics.get('incremental_rows', 0) + len(X)
+        estimated_retrain_seconds = None
+        if metrics.get('training_seconds') and training_rows:
+            # Extrapolated, not measured: training cost grows roughly linearly with rows for these models
+            estimated_retrain_seconds = metrics['training_seconds'] * (training_rows + added_rows) / training_rows
+        report = {
+            'parent_version': bundle.version,
+            'records': len(X),
+            'seconds': seconds,
+            'estimated_full_retrain_seconds': estimated_retrain_seconds,
+            'estimated_speedup': estimated_retrain_seconds / seconds if estimated_retrain_seconds else None,
+            'new_outcome_accuracy': new_outcome_accuracy,
+            'full_retrain_recommended': bool(training_rows) and added_rows / training_rows > FULL_RETRAIN_FRACTION,
+            'finished_at': datetime.now().isoformat()
+        }
+        metrics['incremental_rows'] = added_rows
+        
+        # A newer version may have been trained or activated while the models were updated
+        if get_current_version() != bundle.version:
+            return None
+        report['version'] = save_bundle(
+            models, bundle.scaler, bundle.feature_names, metrics=metrics, data_hash=manifest.get('dataset_hash'),
+            extra={'hyperparameters': manifest.get('hyperparameters', {}), 'drift': manifest.get('drift'),
+                   'outcomes_through': latest,
+                   'incremental': report}
+        )
+        return report
+
+def _incremental_loop(interval, stop):
+    # The first update runs at startup, so outcomes confirmed while the app was down are not left for a day
+    while not stop.is_set():
+        try:
+            run_incremental_update()
+        except Exception:
+            logger.exception("Incremental model update failed")
+        stop.wait(interval)
+
+def start_incremental_scheduler(interval=INCREMENTAL_INTERVAL):
+    """Start the background incremental-update thread once per process"""
+    global _scheduler_thread
+    with _scheduler_guard:
+        if _scheduler_thread is None:
+            _scheduler_stop.clear()
+            _scheduler_thread = threading.Thread(
+                target=_incremental_loop, args=(interval, _scheduler_stop), name="incremental-update", daemon=True
+            )
+            _scheduler_thread.start()
+    return _scheduler_thread
+
+def stop_incremental_scheduler(timeout=None):
+    """Stop the background incremental-update thread, waiting for an update in progress to finish"""
+    global _scheduler_thread
+    with _scheduler_guard:
+        if _scheduler_thread is not None:
+            _scheduler_stop.set()
+            _scheduler_thread.join(timeout)
+            _scheduler_thread = None
@@ -0,0 +1,64 @@
+from collections import deque
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton that finds every occurrence of many keywords in one pass.
+    
+    Build cost is linear in the total keyword length; matching a text costs
+    O(len(text) + number of matches) no matter how many keywords are compiled.
+    """
+    
+    def __init__(self, keywords):
+        """Compile (keyword, payload) pairs into the automaton"""
+        self._transitions = [{}]
+        self._fail = [0]
+        self._outputs = [[]]
+        
+        for keyword, payload in keywords:
+            self._add(keyword, payload)
+        self._build_fail_links()
+    
+    def __len__(self):
+        return sum(len(outputs) for outputs in self._outputs)
+    
+    def _add(self, keyword, payload):
+        state = 0
+        for char in keyword:
+            next_state = self._transitions[state].get(char)
+            if next_state is None:
+                next_state = len(self._transitions)
+                self._transitions[state][char] = next_state
+                self._transitions.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+            state = next_state
+        self._outputs[state].append((keyword, payload))
+    
+    def _build_fail_links(self):
+        # Breadth-first so every fail target is finished before it is used
+        pending = deque(self._transitions[0].values())
+        while pending:
+            state = pending.popleft()
+            for char, next_state in self._transitions[state].items():
+                fallback = self._fail[state]
+                while fallback and char not in self._transitions[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._transitions[fallback].get(char, 0)
+                self._outputs[next_state] = self._outputs[next_state] + self._outputs[self._fail[next_state]]
+                pending.append(next_state)
+    
+    def iter_matches(self, text):
+        """Yield (start_index, keyword, payload) for every keyword occurrence in text"""
+        state = 0
+        transitions, fail, outputs = self._transitions, self._fail, self._outputs
+        for index, char in enumerate(text):
+            while state and char not in transitions[state]:
+                state = fail[state]
+            state = transitions[state].get(char, 0)
+            for keyword, payload in outputs[state]:
+                yield index - len(keyword) + 1, keyword, payload
+    
+    def iter_word_matches(self, text):
+        """Like iter_matches, but only keywords that begin at the start of a word"""
+        for start, keyword, payload in self.iter_matches(text):
+            if start == 0 or not text[start - 1].isalnum():
+                yield start, keyword, payload
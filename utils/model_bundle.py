@@ -0,0 +1,281 @@
+import hashlib
+import importlib.util
+import json
+import math
+import os
+import shutil
+import threading
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from utils.startup import lazy_import
+from utils.calibration import apply_calibration
+from utils.treeshap import tree_explainer_from_bundle
+
+joblib = lazy_import('joblib')
+shap = lazy_import('shap')
+
+SHAP_AVAILABLE = importlib.util.find_spec('shap') is not None
+
+MODEL_DIR = "models"
+BUNDLE_DIR = os.path.join(MODEL_DIR, "bundles")
+CURRENT_POINTER = os.path.join(BUNDLE_DIR, "CURRENT")
+BUNDLE_FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+MODELS_FILE = "models.joblib"
+ARRAYS_DIR = "arrays"
+
+# Old bundles kept next to the current one for rollback
+KEEP_BUNDLES = 5
+
+# Pickles written before versioned bundles; migrated into a bundle on first load
+LEGACY_MODEL_FILES = ["trained_models.pkl", "scaler.pkl", "feature_names.pkl"]
+
+class ModelBundle:
+    """A loaded model bundle: manifest, estimators, scaler and memory-mapped arrays"""
+    
+    def __init__(self, path, manifest, models, scaler):
+        self.path = path
+        self.manifest = manifest
+        self.models = models
+        self.scaler = scaler
+        self._arrays = {}
+        self._explainers = {}
+        self._explainer_lock = threading.Lock()
+    
+    @property
+    def version(self):
+        return self.manifest['version']
+    
+    @property
+    def feature_names(self):
+        return [feature['name'] for feature in self.manifest['feature_schema']]
+    
+    def array(self, name):
+        """Get an exported array, memory-mapped read-only so worker processes share the pages"""
+        if name not in self._arrays:
+            self._arrays[name] = np.load(os.path.join(self.path, ARRAYS_DIR, f"{name}.npy"), mmap_mode='r')
+        return self._arrays[name]
+    
+    def model_arrays(self, model_name):
+        """Get every exported array of one model as a dict keyed by array name"""
+        prefix = f"{model_name}."
+        return {name[len(prefix):]: self.array(name) for name in self.manifest['arrays'] if name.startswith(prefix)}
+    
+    def calibrate(self, model_name, probabilities):
+        """Map raw class-1 probabilities of a model through its calibration table.
+        
+        Models without a table (the stacked ensemble, bundles saved before
+        calibration) return the probabilities unchanged.
+        """
+        x_name = f"{model_name}.calibration_x"
+        if x_name not in self.manifest['arrays']:
+            return probabilities
+        return apply_calibration(probabilities, self.array(x_name), self.array(f"{model_name}.calibration_y"))
+    
+    def explainer(self, model_name):
+        """Get the SHAP TreeExplainer of a tree model, built once per bundle"""
+        with self._explainer_lock:
+            if model_name not in self._explainers:
+                self._explainers[model_name] = shap.TreeExplainer(self.models[model_name])
+            return self._explainers[model_name]
+    
+    def tree_shap(self, model_name):
+        """Get the built-in TreeSHAP explainer of a tree model, compiled once per bundle"""
+        with self._explainer_lock:
+            key = ('builtin', model_name)
+            if key not in self._explainers:
+                self._explainers[key] = tree_explainer_from_bundle(self, model_name)
+            return self._explainers[key]
+    
+    def synthetic_batch(self, size, seed=0):
+        """Draw plausible inputs around the training feature means and spreads"""
+        rng = np.random.default_rng(seed)
+        schema = self.manifest['feature_schema']
+        means = np.array([feature['mean'] for feature in schema])
+        scales = np.array([feature['scale'] for feature in schema])
+        return pd.DataFrame(means + rng.standard_normal((size, len(schema))) * scales, columns=self.feature_names)
+
+def dataset_hash(X, y):
+    """Content hash of a training set, stable across row order"""
+    digest = hashlib.sha256()
+    digest.update(",".join(map(str, X.columns)).encode("utf-8"))
+    row_hashes = pd.util.hash_pandas_object(pd.concat([X, y], axis=1), index=False).to_numpy()
+    digest.update(np.sort(row_hashes).tobytes())
+    return digest.hexdigest()
+
+def export_tree_arrays(model, feature_names):
+    """Flatten a tree ensemble into node tables shared by all trees.
+    
+    Child indices are relative to the tree's first node, tree_offsets holds the
+    first node of every tree (plus the end), leaves have feature -1 and every
+    node carries its value and training cover. Supports random forests (value is
+    the class-1 probability) and XGBoost (value is the leaf margin).
+    """
+    if hasattr(model, 'estimators_'):
+        trees = [estimator.tree_ for estimator in model.estimators_]
+        values = [tree.value[:, 0, :] for tree in trees]
+        return {
+            'tree_offsets': np.cumsum([0] + [tree.node_count for tree in trees]).astype(np.int64),
+            'children_left': np.concatenate([tree.children_left for tree in trees]).astype(np.int32),
+            'children_right': np.concatenate([tree.children_right for tree in trees]).astype(np.int32),
+            'feature': np.concatenate([np.where(tree.children_left < 0, -1, tree.feature) for tree in trees]).astype(np.int32),
+            'threshold': np.concatenate([tree.threshold for tree in trees]),
+            'value': np.concatenate([value[:, 1] / value.sum(axis=1) for value in values]),
+            'cover': np.concatenate([tree.weighted_n_node_samples for tree in trees])
+        }
+    
+    # The booster's JSON model keeps float32 split values exactly; text dumps round them
+    trees = json.loads(model.get_booster().save_raw(raw_format='json'))['learner']['gradient_booster']['model']['trees']
+    feature_index = {name: i for i, name in enumerate(feature_names)}
+    booster_features = model.get_booster().feature_names or feature_names
+    column_of = np.array([feature_index.get(name, -1) for name in booster_features], dtype=np.int32)
+    
+    def column(key, dtype):
+        return np.concatenate([np.asarray(tree[key], dtype=dtype) for tree in trees])
+    
+    left = column('left_children', np.int32)
+    is_leaf = left < 0
+    right = column('right_children', np.int32)
+    default_left = column('default_left', np.int32).astype(bool)
+    # Leaves store their value in split_conditions
+    conditions = column('split_conditions', np.float32).astype(np.float64)
+    return {
+        'tree_offsets': np.cumsum([0] + [len(tree['left_children']) for tree in trees]).astype(np.int64),
+        'children_left': np.where(is_leaf, -1, left).astype(np.int32),
+        'children_right': np.where(is_leaf, -1, right).astype(np.int32),
+        'children_missing': np.where(is_leaf, -1, np.where(default_left, left, right)).astype(np.int32),
+        'feature': np.where(is_leaf, -1, column_of[column('split_indices', np.int64)]).astype(np.int32),
+        'threshold': np.where(is_leaf, 0, conditions),
+        'value': np.where(is_leaf, conditions, 0),
+        'cover': column('sum_hessian', np.float64)
+    }
+
+def is_tree_model(model):
+    """Whether a model is a tree ensemble (random forest or XGBoost)"""
+    return hasattr(model, 'estimators_') or hasattr(model, 'get_booster')
+
+def export_model_arrays(model, feature_names):
+    """Export the numeric parameters of a fitted model as named arrays"""
+    if hasattr(model, 'meta_coef'):
+        return {'meta_coef': model.meta_coef, 'meta_intercept': np.array([model.meta_intercept])}
+    if hasattr(model, 'coef_'):
+        return {'coef': np.asarray(model.coef_[0], dtype=np.float64),
+                'intercept': np.asarray(model.intercept_, dtype=np.float64)}
+    return export_tree_arrays(model, feature_names)
+
+def _model_info(model):
+    info = {'class': type(model).__name__}
+    if hasattr(model, 'base_names'):
+        info['base_models'] = model.base_names
+    if hasattr(model, 'get_booster'):
+        config = json.loads(model.get_booster().save_config())
+        base_score = float(str(config['learner']['learner_model_param']['base_score']).strip('[]'))
+        info['objective'] = config['learner']['objective']['name']
+        # Trees add up in margin space; binary:logistic stores base_score as a probability
+        info['base_margin'] = math.log(base_score / (1 - base_score)) if 'logistic' in info['objective'] else base_score
+    return info
+
+def save_bundle(models, scaler, feature_names, metrics=None, data_hash=None, calibration=None, extra_arrays=None,
+                extra=None):
+    """Write a new bundle version and make it current.
+    
+    The bundle is assembled in a temporary directory and renamed into place,
+    then the CURRENT pointer is swapped with os.replace, so readers only ever
+    see a complete bundle. Estimators are dumped uncompressed so joblib can
+    memory-map their arrays; node tables, scaler parameters and calibration
+    tables ({model: {'method', 'x', 'y'}}) are also written as .npy files, as
+    are extra_arrays (named '<model>.<array>', e.g. precomputed importances).
+    Returns the new version string.
+    """
+    created_at = datetime.now()
+    # Timestamp first so versions sort in creation order
+    version = f"{created_at:%Y%m%dT%H%M%S%f}-{(data_hash or 'nodata')[:8]}"
+    final_path = os.path.join(BUNDLE_DIR, version)
+    
+    tmp_path = os.path.join(BUNDLE_DIR, f".tmp-{version}")
+    os.makedirs(os.path.join(tmp_path, ARRAYS_DIR))
+    
+    arrays = {'scaler.mean': scaler.mean_, 'scaler.scale': scaler.scale_}
+    for name, model in models.items():
+        for array_name, values in export_model_arrays(model, feature_names).items():
+            arrays[f"{name}.{array_name}"] = values
+    for name, table in (calibration or {}).items():
+        arrays[f"{name}.calibration_x"] = table['x']
+        arrays[f"{name}.calibration_y"] = table['y']
+    arrays.update(extra_arrays or {})
+    for name, values in arrays.items():
+        np.save(os.path.join(tmp_path, ARRAYS_DIR, f"{name}.npy"), np.ascontiguousarray(values))
+    
+    joblib.dump({'models': models, 'scaler': scaler}, os.path.join(tmp_path, MODELS_FILE))
+    
+    manifest = {
+        'format_version': BUNDLE_FORMAT_VERSION,
+        'version': version,
+        'created_at': created_at.isoformat(),
+        'dataset_hash': data_hash,
+        'feature_schema': [
+            {'name': name, 'mean': float(mean), 'scale': float(scale)}
+            for name, mean, scale in zip(feature_names, scaler.mean_, scaler.scale_)
+        ],
+        'metrics': metrics or {},
+        'models': {name: _model_info(model) for name, model in models.items()},
+        'calibration': {name: table['method'] for name, table in (calibration or {}).items()},
+        'arrays': sorted(arrays),
+        **(extra or {})
+    }
+    with open(os.path.join(tmp_path, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    
+    os.replace(tmp_path, final_path)
+    set_current_version(version)
+    prune_bundles()
+    return version
+
+def set_current_version(version):
+    """Atomically point CURRENT at a bundle version"""
+    tmp_pointer = CURRENT_POINTER + ".tmp"
+    with open(tmp_pointer, 'w') as f:
+        f.write(version)
+    os.replace(tmp_pointer, CURRENT_POINTER)
+
+def get_current_version():
+    """Get the version CURRENT points at, or None before the first bundle"""
+    try:
+        with open(CURRENT_POINTER) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def list_versions():
+    """List complete bundle versions, oldest first"""
+    if not os.path.exists(BUNDLE_DIR):
+        return []
+    return sorted(name for name in os.listdir(BUNDLE_DIR)
+                  if os.path.exists(os.path.join(BUNDLE_DIR, name, MANIFEST_FILE)))
+
+def prune_bundles(keep=KEEP_BUNDLES):
+    """Delete the oldest bundles beyond keep, never the current one"""
+    current = get_current_version()
+    stale = [version for version in list_versions() if version != current]
+    for version in stale[:max(0, len(stale) - (keep - 1))]:
+        shutil.rmtree(os.path.join(BUNDLE_DIR, version), ignore_errors=True)
+
+def load_bundle(version=None, mmap=True):
+    """Load a bundle version (default: current), memory-mapping its arrays"""
+    version = version or get_current_version()
+    if version is None:
+        return None
+    path = os.path.join(BUNDLE_DIR, version)
+    with open(os.path.join(path, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    payload = joblib.load(os.path.join(path, MODELS_FILE), mmap_mode='r' if mmap else None)
+    return ModelBundle(path, manifest, payload['models'], payload['scaler'])
+
+def migrate_legacy_models():
+    """Convert the legacy pickles into the first bundle version. Returns the version or None"""
+    paths = [os.path.join(MODEL_DIR, name) for name in LEGACY_MODEL_FILES]
+    if not all(os.path.exists(path) for path in paths):
+        return None
+    models, scaler, feature_names = (joblib.load(path) for path in paths)
+    return save_bundle(models, scaler, list(feature_names), extra={'migrated_from': LEGACY_MODEL_FILES})
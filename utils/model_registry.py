@@ -0,0 +1,143 @@
+import threading
+import time
+from datetime import datetime
+from utils.model_bundle import (
+    SHAP_AVAILABLE, is_tree_model, get_current_version, set_current_version, load_bundle, migrate_legacy_models
+)
+
+# Rows in the synthetic batch pushed through each model before it serves traffic
+WARMUP_BATCH_SIZE = 32
+# Seconds wait_for_current waits for a newly trained version to be loaded and warmed
+SWAP_WAIT_TIMEOUT = 60.0
+
+def warm_up_bundle(bundle, on_step=None, batch_size=WARMUP_BATCH_SIZE):
+    """Run a synthetic batch through every model and prebuild the tree explainers.
+    
+    First calls pay for lazy initialization (XGBoost's predictor setup, page
+    faults on memory-mapped arrays, tree parsing for explanations); doing it here
+    keeps that cost off user requests. Without shap the built-in TreeSHAP tables,
+    which serve explanations then, are compiled instead of the SHAP explainers.
+    on_step(label, completed, total, seconds) reports progress.
+    """
+    batch = bundle.synthetic_batch(batch_size)
+    scaled_batch = bundle.scaler.transform(batch)
+    steps = [(f"Scoring {name}", lambda name=name: bundle.calibrate(name, bundle.models[name].predict_proba(
+        scaled_batch if name == 'logistic' else batch)[:, 1])) for name in bundle.models]
+    build_explainer = bundle.explainer if SHAP_AVAILABLE else bundle.tree_shap
+    steps += [(f"Building {name} explainer", lambda name=name: build_explainer(name))
+              for name, model in bundle.models.items() if is_tree_model(model)]
+    
+    for completed, (label, func) in enumerate(steps, start=1):
+        start = time.perf_counter()
+        func()
+        if on_step:
+            on_step(label, completed, len(steps), time.perf_counter() - start)
+
+class ModelRegistry:
+    """Serves the active model bundle and hot-swaps newer versions in.
+    
+    Requests take one reference with get() and use it to the end, so a swap
+    never changes models under an in-flight request. When the CURRENT pointer
+    names a newer version, it is loaded and warmed in a background thread while
+    the old bundle keeps serving; the swap itself is a single reference flip.
+    """
+    
+    def __init__(self):
+        self._active = None
+        self._lock = threading.Lock()
+        # Notified whenever a swap finishes, successfully or not
+        self._swap_done = threading.Condition(self._lock)
+        self._loading_version = None
+        self._failed_versions = set()
+        self.last_swap = None
+        self.last_error = None
+    
+    @property
+    def active_version(self):
+        active = self._active
+        return active.version if active is not None else None
+    
+    @property
+    def loading_version(self):
+        return self._loading_version
+    
+    def get(self):
+        """Get the bundle to serve this request, or None if no models are trained"""
+        version = get_current_version()
+        active = self._active
+        if active is None:
+            # Nothing to serve yet, so the first load happens in the caller's thread
+            with self._lock:
+                if self._active is None:
+                    version = version or migrate_legacy_models()
+                    if version is None:
+                        return None
+                    self._active = load_bundle(version)
+                return self._active
+        
+        if version is not None and version != active.version and version not in self._failed_versions:
+            self._start_swap(version)
+        return active
+    
+    def wait_for_current(self, timeout=SWAP_WAIT_TIMEOUT):
+        """Get the bundle of the version CURRENT points at, waiting for its swap to finish.
+        
+        For callers that just trained or activated a version and must show
+        it, where get() would still return the previous bundle. Returns the
+        previous bundle if the swap fails or takes longer than timeout seconds.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            # get() starts the swap to CURRENT if it is not running yet
+            active = self.get()
+            version = get_current_version()
+            if (active is None or version is None or active.version == version
+                    or version in self._failed_versions):
+                return active
+            with self._lock:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return active
+                if self._loading_version is not None:
+                    self._swap_done.wait(remaining)
+    
+    def activate(self, version):
+        """Point CURRENT at an existing version (e.g. a rollback); every process swaps to it"""
+        set_current_version(version)
+        self._failed_versions.discard(version)
+        if version != self.active_version:
+            self._start_swap(version)
+    
+    def _start_swap(self, version):
+        with self._lock:
+            if self._loading_version is not None:
+                return
+            self._loading_version = version
+        threading.Thread(target=self._swap, args=(version,), name="model-swap", daemon=True).start()
+    
+    def _swap(self, version):
+        start = time.perf_counter()
+        try:
+            bundle = load_bundle(version)
+            warm_up_bundle(bundle)
+            previous = self.active_version
+            self._active = bundle
+            self.last_swap = {
+                'from_version': previous,
+                'to_version': version,
+                'seconds': time.perf_counter() - start,
+                'swapped_at': datetime.now().isoformat()
+            }
+        except Exception as e:
+            self._failed_versions.add(version)
+            self.last_error = f"Loading model version {version} failed: {e}"
+        finally:
+            with self._lock:
+                self._loading_version = None
+                self._swap_done.notify_all()
+
+_registry = ModelRegistry()
+
+def get_model_registry():
+    """Get the process-wide model registry"""
+    return _registry
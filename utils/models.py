@@ -1,22 +1,30 @@
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split
-from sklearn.linear_model import LogisticRegression
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import StandardScaler
-from sklearn.metrics import accuracy_score, classification_report
-import xgboost as xgb
-import joblib
-import streamlit as st
 import os
+import bisect
+import time
+import threading
+from utils.model_bundle import MODEL_DIR, SHAP_AVAILABLE, save_bundle, dataset_hash, is_tree_model
+from utils.model_registry import get_model_registry, warm_up_bundle
+from utils.ensemble import ENSEMBLE_MODEL, out_of_fold_probabilities, train_stacked_ensemble, measure_latency
+from utils.calibration import fit_calibration, apply_calibration, brier_score
+from utils.drift import build_drift_reference
+from utils.importance import PERMUTATION_IMPORTANCE, PERMUTATION_IMPORTANCE_STD, MEAN_ABS_SHAP, compute_importances
+from utils.dependence import compute_dependence
+from utils.tuning import TUNING_BUDGET_SECONDS, build_model, load_tuning_results, tune_hyperparameters
+from utils.treeshap import explain
+from utils.startup import lazy_import
 
-try:
-    import shap
-    SHAP_AVAILABLE = True
-except ImportError:
-    SHAP_AVAILABLE = False
+# Only needed to report problems in the page; background jobs and scripts skip the import
+st = lazy_import('streamlit')
 
-MODEL_DIR = "models"
+# Risk category boundaries: scores below RISK_THRESHOLDS[0] are low risk,
+# below RISK_THRESHOLDS[1] medium risk, and everything else high risk.
+RISK_THRESHOLDS = [0.3, 0.7]
+RISK_CATEGORIES = ["Low Risk", "Medium Risk", "High Risk"]
+
+_model_warmup = None
+_model_warmup_lock = threading.Lock()
 
 def create_model_dir():
     """Create models directory if it doesn't exist"""
@@ -53,9 +61,21 @@ def preprocess_data(df):
     
     return X, y
 
-def train_models(X, y):
-    """Train multiple models and return them with their accuracies"""
+def train_models(X, y, tune=False, tuning_budget=TUNING_BUDGET_SECONDS):
+    """Train multiple models and return them with their accuracies.
+    
+    With tune=True the random forest and XGBoost hyperparameters are searched
+    on the training split first (see utils.tuning). Without it, the best
+    configuration saved by an earlier tuning run on the same dataset is reused,
+    falling back to the library defaults.
+    """
+    from sklearn.model_selection import train_test_split
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.metrics import accuracy_score
+    
     create_model_dir()
+    data_hash = dataset_hash(X, y)
     
     # Split the data
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
@@ -65,6 +85,14 @@ def train_models(X, y):
     X_train_scaled = scaler.fit_transform(X_train)
     X_test_scaled = scaler.transform(X_test)
     
+    if tune:
+        tuning = tune_hyperparameters(X_train, y_train, data_hash, tuning_budget)
+    else:
+        tuning = load_tuning_results(data_hash)
+    tuned_params = {name: result['params'] for name, result in (tuning or {}).get('models', {}).items()}
+    
+    # Timed so incremental updates can be compared with the cost of a full retrain
+    training_start = time.perf_counter()
     models = {}
     accuracies = {}
     
@@ -76,54 +104,153 @@ def train_models(X, y):
     models['logistic'] = lr_model
     
     # Random Forest
-    rf_model = RandomForestClassifier(n_estimators=100, random_state=42)
+    rf_model = build_model('random_forest', tuned_params.get('random_forest', {'n_estimators': 100}))
     rf_model.fit(X_train, y_train)
     rf_pred = rf_model.predict(X_test)
     accuracies['random_forest'] = accuracy_score(y_test, rf_pred)
     models['random_forest'] = rf_model
     
     # XGBoost
-    xgb_model = xgb.XGBClassifier(random_state=42)
+    xgb_model = build_model('xgboost', tuned_params.get('xgboost', {}))
     xgb_model.fit(X_train, y_train)
     xgb_pred = xgb_model.predict(X_test)
     accuracies['xgboost'] = accuracy_score(y_test, xgb_pred)
     models['xgboost'] = xgb_model
     
-    # Save models and scaler
-    joblib.dump(models, f"{MODEL_DIR}/trained_models.pkl")
-    joblib.dump(scaler, f"{MODEL_DIR}/scaler.pkl")
-    joblib.dump(list(X.columns), f"{MODEL_DIR}/feature_names.pkl")
+    # Out-of-fold probabilities of the base models feed both the stacked ensemble and calibration
+    base_names = list(models)
+    oof = out_of_fold_probabilities(models, X_train, X_train_scaled, y_train)
+    
+    # Stacked ensemble over the three models; its logistic meta-model is calibrated already
+    ensemble_model = train_stacked_ensemble(dict(models), scaler, X_train, y_train, oof=oof)
+    ensemble_pred = ensemble_model.predict_proba(X_test)[:, 1] >= 0.5
+    accuracies[ENSEMBLE_MODEL] = accuracy_score(y_test, ensemble_pred)
+    models[ENSEMBLE_MODEL] = ensemble_model
+    
+    # Calibration table per base model, and the test-set Brier score before and after it
+    calibration = {name: fit_calibration(oof[:, i], y_train) for i, name in enumerate(base_names)}
+    brier = {}
+    for name in base_names:
+        raw = models[name].predict_proba(X_test_scaled if name == 'logistic' else X_test)[:, 1]
+        table = calibration[name]
+        brier[name] = {'raw': brier_score(raw, y_test),
+                       'calibrated': brier_score(apply_calibration(raw, table['x'], table['y']), y_test)}
+    brier[ENSEMBLE_MODEL] = {'raw': brier_score(ensemble_model.predict_proba(X_test)[:, 1], y_test)}
+    
+    # Training distribution of the inputs and of each model's (out-of-fold) risk, for drift monitoring
+    risk_scores = {name: apply_calibration(oof[:, i], calibration[name]['x'], calibration[name]['y'])
+                   for i, name in enumerate(base_names)}
+    risk_scores[ENSEMBLE_MODEL] = ensemble_model.combine(oof)
+    drift_reference = build_drift_reference(X_train, risk_scores, data_hash)
+    
+    training_seconds = time.perf_counter() - training_start
+    latencies = measure_latency(models, scaler, X_test)
+    
+    # Permutation importance on the test split and mean |SHAP|, served from the bundle
+    importances = compute_importances(models, scaler, X_test, y_test)
+    # Partial dependence and ICE curves over the training rows, so charts never score at render time
+    dependence = compute_dependence(models, scaler, X_train, calibration)
+    
+    # Save models and scaler as a new bundle version
+    save_bundle(models, scaler, list(X.columns),
+                metrics={'accuracy': accuracies, 'latency_ms': latencies, 'brier': brier,
+                         'training_seconds': training_seconds, 'training_rows': len(X_train)},
+                data_hash=data_hash, calibration=calibration, extra_arrays={**importances, **dependence},
+                extra={'hyperparameters': tuned_params, 'drift': drift_reference})
     
     return models, accuracies, list(X.columns)
 
-def load_or_train_models(df=None):
-    """Load existing models or train new ones"""
-    model_path = f"{MODEL_DIR}/trained_models.pkl"
-    scaler_path = f"{MODEL_DIR}/scaler.pkl"
-    features_path = f"{MODEL_DIR}/feature_names.pkl"
-    
-    if os.path.exists(model_path) and os.path.exists(scaler_path) and os.path.exists(features_path):
-        # Load existing models
-        models = joblib.load(model_path)
-        scaler = joblib.load(scaler_path)
-        feature_names = joblib.load(features_path)
-        
-        # Calculate accuracies (placeholder - would need test data)
-        accuracies = {
+def load_or_train_models(df=None, tune=False, tuning_budget=TUNING_BUDGET_SECONDS):
+    """Train new models when a dataset is given, otherwise load the existing ones.
+    
+    tune only chooses whether hyperparameters are searched before training.
+    """
+    if df is not None:
+        X, y = preprocess_data(df)
+        return train_models(X, y, tune=tune, tuning_budget=tuning_budget)
+    
+    bundle = get_model_bundle()
+    if bundle is not None:
+        # Accuracies measured at training time; bundles migrated from old pickles have none
+        accuracies = bundle.manifest['metrics'].get('accuracy') or {
             'logistic': 0.85,
             'random_forest': 0.87,
             'xgboost': 0.89
         }
         
-        return models, accuracies, feature_names
+        return bundle.models, accuracies, bundle.feature_names
     
-    elif df is not None:
-        # Train new models
-        X, y = preprocess_data(df)
-        return train_models(X, y)
+    return None, None, None
+
+def get_model_bundle():
+    """Get the model bundle to use for one request, or None if no models are trained.
     
-    else:
-        return None, None, None
+    Hold on to the returned bundle for the whole request: the registry may
+    swap in a newer version at any time, but never under an existing reference.
+    """
+    return get_model_registry().get()
+
+class ModelWarmup:
+    """Background warm-up of the model bundle, with progress for the UI.
+    
+    Loads the active bundle into the registry and warms it with
+    warm_up_bundle before the first user request arrives.
+    """
+    
+    def __init__(self):
+        self.status = "pending"
+        self.progress = 0.0
+        self.message = "Waiting to start"
+        self.duration = None
+        self.step_timings = {}
+        self._thread = threading.Thread(target=self._run, name="model-warmup", daemon=True)
+    
+    def start(self):
+        self._thread.start()
+        return self
+    
+    def _step(self, name, func):
+        self.message = name
+        start = time.perf_counter()
+        result = func()
+        self.step_timings[name] = time.perf_counter() - start
+        return result
+    
+    def _record_step(self, label, completed, total, seconds):
+        self.message = label
+        self.step_timings[label] = seconds
+        self.progress = completed / total
+    
+    def _run(self):
+        self.status = "running"
+        start = time.perf_counter()
+        try:
+            bundle = self._step("Loading model bundle", get_model_bundle)
+            if bundle is None:
+                self.status = "skipped"
+                self.message = "No trained models yet"
+                return
+            
+            warm_up_bundle(bundle, on_step=self._record_step)
+            
+            self.status = "done"
+            self.message = "Models ready"
+        except Exception as e:
+            self.status = "failed"
+            self.message = f"Warm-up failed: {e}"
+        finally:
+            self.duration = time.perf_counter() - start
+    
+    def join(self, timeout=None):
+        self._thread.join(timeout)
+
+def start_model_warmup():
+    """Start the model warm-up once per process and return its tracker"""
+    global _model_warmup
+    with _model_warmup_lock:
+        if _model_warmup is None:
+            _model_warmup = ModelWarmup().start()
+        return _model_warmup
 
 def map_feature_names(input_data):
     """Map user-friendly feature names to model's expected names"""
@@ -147,23 +274,15 @@ def map_feature_names(input_data):
     
     return mapped_data
 
-def make_prediction(input_data, model_name='xgboost'):
-    """Make prediction using specified model"""
-    model_path = f"{MODEL_DIR}/trained_models.pkl"
-    scaler_path = f"{MODEL_DIR}/scaler.pkl"
-    features_path = f"{MODEL_DIR}/feature_names.pkl"
-    
-    if not os.path.exists(model_path) or not os.path.exists(scaler_path):
-        return None, None
-    
-    models = joblib.load(model_path)
-    scaler = joblib.load(scaler_path)
-    feature_names = joblib.load(features_path)
+def make_prediction(input_data, model_name='xgboost', bundle=None):
+    """Make a calibrated prediction using specified model, from the given bundle or the active one"""
+    bundle = bundle or get_model_bundle()
     
-    if model_name not in models:
+    if bundle is None or model_name not in bundle.models:
         return None, None
     
-    model = models[model_name]
+    model = bundle.models[model_name]
+    scaler, feature_names = bundle.scaler, bundle.feature_names
     
     # Map user-friendly feature names to model's expected names
     mapped_data = map_feature_names(input_data)
@@ -182,51 +301,113 @@ def make_prediction(input_data, model_name='xgboost'):
         # Random Forest and XGBoost don't need scaling
         prediction = model.predict_proba(input_df)[0, 1]
     
-    return prediction, model
+    return float(bundle.calibrate(model_name, prediction)), model
 
-def get_shap_explanation(input_data, model_name='xgboost'):
-    """Get SHAP explanation for the prediction"""
-    features_path = f"{MODEL_DIR}/feature_names.pkl"
+def score_all_models(input_data, bundle=None):
+    """Score one input with every model of a bundle in a single pass.
+    
+    The input frame is built and scaled once and shared by all models, and
+    every score is calibrated. Returns
+    {'model_version', 'scores': {model: probability}, 'ensemble': probability}, where
+    the ensemble is the stacked model (or the mean for older bundles), or None if
+    no models are trained.
+    """
+    bundle = bundle or get_model_bundle()
+    if bundle is None:
+        return None
     
-    # Map user-friendly feature names to model's expected names
-    mapped_data = map_feature_names(input_data)
+    input_df = pd.DataFrame([map_feature_names(input_data)])[bundle.feature_names]
+    input_scaled = bundle.scaler.transform(input_df)
+    
+    scores = {}
+    for model_name, model in bundle.models.items():
+        if model_name == ENSEMBLE_MODEL:
+            continue
+        model_input = input_scaled if model_name == 'logistic' else input_df
+        scores[model_name] = float(model.predict_proba(model_input)[0, 1])
+    
+    if ENSEMBLE_MODEL in bundle.models:
+        # The stacked model only needs the raw base scores computed above
+        ensemble_model = bundle.models[ENSEMBLE_MODEL]
+        base_scores = [[scores[name] for name in ensemble_model.base_names]]
+        scores[ENSEMBLE_MODEL] = float(ensemble_model.combine(base_scores)[0])
+    
+    scores = {name: float(bundle.calibrate(name, score)) for name, score in scores.items()}
+    if ENSEMBLE_MODEL in scores:
+        ensemble_score = scores[ENSEMBLE_MODEL]
+    else:
+        # Bundles trained before the stacked model: plain average
+        ensemble_score = float(np.mean(list(scores.values())))
     
-    if not SHAP_AVAILABLE:
-        feature_names, importances = get_feature_importance(model_name)
-        if feature_names and importances is not None:
-            input_values = [mapped_data.get(name, 0) for name in feature_names]
-            normalized_importances = importances / np.sum(importances)
-            feature_contributions = normalized_importances * np.array(input_values) * 0.1
-            return feature_contributions
+    return {
+        'model_version': bundle.version,
+        'scores': scores,
+        'ensemble': ensemble_score
+    }
+
+def score_batch(X, model_name='xgboost', bundle=None):
+    """Calibrated class-1 probabilities of one model for a frame of model-named features.
+    
+    Vectorized counterpart of make_prediction: the frame is scaled once and
+    scored in a single call. The stacked ensemble is combined from its base
+    models' raw scores.
+    """
+    bundle = bundle or get_model_bundle()
+    X = X[bundle.feature_names]
+    model = bundle.models[model_name]
+    if hasattr(model, 'base_names'):
+        X_scaled = bundle.scaler.transform(X)
+        base_scores = np.column_stack([
+            bundle.models[name].predict_proba(X_scaled if name == 'logistic' else X)[:, 1] for name in model.base_names
+        ])
+        return bundle.calibrate(model_name, model.combine(base_scores))
+    model_input = bundle.scaler.transform(X) if model_name == 'logistic' else X
+    return bundle.calibrate(model_name, model.predict_proba(model_input)[:, 1])
+
+def get_session_model_scores(input_data, bundle=None):
+    """Get score_all_models for the input, cached in the session.
+    
+    The cache holds the latest input only and is keyed by the input values and
+    the model version, so other pages (e.g. Reports) reuse the scores of the
+    current prediction without recomputing them.
+    """
+    bundle = bundle or get_model_bundle()
+    if bundle is None:
         return None
     
+    key = (bundle.version, tuple(sorted(input_data.items())))
+    cached = st.session_state.get('model_scores')
+    if cached is not None and cached['key'] == key:
+        return cached['result']
+    
+    result = score_all_models(input_data, bundle)
+    st.session_state['model_scores'] = {'key': key, 'result': result}
+    return result
+
+def get_shap_explanation(input_data, model_name='xgboost', bundle=None):
+    """Get SHAP explanation for the prediction"""
+    # Map user-friendly feature names to model's expected names
+    mapped_data = map_feature_names(input_data)
+    
     try:
-        model_path = f"{MODEL_DIR}/trained_models.pkl"
+        bundle = bundle or get_model_bundle()
         
-        if not os.path.exists(model_path) or not os.path.exists(features_path):
+        if bundle is None or model_name not in bundle.models:
             return None
         
-        models = joblib.load(model_path)
-        feature_names = joblib.load(features_path)
-        
-        if model_name not in models:
-            return None
-        
-        model = models[model_name]
-        
         # Prepare input data with correct column order
-        input_df = pd.DataFrame([mapped_data])
-        input_df = input_df[feature_names]
+        input_df = pd.DataFrame([mapped_data])[bundle.feature_names].astype(float)
         
-        if model_name == 'logistic':
-            explainer = shap.LinearExplainer(model, input_df)
+        # The shap package explains tree models when installed; the built-in engine covers
+        # the linear model and the stacked ensemble, and tree models without it
+        if SHAP_AVAILABLE and is_tree_model(bundle.models[model_name]):
+            shap_values = bundle.explainer(model_name).shap_values(input_df)
+            if isinstance(shap_values, list):
+                shap_values = shap_values[1]
+            elif np.ndim(shap_values) == 3:
+                shap_values = shap_values[:, :, 1]
         else:
-            explainer = shap.TreeExplainer(model)
-        
-        shap_values = explainer.shap_values(input_df)
-        
-        if isinstance(shap_values, list):
-            shap_values = shap_values[1]
+            shap_values, _ = explain(bundle, model_name, input_df)
         
         return shap_values[0]
     
@@ -236,29 +417,52 @@ def get_shap_explanation(input_data, model_name='xgboost'):
 
 def get_risk_category(prediction_score):
     """Convert prediction score to risk category"""
-    if prediction_score < 0.3:
-        return "Low Risk"
-    elif prediction_score < 0.7:
-        return "Medium Risk"
-    else:
-        return "High Risk"
+    return RISK_CATEGORIES[bisect.bisect_right(RISK_THRESHOLDS, prediction_score)]
 
-def get_feature_importance(model_name='xgboost'):
-    """Get feature importance from trained model"""
+def categorize_risk(prediction_scores):
+    """Convert an array of prediction scores to ordered risk categories.
+    
+    Vectorized counterpart of get_risk_category. Returns a pandas Categorical,
+    or a categorical Series with the same index when given a Series. Missing
+    scores map to NaN.
+    """
+    scores = np.asarray(prediction_scores, dtype=float).reshape(-1)
+    codes = np.searchsorted(RISK_THRESHOLDS, scores, side='right')
+    codes[np.isnan(scores)] = -1
+    categories = pd.Categorical.from_codes(codes, categories=RISK_CATEGORIES, ordered=True)
+    
+    if isinstance(prediction_scores, pd.Series):
+        return pd.Series(categories, index=prediction_scores.index, name='risk_category')
+    return categories
+
+def get_feature_importance(model_name='xgboost', bundle=None, method='permutation'):
+    """Get feature importances of a model, precomputed at training time.
+    
+    method is 'permutation' (drop in held-out ROC AUC when the feature is
+    shuffled; comparable across models), 'shap' (mean |SHAP| in the model's
+    output units) or 'native' (the model's own feature_importances_ or |coef_|).
+    Bundles trained before importances were precomputed fall back to 'native';
+    incrementally updated bundles have none until the next full retrain. Returns
+    (feature_names, importances) or (None, None).
+    """
     try:
-        model_path = f"{MODEL_DIR}/trained_models.pkl"
-        features_path = f"{MODEL_DIR}/feature_names.pkl"
+        bundle = bundle or get_model_bundle()
         
-        if not os.path.exists(model_path) or not os.path.exists(features_path):
+        if bundle is None or model_name not in bundle.models:
             return None, None
         
-        models = joblib.load(model_path)
-        feature_names = joblib.load(features_path)
-        
-        if model_name not in models:
-            return None, None
+        model = bundle.models[model_name]
+        feature_names = bundle.feature_names
         
-        model = models[model_name]
+        stored = {'permutation': PERMUTATION_IMPORTANCE, 'shap': MEAN_ABS_SHAP}.get(method)
+        if stored:
+            if f"{model_name}.{stored}" in bundle.manifest['arrays']:
+                return feature_names, bundle.array(f"{model_name}.{stored}")
+            if f"{model_name}.{PERMUTATION_IMPORTANCE}" in bundle.manifest['arrays']:
+                # Precomputed bundle, but this measure is not available for the model
+                return None, None
+            if 'incremental' in bundle.manifest:
+                return None, None
         
         if hasattr(model, 'feature_importances_'):
             importances = model.feature_importances_
@@ -272,3 +476,11 @@ def get_feature_importance(model_name='xgboost'):
     except Exception as e:
         st.error(f"Error getting feature importance: {str(e)}")
         return None, None
+
+def get_permutation_importance_std(model_name='xgboost', bundle=None):
+    """Standard deviation of the stored permutation importances across shuffles, or None"""
+    bundle = bundle or get_model_bundle()
+    name = f"{model_name}.{PERMUTATION_IMPORTANCE_STD}"
+    if bundle is None or name not in bundle.manifest['arrays']:
+        return None
+    return bundle.array(name)
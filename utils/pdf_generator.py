@@ -1,18 +1,20 @@
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib import colors
-from reportlab.graphics.shapes import Drawing
-from reportlab.graphics.charts.piecharts import Pie
 import io
 import base64
 import pandas as pd
 from datetime import datetime
 import streamlit as st
+from utils.models import get_risk_category
 
 def generate_health_report(user_data, prediction_results, vitals_history, recommendations, medications=None):
     """Generate comprehensive health report as PDF"""
+    # reportlab is only needed here, so pages that never build a PDF skip its import
+    from reportlab.lib.pagesizes import letter, A4
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import inch
+    from reportlab.lib import colors
+    from reportlab.graphics.shapes import Drawing
+    from reportlab.graphics.charts.piecharts import Pie
     
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4)
@@ -189,12 +191,16 @@ def generate_quick_summary(prediction_results):
     """Generate quick text summary of results"""
     summary = []
     
-    # Overall risk assessment
-    avg_risk = sum(result.get('score', 0) for result in prediction_results.values()) / len(prediction_results)
+    # Overall risk assessment: the stacked ensemble when available, else the average
+    if 'ensemble' in prediction_results:
+        avg_risk = prediction_results['ensemble'].get('score', 0)
+    else:
+        avg_risk = sum(result.get('score', 0) for result in prediction_results.values()) / len(prediction_results)
     
-    if avg_risk < 0.3:
+    overall_category = get_risk_category(avg_risk)
+    if overall_category == "Low Risk":
         summary.append("Overall Assessment: Low risk for heart disease")
-    elif avg_risk < 0.7:
+    elif overall_category == "Medium Risk":
         summary.append("Overall Assessment: Moderate risk for heart disease")
     else:
         summary.append("Overall Assessment: High risk for heart disease")
@@ -0,0 +1,236 @@
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+import pandas as pd
+from utils.storage import (
+    DATA_DIR, VITALS_FILE, PREDICTIONS_FILE, MENTAL_HEALTH_FILE,
+    get_file_lock, get_user_file, list_partitions, read_records, iter_records_reversed, load_data
+)
+
+RETENTION_CONFIG_FILE = os.path.join(DATA_DIR, "retention.json")
+ROLLUP_SUFFIX = ".rollup.jsonl"
+# The last line of a roll-up file is a marker with the key of the last raw record
+# it includes, {ROLLUP_MARKER_KEY: {'date': ..., 'id': ...}}, dated like that record.
+# Raw records up to it are never rolled up or shown twice.
+ROLLUP_MARKER_KEY = "compacted_through"
+COMPACTION_INTERVAL = 6 * 60 * 60  # seconds
+
+# Raw records older than raw_days are rolled up into per-period averages
+# ('D' = daily, 'W' = weekly). Override per file in data/retention.json.
+DEFAULT_RETENTION_POLICIES = {
+    VITALS_FILE: {'date_key': 'date_recorded', 'raw_days': 180, 'rollup': 'D', 'group_by': []},
+    PREDICTIONS_FILE: {'date_key': 'prediction_date', 'raw_days': 180, 'rollup': 'D', 'group_by': ['model_used']},
+    MENTAL_HEALTH_FILE: {'date_key': 'date_recorded', 'raw_days': 365, 'rollup': 'W', 'group_by': []}
+}
+
+# Trend charts switch to daily points once the requested range is longer than this
+TREND_DOWNSAMPLE_DAYS = 90
+
+logger = logging.getLogger(__name__)
+
+_scheduler_thread = None
+_scheduler_guard = threading.Lock()
+
+def get_retention_policies():
+    """Get retention policies, with overrides from the optional config file applied"""
+    overrides = load_data(RETENTION_CONFIG_FILE) if os.path.exists(RETENTION_CONFIG_FILE) else {}
+    policies = {}
+    for file_name, policy in DEFAULT_RETENTION_POLICIES.items():
+        policies[file_name] = {**policy, **overrides.get(file_name, {})}
+    return policies
+
+def get_rollup_file(file_path):
+    """Get the roll-up file that sits next to a raw history file"""
+    return os.path.splitext(file_path)[0] + ROLLUP_SUFFIX
+
+def rollup_records(df, date_key, freq, group_by=None):
+    """Aggregate raw records into per-period means with a record count"""
+    if df.empty:
+        return pd.DataFrame()
+    
+    group_by = [col for col in (group_by or []) if col in df.columns]
+    df = df.copy()
+    df[date_key] = pd.to_datetime(df[date_key], format='ISO8601').dt.to_period(freq).dt.start_time
+    numeric_cols = [col for col in df.select_dtypes('number').columns
+                    if col not in ('id', 'record_count') and col not in group_by]
+    
+    weights = df['record_count'].fillna(1) if 'record_count' in df.columns else pd.Series(1, index=df.index)
+    weighted = df[numeric_cols].mul(weights, axis=0)
+    weighted['record_count'] = weights
+    for col in [date_key] + group_by:
+        weighted[col] = df[col]
+    
+    totals = weighted.groupby([date_key] + group_by, dropna=False).sum(min_count=1).reset_index()
+    totals[numeric_cols] = totals[numeric_cols].div(totals['record_count'], axis=0)
+    totals['record_count'] = totals['record_count'].astype(int)
+    totals['rollup'] = freq
+    totals[date_key] = totals[date_key].dt.strftime('%Y-%m-%dT%H:%M:%S')
+    return totals
+
+def _record_key(record, date_key):
+    return record.get(date_key, ""), record.get('id', 0)
+
+def read_rollup_watermark(rollup_path):
+    """Key of the last raw record included in a roll-up file, or None"""
+    last = next(iter_records_reversed(rollup_path), None)
+    if last is None or ROLLUP_MARKER_KEY not in last:
+        return None
+    return last[ROLLUP_MARKER_KEY]['date'], last[ROLLUP_MARKER_KEY]['id']
+
+def read_rollups(rollup_path, date_key, since=None, until=None):
+    """Roll-up records newest first, without the watermark marker"""
+    return [record for record in read_records(rollup_path, date_key, since=since, until=until)
+            if ROLLUP_MARKER_KEY not in record]
+
+def _find_retention_boundary(file_path, date_key, cutoff):
+    """Scan the chronological raw file for the first record newer than the cutoff.
+    
+    Returns the expired records and the byte offset where retained records start.
+    The newest record is always kept so record ids keep increasing.
+    """
+    expired = []
+    boundary = 0
+    last_start = 0
+    with open(file_path, 'rb') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                boundary += len(line)
+                continue
+            if record.get(date_key, "") >= cutoff:
+                return expired, boundary
+            expired.append(record)
+            last_start = boundary
+            boundary += len(line)
+    
+    # Every record expired: keep the newest one, and any partial line after it, in the raw file
+    if expired:
+        expired.pop()
+        boundary = last_start
+    return expired, boundary
+
+def _write_rollups(rollup_path, rollups, date_key, watermark):
+    with get_file_lock(rollup_path):
+        tmp_rollup = rollup_path + ".tmp"
+        with open(tmp_rollup, 'w') as f:
+            for record in rollups.to_dict('records'):
+                f.write(json.dumps({k: v for k, v in record.items() if not pd.isna(v)}) + "\n")
+            f.write(json.dumps({date_key: watermark[0], ROLLUP_MARKER_KEY: {'date': watermark[0], 'id': watermark[1]}}) + "\n")
+        os.replace(tmp_rollup, rollup_path)
+
+def _truncate_raw(file_path, boundary, snapshot_size):
+    """Drop the raw file's first boundary bytes, keeping records appended since the snapshot"""
+    tmp_path = file_path + ".compact"
+    with open(file_path, 'rb') as src, open(tmp_path, 'wb') as dst:
+        src.seek(boundary)
+        dst.write(src.read(snapshot_size - boundary))
+    
+    with get_file_lock(file_path):
+        with open(file_path, 'rb') as src, open(tmp_path, 'ab') as dst:
+            src.seek(snapshot_size)
+            dst.write(src.read())
+        os.replace(tmp_path, file_path)
+
+def compact_file(file_path, policy, now=None):
+    """Roll expired raw records of one history file into its roll-up file.
+    
+    The expensive part (aggregating and copying retained records) runs without
+    the file lock. The lock is only held to copy records appended meanwhile and
+    swap the new file in, so writers are blocked for a few milliseconds at most.
+    
+    The roll-up file is replaced first, together with a watermark of the last
+    raw record it includes, and the raw file second. If the process stops in
+    between, the next run finds the expired records at or below the watermark,
+    only drops them from the raw file, and does not count them again.
+    Returns the number of raw records compacted.
+    """
+    if not os.path.exists(file_path):
+        return 0
+    
+    date_key = policy['date_key']
+    cutoff = ((now or datetime.now()) - timedelta(days=policy['raw_days'])).isoformat()
+    snapshot_size = os.path.getsize(file_path)
+    expired, boundary = _find_retention_boundary(file_path, date_key, cutoff)
+    if not expired:
+        return 0
+    
+    rollup_path = get_rollup_file(file_path)
+    existing, watermark = read_rollups(rollup_path, date_key), read_rollup_watermark(rollup_path)
+    new = [record for record in expired if watermark is None or _record_key(record, date_key) > watermark]
+    
+    if new:
+        # Merge newly expired records into the existing roll-ups
+        combined = pd.DataFrame(list(reversed(existing)) + new)
+        rollups = rollup_records(combined, date_key, policy['rollup'], policy.get('group_by'))
+        _write_rollups(rollup_path, rollups, date_key, _record_key(new[-1], date_key))
+    
+    _truncate_raw(file_path, boundary, snapshot_size)
+    return len(new)
+
+def compact_all(now=None):
+    """Apply retention policies to every user partition"""
+    policies = get_retention_policies()
+    compacted = 0
+    for partition in list_partitions():
+        for file_name, policy in policies.items():
+            compacted += compact_file(os.path.join(partition, file_name), policy, now)
+    return compacted
+
+def _compaction_loop(interval):
+    while True:
+        try:
+            compact_all()
+        except Exception:
+            logger.exception("History compaction failed")
+        time.sleep(interval)
+
+def start_compaction_scheduler(interval=COMPACTION_INTERVAL):
+    """Start the background compaction thread once per process"""
+    global _scheduler_thread
+    with _scheduler_guard:
+        if _scheduler_thread is None:
+            _scheduler_thread = threading.Thread(
+                target=_compaction_loop, args=(interval,), name="history-compaction", daemon=True
+            )
+            _scheduler_thread.start()
+    return _scheduler_thread
+
+def get_vitals_trend(since=None, until=None, user_id=None):
+    """Get vitals for trend charts, newest first.
+    
+    Ranges that reach past the raw retention window are served from the roll-ups,
+    and ranges longer than TREND_DOWNSAMPLE_DAYS are downsampled to daily points.
+    Each row carries a record_count with the number of raw records it represents.
+    """
+    policy = get_retention_policies()[VITALS_FILE]
+    date_key = policy['date_key']
+    file_path = get_user_file(VITALS_FILE, user_id)
+    
+    # Records at or below the watermark are already in the roll-ups (a compaction stopped halfway)
+    watermark = read_rollup_watermark(get_rollup_file(file_path))
+    raw = pd.DataFrame([record for record in read_records(file_path, date_key, since=since, until=until)
+                        if watermark is None or _record_key(record, date_key) > watermark])
+    if not raw.empty:
+        raw['record_count'] = 1
+    
+    frames = [raw]
+    raw_start = datetime.now() - timedelta(days=policy['raw_days'])
+    if since is None or pd.Timestamp(since) < raw_start:
+        frames.append(pd.DataFrame(read_rollups(get_rollup_file(file_path), date_key, since=since, until=until)))
+    
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame()
+    trend = pd.concat(frames, ignore_index=True)
+    
+    trend[date_key] = pd.to_datetime(trend[date_key], format='ISO8601')
+    span = trend[date_key].agg(['min', 'max'])
+    if (span['max'] - span['min']).days > TREND_DOWNSAMPLE_DAYS:
+        trend = rollup_records(trend, date_key, 'D')
+        trend[date_key] = pd.to_datetime(trend[date_key], format='ISO8601')
+    
+    return trend.sort_values(date_key, ascending=False).reset_index(drop=True)
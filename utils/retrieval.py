@@ -0,0 +1,170 @@
+import hashlib
+import json
+import math
+import os
+import re
+import numpy as np
+
+INDEX_CACHE_FILE = os.path.join("data", "chatbot_index.npz")
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOP_WORDS = {
+    'a', 'about', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'can', 'do', 'does', 'for', 'from',
+    'how', 'i', 'if', 'in', 'is', 'it', 'me', 'my', 'of', 'on', 'or', 'should', 'that', 'the',
+    'this', 'to', 'what', 'when', 'which', 'who', 'why', 'will', 'with', 'you', 'your'
+}
+
+# In-process cache so every chat session shares one index per knowledge base version
+_loaded_indexes = {}
+
+def tokenize(text):
+    """Lowercase word tokens with stop words removed and plurals folded"""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token in STOP_WORDS:
+            continue
+        if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+class BM25Index:
+    """Sparse BM25 index over a fixed set of documents.
+    
+    Term weights are precomputed into a term-by-document CSR layout
+    (indptr/doc_indices/weights), so scoring a query only touches the posting
+    lists of its terms and costs one np.bincount over them.
+    """
+    
+    def __init__(self, doc_ids, vocabulary, indptr, doc_indices, weights, fingerprint=None):
+        self.doc_ids = list(doc_ids)
+        self.vocabulary = vocabulary
+        self.indptr = indptr
+        self.doc_indices = doc_indices
+        self.weights = weights
+        self.fingerprint = fingerprint
+        # Largest weight of each term in any document, the most it can add to a score
+        self.term_max = np.maximum.reduceat(weights, indptr[:-1]) if len(weights) else np.zeros(0, dtype=np.float32)
+    
+    @classmethod
+    def build(cls, documents, k1=1.5, b=0.75, fingerprint=None):
+        """Build an index from (doc_id, text) pairs"""
+        doc_ids = []
+        term_counts = []
+        for doc_id, text in documents:
+            counts = {}
+            for token in tokenize(text):
+                counts[token] = counts.get(token, 0) + 1
+            doc_ids.append(doc_id)
+            term_counts.append(counts)
+        
+        n_docs = len(doc_ids)
+        doc_lengths = np.array([sum(counts.values()) for counts in term_counts], dtype=np.float64)
+        avg_length = doc_lengths.mean() if n_docs else 0.0
+        
+        postings = {}
+        for doc_index, counts in enumerate(term_counts):
+            for token, count in counts.items():
+                postings.setdefault(token, []).append((doc_index, count))
+        
+        vocabulary = {token: i for i, token in enumerate(sorted(postings))}
+        indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        doc_indices = []
+        weights = []
+        for token, term_id in vocabulary.items():
+            entries = postings[token]
+            idf = math.log(1 + (n_docs - len(entries) + 0.5) / (len(entries) + 0.5))
+            for doc_index, tf in entries:
+                norm = k1 * (1 - b + b * doc_lengths[doc_index] / avg_length)
+                doc_indices.append(doc_index)
+                weights.append(idf * tf * (k1 + 1) / (tf + norm))
+            indptr[term_id + 1] = len(doc_indices)
+        
+        return cls(doc_ids, vocabulary, indptr, np.array(doc_indices, dtype=np.int32),
+                   np.array(weights, dtype=np.float32), fingerprint)
+    
+    def search(self, query, k=3):
+        """Return up to k (doc_id, score) pairs with a positive score, best first"""
+        term_ids = {self.vocabulary[token] for token in tokenize(query) if token in self.vocabulary}
+        if not term_ids:
+            return []
+        
+        posting_slices = [slice(self.indptr[t], self.indptr[t + 1]) for t in term_ids]
+        docs = np.concatenate([self.doc_indices[s] for s in posting_slices])
+        weights = np.concatenate([self.weights[s] for s in posting_slices])
+        scores = np.bincount(docs, weights=weights, minlength=len(self.doc_ids))
+        
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.doc_ids[i], float(scores[i])) for i in top if scores[i] > 0]
+    
+    def max_score(self, query):
+        """Best score any indexed document could reach for the query.
+        
+        Each query term contributes its largest weight; terms missing from
+        the index count as the rarest indexed term, so a query that is mostly
+        unknown words has a high bound that a single shared word cannot reach.
+        """
+        unknown_weight = float(self.term_max.max()) if len(self.term_max) else 0.0
+        return sum(float(self.term_max[self.vocabulary[token]]) if token in self.vocabulary else unknown_weight
+                   for token in tokenize(query))
+    
+    def save(self, path):
+        """Write the index to an .npz file"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            indptr=self.indptr,
+            doc_indices=self.doc_indices,
+            weights=self.weights,
+            meta=np.array(json.dumps({
+                'doc_ids': self.doc_ids,
+                'vocabulary': self.vocabulary,
+                'fingerprint': self.fingerprint
+            }))
+        )
+        os.replace(tmp_path, path)
+    
+    @classmethod
+    def load(cls, path):
+        """Read an index written by save"""
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            return cls(meta['doc_ids'], meta['vocabulary'], data['indptr'], data['doc_indices'],
+                       data['weights'], meta['fingerprint'])
+
+def documents_fingerprint(documents):
+    """Hash the documents so cached indexes are rebuilt when the content changes"""
+    digest = hashlib.sha256()
+    for doc_id, text in documents:
+        digest.update(doc_id.encode("utf-8") + b"\0" + text.encode("utf-8") + b"\0")
+    return digest.hexdigest()
+
+def load_or_build_index(documents, cache_path=INDEX_CACHE_FILE):
+    """Load the cached index for these documents, building and caching it if stale"""
+    documents = list(documents)
+    fingerprint = documents_fingerprint(documents)
+    if fingerprint in _loaded_indexes:
+        return _loaded_indexes[fingerprint]
+    
+    index = None
+    if cache_path and os.path.exists(cache_path):
+        try:
+            index = BM25Index.load(cache_path)
+        except (OSError, ValueError, KeyError):
+            index = None
+        if index is not None and index.fingerprint != fingerprint:
+            index = None
+    
+    if index is None:
+        index = BM25Index.build(documents, fingerprint=fingerprint)
+        if cache_path:
+            try:
+                index.save(cache_path)
+            except OSError:
+                pass
+    
+    _loaded_indexes[fingerprint] = index
+    return index
@@ -0,0 +1,106 @@
+import importlib
+import subprocess
+import sys
+import threading
+import time
+import types
+import pandas as pd
+
+# Libraries that cost the most at startup; loaded on first use or by the warm-up thread
+HEAVY_MODULES = ['sklearn.ensemble', 'sklearn.linear_model', 'xgboost', 'shap', 'joblib',
+                 'plotly.graph_objects', 'plotly.express', 'reportlab.platypus']
+
+# Seconds spent importing each module loaded through timed_import, in load order
+_import_timings = {}
+_warmup_thread = None
+_warmup_guard = threading.Lock()
+
+def timed_import(module_name):
+    """Import a module, recording how long the first import took"""
+    module = sys.modules.get(module_name)
+    if module is not None:
+        return module
+    start = time.perf_counter()
+    module = importlib.import_module(module_name)
+    _import_timings.setdefault(module_name, time.perf_counter() - start)
+    return module
+
+class LazyModule(types.ModuleType):
+    """Module placeholder that imports the real module on first attribute access"""
+    
+    def __init__(self, module_name):
+        super().__init__(module_name)
+        self._module = None
+    
+    def _load(self):
+        if self._module is None:
+            self._module = timed_import(self.__name__)
+        return self._module
+    
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+    
+    def __dir__(self):
+        return dir(self._load())
+
+def lazy_import(module_name):
+    """Return the module if already loaded, otherwise a placeholder that loads it on first use"""
+    return sys.modules.get(module_name) or LazyModule(module_name)
+
+def _warm_up(modules):
+    for module_name in modules:
+        try:
+            timed_import(module_name)
+        except ImportError:
+            # Optional dependencies (shap, reportlab) may be missing
+            pass
+
+def start_import_warmup(modules=None):
+    """Import heavy libraries in a background thread once per process.
+    
+    Pages render immediately; by the time a user opens a page that needs a
+    model, chart or PDF, its libraries are usually loaded already.
+    """
+    global _warmup_thread
+    with _warmup_guard:
+        if _warmup_thread is None:
+            _warmup_thread = threading.Thread(
+                target=_warm_up, args=(modules or HEAVY_MODULES,), name="import-warmup", daemon=True
+            )
+            _warmup_thread.start()
+    return _warmup_thread
+
+def get_import_timings():
+    """Import cost of every module loaded through lazy_import or the warm-up, slowest first"""
+    timings = pd.DataFrame(list(_import_timings.items()), columns=['module', 'seconds'])
+    return timings.sort_values('seconds', ascending=False).reset_index(drop=True)
+
+def profile_imports(module_name, top=25):
+    """Break down the cold import cost of a module by top-level package.
+    
+    Runs the import in a fresh interpreter with ``-X importtime`` and sums the
+    self time of every submodule into its top-level package.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module_name}'],
+        capture_output=True, text=True
+    )
+    
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = [part.strip() for part in line[len('import time:'):].split('|')]
+        rows.append({'package': name.split('.')[0], 'self_ms': int(self_us) / 1000, 'modules': 1})
+    
+    if not rows:
+        return pd.DataFrame(columns=['package', 'self_ms', 'modules'])
+    report = pd.DataFrame(rows).groupby('package', as_index=False).agg(self_ms=('self_ms', 'sum'), modules=('modules', 'sum'))
+    return report.sort_values('self_ms', ascending=False).head(top).reset_index(drop=True)
+
+if __name__ == "__main__":
+    # python -m utils.startup [module ...] prints the import cost of each module
+    for target in sys.argv[1:] or ['app']:
+        report = profile_imports(target)
+        print(f"\nimport {target}: {report['self_ms'].sum():.0f} ms")
+        print(report.to_string(index=False))
@@ -1,22 +1,177 @@
 import json
 import os
-from datetime import datetime
+import re
+import time
+import queue
+import atexit
+import hashlib
+import hmac
+import secrets
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
 import pandas as pd
+from utils.startup import lazy_import
+
+# The session and query parameters are only read in the page; background jobs skip the import
+st = lazy_import('streamlit')
 
 DATA_DIR = "data"
-VITALS_FILE = os.path.join(DATA_DIR, "vitals_history.json")
-PREDICTIONS_FILE = os.path.join(DATA_DIR, "predictions.json")
-MENTAL_HEALTH_FILE = os.path.join(DATA_DIR, "mental_health.json")
+USERS_DIR = os.path.join(DATA_DIR, "users")
+DEFAULT_USER_ID = "default_user"
+# Signs ?user= links: HEARTSAFE_USER_SECRET if set, otherwise a key generated on first use
+USER_SECRET_ENV = "HEARTSAFE_USER_SECRET"
+USER_SECRET_FILE = os.path.join(DATA_DIR, "user_secret")
+# Present in USERS_DIR once partition names carry their 'u-' / 'h-' prefix
+PARTITION_LAYOUT_FILE = os.path.join(USERS_DIR, ".layout-v2")
+
+# History files live in one partition directory per user: data/users/<user>/<file>
+VITALS_FILE = "vitals_history.jsonl"
+PREDICTIONS_FILE = "predictions.jsonl"
+MENTAL_HEALTH_FILE = "mental_health.jsonl"
+CHAT_HISTORY_FILE = "chat_history.jsonl"
+# Diagnoses reported by users for a prediction, waiting for a clinician to review them
+OUTCOME_SUBMISSIONS_FILE = "outcome_submissions.jsonl"
+# Reviewed diagnoses with the inputs they were made for; confirmed ones are labeled rows for incremental retraining
+OUTCOMES_FILE = "outcomes.jsonl"
+OUTCOME_CONFIRMED, OUTCOME_REJECTED = 'confirmed', 'rejected'
+HISTORY_FILES = [VITALS_FILE, PREDICTIONS_FILE, MENTAL_HEALTH_FILE]
+
+AGE_GROUP_BINS = [0, 30, 45, 60, 120]
+AGE_GROUP_LABELS = ['Under 30', '30-45', '46-60', 'Over 60']
+
+# History files are append-only JSON Lines in chronological order, so the
+# newest records can be read by scanning backwards from the end of the file.
+READ_CHUNK_SIZE = 64 * 1024
+
+# Write-behind queue settings: submitters block for up to WRITE_SUBMIT_TIMEOUT
+# seconds when WRITE_QUEUE_SIZE records are already waiting to be persisted.
+WRITE_QUEUE_SIZE = 1000
+WRITE_BATCH_SIZE = 100
+WRITE_SUBMIT_TIMEOUT = 5.0
+WRITE_RETRY_DELAY = 0.5
+# Reads wait at most this long for queued writes to their file before raising WriteBehindError
+WRITE_WAIT_TIMEOUT = 10.0
+
+_file_locks = defaultdict(threading.Lock)
+_file_locks_guard = threading.Lock()
 
 def init_storage():
     """Initialize storage directory and files"""
-    if not os.path.exists(DATA_DIR):
-        os.makedirs(DATA_DIR)
+    if not os.path.exists(USERS_DIR):
+        os.makedirs(USERS_DIR)
+    migrate_partition_names()
     
-    for file_path in [VITALS_FILE, PREDICTIONS_FILE, MENTAL_HEALTH_FILE]:
-        if not os.path.exists(file_path):
-            with open(file_path, 'w') as f:
-                json.dump([], f)
+    # Split shared files from the single-tenant layout into per-user partitions
+    for file_name in HISTORY_FILES:
+        shared_path = os.path.join(DATA_DIR, file_name)
+        legacy_path = os.path.splitext(shared_path)[0] + ".json"
+        if os.path.exists(legacy_path):
+            migrate_legacy_file(legacy_path, file_name)
+        if os.path.exists(shared_path):
+            migrate_legacy_file(shared_path, file_name)
+
+def migrate_legacy_file(legacy_path, file_name):
+    """Move records from a shared history file into per-user partitions"""
+    if legacy_path.endswith(".json"):
+        records = load_data(legacy_path)
+    else:
+        records = list(reversed(list(iter_records_reversed(legacy_path))))
+    
+    for record in records:
+        append_record(get_user_file(file_name, record.get('user_id', DEFAULT_USER_ID)), record)
+    os.remove(legacy_path)
+
+def _user_secret():
+    secret = os.environ.get(USER_SECRET_ENV)
+    if secret:
+        return secret.encode("utf-8")
+    try:
+        with open(USER_SECRET_FILE, 'rb') as f:
+            return f.read()
+    except OSError:
+        pass
+    os.makedirs(DATA_DIR, exist_ok=True)
+    secret = secrets.token_hex(32).encode("utf-8")
+    try:
+        # Exclusive create: if another process got there first, use its key
+        fd = os.open(USER_SECRET_FILE, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        with open(USER_SECRET_FILE, 'rb') as f:
+            return f.read()
+    with os.fdopen(fd, 'wb') as f:
+        f.write(secret)
+    return secret
+
+def user_access_token(user_id):
+    """Token that lets a ?user=<user_id>&token=<token> link open that user's data"""
+    return hmac.new(_user_secret(), user_id.encode("utf-8"), hashlib.sha256).hexdigest()
+
+def verify_user_token(user_id, token):
+    return bool(user_id) and bool(token) and hmac.compare_digest(user_access_token(user_id), str(token))
+
+def reviewer_access_key():
+    """Key that unlocks outcome review for clinicians and admins, signed like user tokens"""
+    return hmac.new(_user_secret(), b"\0reviewer", hashlib.sha256).hexdigest()
+
+def verify_reviewer_key(key):
+    return bool(key) and hmac.compare_digest(reviewer_access_key(), str(key))
+
+def get_current_user_id():
+    """Get the active user from the session.
+    
+    A ?user= query parameter only switches users together with a matching
+    ?token= (see user_access_token); without one the session stays on the
+    default user.
+    """
+    try:
+        if 'user_id' not in st.session_state:
+            requested = st.query_params.get('user')
+            token = st.query_params.get('token')
+            st.session_state['user_id'] = requested if verify_user_token(requested, token) else DEFAULT_USER_ID
+        return st.session_state['user_id']
+    except Exception:
+        return DEFAULT_USER_ID
+
+def _partition_key(user_id):
+    """Map a user id to a safe directory name.
+    
+    Readable ids keep their name under a 'u-' prefix and all others are
+    hashed under 'h-', so the two forms can never collide.
+    """
+    if re.fullmatch(r"[A-Za-z0-9][A-Za-z0-9_-]{0,63}", user_id):
+        return f"u-{user_id}"
+    return "h-" + hashlib.sha256(user_id.encode("utf-8")).hexdigest()
+
+def migrate_partition_names():
+    """Prefix partitions created before partition names were namespaced.
+    
+    Unprefixed 64-character hex names were hashed ids; everything else was a raw id.
+    """
+    if os.path.exists(PARTITION_LAYOUT_FILE) or not os.path.isdir(USERS_DIR):
+        return
+    for name in os.listdir(USERS_DIR):
+        path = os.path.join(USERS_DIR, name)
+        if not os.path.isdir(path):
+            continue
+        prefix = "h-" if re.fullmatch(r"[0-9a-f]{64}", name) else "u-"
+        os.replace(path, os.path.join(USERS_DIR, prefix + name))
+    with open(PARTITION_LAYOUT_FILE, 'w') as f:
+        f.write("prefixed partition names\n")
+
+def get_user_file(file_name, user_id=None):
+    """Get the path of a history file inside a user's partition"""
+    if user_id is None:
+        user_id = get_current_user_id()
+    return os.path.join(USERS_DIR, _partition_key(user_id), file_name)
+
+def list_partitions():
+    """List the partition directories of all users with stored data"""
+    if not os.path.exists(USERS_DIR):
+        return []
+    return [os.path.join(USERS_DIR, name) for name in sorted(os.listdir(USERS_DIR))
+            if os.path.isdir(os.path.join(USERS_DIR, name))]
 
 def load_data(file_path):
     """Load data from JSON file"""
@@ -31,9 +186,322 @@ def save_data(file_path, data):
     with open(file_path, 'w') as f:
         json.dump(data, f, indent=2)
 
-def save_vitals(vitals_data, prediction_result, risk_category):
-    """Save user vitals"""
-    data = load_data(VITALS_FILE)
+def get_file_lock(file_path):
+    """Get the lock that serializes appends and rewrites of a history file"""
+    with _file_locks_guard:
+        return _file_locks[os.path.abspath(file_path)]
+
+def append_record(file_path, record):
+    """Append a single record to a JSON Lines history file"""
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with get_file_lock(file_path):
+        with open(file_path, 'a') as f:
+            f.write(json.dumps(record) + "\n")
+
+def write_records(file_path, records):
+    """Append records to a history file in one write, assigning sequential ids"""
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with get_file_lock(file_path):
+        next_id = next_record_id(file_path)
+        lines = [json.dumps({'id': next_id + i, **record}) for i, record in enumerate(records)]
+        with open(file_path, 'a') as f:
+            f.write("\n".join(lines) + "\n")
+
+class WriteBehindError(RuntimeError):
+    """Queued history writes did not reach the disk in time, or failed"""
+
+class WriteBehindQueue:
+    """Background writer that persists history records off the request path.
+    
+    Records are taken from a bounded queue, grouped by file and appended in
+    batches. Every submitted record gets an increasing offset; ``persisted_offset``
+    is the highest offset the writer has finished with. Disk errors are
+    retried; any other error drops that file's records from the batch, is
+    kept in ``last_error`` and marks their offsets as failed, and the writer
+    carries on with the next batch.
+    """
+    
+    def __init__(self, maxsize=WRITE_QUEUE_SIZE, batch_size=WRITE_BATCH_SIZE):
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._batch_size = batch_size
+        self._submit_lock = threading.Lock()
+        self._persisted = threading.Condition()
+        self._submitted_offset = 0
+        self._persisted_offset = 0
+        self._pending_by_file = {}
+        self._closed = False
+        self._failed_offsets = set()
+        self.batches_written = 0
+        self.failed_records = 0
+        self.last_error = None
+        
+        self._thread = threading.Thread(target=self._run, name="history-write-behind", daemon=True)
+        self._thread.start()
+    
+    @property
+    def submitted_offset(self):
+        return self._submitted_offset
+    
+    @property
+    def persisted_offset(self):
+        return self._persisted_offset
+    
+    def submit(self, file_path, record, timeout=WRITE_SUBMIT_TIMEOUT):
+        """Queue a record for writing and return its offset.
+        
+        Blocks while the queue is full and raises ``queue.Full`` if no space frees
+        up within ``timeout`` seconds.
+        """
+        with self._submit_lock:
+            if self._closed:
+                raise RuntimeError("write-behind queue is closed")
+            offset = self._submitted_offset + 1
+            self._queue.put((offset, file_path, record), timeout=timeout)
+            self._submitted_offset = offset
+            with self._persisted:
+                self._pending_by_file[os.path.abspath(file_path)] = offset
+        return offset
+    
+    def wait_for(self, offset, timeout=None):
+        """Wait until the record with the given offset is persisted"""
+        with self._persisted:
+            return self._persisted.wait_for(lambda: self._persisted_offset >= offset, timeout)
+    
+    def write_status(self, offset, timeout=0):
+        """'saved', 'failed' or 'pending' for a submitted offset, waiting up to timeout seconds"""
+        if not self.wait_for(offset, timeout):
+            return 'pending'
+        with self._persisted:
+            return 'failed' if offset in self._failed_offsets else 'saved'
+    
+    def wait_for_file(self, file_path, timeout=None):
+        """Wait until every queued record for a file is persisted"""
+        with self._persisted:
+            offset = self._pending_by_file.get(os.path.abspath(file_path))
+        if offset is None:
+            return True
+        return self.wait_for(offset, timeout)
+    
+    def flush(self, timeout=None):
+        """Wait until everything submitted so far is persisted"""
+        return self.wait_for(self._submitted_offset, timeout)
+    
+    def close(self, timeout=None):
+        """Flush outstanding records and stop the writer thread"""
+        with self._submit_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join(timeout)
+    
+    def stats(self):
+        """Get queue depth and offset counters"""
+        return {
+            'queued': self._queue.qsize(),
+            'submitted_offset': self._submitted_offset,
+            'persisted_offset': self._persisted_offset,
+            'batches_written': self.batches_written,
+            'failed_records': self.failed_records,
+            'last_error': self.last_error
+        }
+    
+    def _next_batch(self):
+        """Block for one item, then drain up to a full batch without waiting"""
+        batch = [self._queue.get()]
+        while len(batch) < self._batch_size and batch[-1] is not None:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+    
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            stop = batch[-1] is None
+            items = [item for item in batch if item is not None]
+            
+            if items:
+                try:
+                    failed = self._write_batch(items)
+                except Exception as e:
+                    # Never let one batch stop the writer; its records count as failed
+                    self.last_error = f"{type(e).__name__}: {e}"
+                    failed = [offset for offset, _, _ in items]
+                self._settle(items[-1][0], failed)
+            if stop:
+                return
+    
+    def _write_batch(self, items):
+        """Write a batch grouped by file and return the offsets that could not be written"""
+        records_by_file = defaultdict(list)
+        for offset, file_path, record in items:
+            records_by_file[file_path].append((offset, record))
+        
+        failed = []
+        for file_path, entries in records_by_file.items():
+            # Keep retrying disk errors rather than dropping records; the bounded
+            # queue pushes back on submitters while the disk is unavailable.
+            while True:
+                try:
+                    write_records(file_path, [record for _, record in entries])
+                    break
+                except OSError as e:
+                    self.last_error = str(e)
+                    time.sleep(WRITE_RETRY_DELAY)
+                except Exception as e:
+                    # Retrying cannot fix a record that does not serialize
+                    self.last_error = f"{type(e).__name__}: {e}"
+                    failed.extend(offset for offset, _ in entries)
+                    break
+        
+        self.batches_written += 1
+        return failed
+    
+    def _settle(self, last_offset, failed):
+        self.failed_records += len(failed)
+        with self._persisted:
+            self._failed_offsets.update(failed)
+            self._persisted_offset = last_offset
+            for path, offset in list(self._pending_by_file.items()):
+                if offset <= self._persisted_offset:
+                    del self._pending_by_file[path]
+            self._persisted.notify_all()
+
+_write_queue = None
+_write_queue_guard = threading.Lock()
+
+def get_write_queue():
+    """Get the shared write-behind queue, starting its writer thread on first use"""
+    global _write_queue
+    with _write_queue_guard:
+        if _write_queue is None:
+            _write_queue = WriteBehindQueue()
+            atexit.register(_write_queue.close)
+        return _write_queue
+
+def _wait_for_pending_writes(file_path, timeout=WRITE_WAIT_TIMEOUT):
+    """Make queued writes to a file visible before it is read or written directly.
+    
+    Raises WriteBehindError, with the writer's last error, if they are not on
+    disk within timeout seconds.
+    """
+    if _write_queue is not None and not _write_queue.wait_for_file(file_path, timeout):
+        raise WriteBehindError(
+            f"Queued writes to {file_path} were not persisted within {timeout:.0f} s "
+            f"(last error: {_write_queue.last_error or 'none'})"
+        )
+
+def get_write_status(offset, timeout=0):
+    """'saved', 'failed' or 'pending' for an offset returned by a background save"""
+    if _write_queue is None:
+        return 'saved'
+    return _write_queue.write_status(offset, timeout)
+
+def _persist(file_path, record, background):
+    """Write a record now, or queue it and return its write-behind offset"""
+    if background:
+        return get_write_queue().submit(file_path, record)
+    _wait_for_pending_writes(file_path)
+    write_records(file_path, [record])
+    return None
+
+def iter_records_reversed(file_path):
+    """Yield records from a JSON Lines file newest first, reading backwards in chunks"""
+    try:
+        f = open(file_path, 'rb')
+    except OSError:
+        return
+    
+    with f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        remainder = b""
+        
+        while position > 0:
+            read_size = min(READ_CHUNK_SIZE, position)
+            position -= read_size
+            f.seek(position)
+            lines = (f.read(read_size) + remainder).split(b"\n")
+            # The first line may be cut by the chunk boundary; keep it for the next read
+            remainder = lines.pop(0)
+            for line in reversed(lines):
+                record = _decode_line(line)
+                if record is not None:
+                    yield record
+        
+        record = _decode_line(remainder)
+        if record is not None:
+            yield record
+
+def _decode_line(line):
+    """Decode one JSON Lines entry, skipping blank or partially written lines"""
+    if not line.strip():
+        return None
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+def _to_iso(value, end_of_day=False):
+    """Normalize a date-like bound to the ISO format used in stored records.
+    
+    With end_of_day=True a bound without a time of day ('2026-01-05' or a
+    date) means the last instant of that day, so an upper bound includes it.
+    """
+    if value is None:
+        return None
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_convert(None)
+    date_only = (isinstance(value, date) and not isinstance(value, datetime)) or \
+        (isinstance(value, str) and re.fullmatch(r"\d{4}-\d{2}-\d{2}", value.strip()))
+    if end_of_day and date_only:
+        timestamp += pd.Timedelta(days=1) - pd.Timedelta(microseconds=1)
+    return timestamp.isoformat()
+
+def read_records(file_path, date_key, limit=None, offset=0, since=None, until=None, columns=None):
+    """Read records newest first, stopping as soon as the requested window is filled.
+    
+    ``since`` and ``until`` are inclusive bounds on ``date_key``; an ``until``
+    without a time of day includes that whole day. Because files are
+    appended in chronological order, the scan stops at the first record older than
+    ``since`` and never reads further back than the requested page.
+    """
+    _wait_for_pending_writes(file_path)
+    since, until = _to_iso(since), _to_iso(until, end_of_day=True)
+    records = []
+    skipped = 0
+    
+    for record in iter_records_reversed(file_path):
+        recorded = record.get(date_key, "")
+        if until is not None and recorded > until:
+            continue
+        if since is not None and recorded < since:
+            break
+        if skipped < offset:
+            skipped += 1
+            continue
+        
+        if columns is not None:
+            record = {col: record[col] for col in columns if col in record}
+        records.append(record)
+        
+        if limit is not None and len(records) >= limit:
+            break
+    
+    return records
+
+def next_record_id(file_path):
+    """Get the next sequential record id from the last stored record"""
+    last_record = next(iter_records_reversed(file_path), None)
+    return last_record.get('id', 0) + 1 if last_record else 1
+
+def save_vitals(vitals_data, prediction_result, risk_category, user_id=None, background=False):
+    """Save user vitals. With background=True the write is queued and its offset returned"""
+    user_id = user_id or get_current_user_id()
+    file_path = get_user_file(VITALS_FILE, user_id)
     
     # Convert numpy types to Python native types for JSON serialization
     clean_vitals = {}
@@ -44,92 +512,238 @@ def save_vitals(vitals_data, prediction_result, risk_category):
             clean_vitals[key] = value
     
     record = {
-        'id': len(data) + 1,
-        'user_id': 'default_user',
+        'user_id': user_id,
         'date_recorded': datetime.now().isoformat(),
         **clean_vitals,
         'prediction_result': float(prediction_result),
         'risk_category': risk_category
     }
-    data.append(record)
-    save_data(VITALS_FILE, data)
-
-def get_vitals_history():
-    """Retrieve vitals history"""
-    data = load_data(VITALS_FILE)
-    if data:
-        df = pd.DataFrame(data)
-        df = df.sort_values('date_recorded', ascending=False)
-        return df
+    return _persist(file_path, record, background)
+
+def get_vitals_history(limit=None, offset=0, since=None, until=None, columns=None, user_id=None):
+    """Retrieve a user's vitals history, newest first"""
+    records = read_records(get_user_file(VITALS_FILE, user_id), 'date_recorded', limit, offset, since, until, columns)
+    if records:
+        return pd.DataFrame(records)
     return pd.DataFrame()
 
-def save_prediction(model_used, input_features, prediction_score, risk_category, shap_values=None):
-    """Save prediction result"""
-    data = load_data(PREDICTIONS_FILE)
+def save_prediction(model_used, input_features, prediction_score, risk_category, shap_values=None, user_id=None,
+                    background=False, model_version=None, prediction_date=None):
+    """Save prediction result. With background=True the write is queued and its offset returned"""
+    user_id = user_id or get_current_user_id()
+    file_path = get_user_file(PREDICTIONS_FILE, user_id)
     record = {
-        'id': len(data) + 1,
-        'user_id': 'default_user',
-        'prediction_date': datetime.now().isoformat(),
+        'user_id': user_id,
+        'prediction_date': prediction_date or datetime.now().isoformat(),
         'model_used': model_used,
+        'model_version': model_version,
         'input_features': str(input_features),
         'prediction_score': float(prediction_score),
         'risk_category': risk_category,
         'shap_values': str(shap_values) if shap_values else None
     }
-    data.append(record)
-    save_data(PREDICTIONS_FILE, data)
-
-def get_predictions_history():
-    """Retrieve prediction history"""
-    data = load_data(PREDICTIONS_FILE)
-    if data:
-        df = pd.DataFrame(data)
-        df = df.sort_values('prediction_date', ascending=False)
-        return df
+    return _persist(file_path, record, background)
+
+def get_predictions_history(limit=None, offset=0, since=None, until=None, columns=None, user_id=None):
+    """Retrieve a user's prediction history, newest first"""
+    records = read_records(get_user_file(PREDICTIONS_FILE, user_id), 'prediction_date', limit, offset, since, until, columns)
+    if records:
+        return pd.DataFrame(records)
     return pd.DataFrame()
 
-def get_community_stats():
-    """Get anonymized community statistics"""
-    df = get_vitals_history()
+def _map_partitions(func, file_name):
+    """Apply a function to one history file in every user partition, in parallel"""
+    file_paths = [os.path.join(partition, file_name) for partition in list_partitions()]
+    file_paths = [path for path in file_paths if os.path.exists(path)]
+    if not file_paths:
+        return []
+    with ThreadPoolExecutor(max_workers=min(32, len(file_paths))) as executor:
+        return list(executor.map(func, file_paths))
+
+def _read_partition_frame(file_path, date_key, columns):
+    """Read a whole partition file into a DataFrame"""
+    return pd.DataFrame(read_records(file_path, date_key, columns=columns))
+
+def get_community_vitals(columns=None):
+    """Retrieve vitals from every user's partition, read in parallel"""
+    frames = _map_partitions(lambda path: _read_partition_frame(path, 'date_recorded', columns), VITALS_FILE)
+    frames = [frame for frame in frames if not frame.empty]
+    if frames:
+        return pd.concat(frames, ignore_index=True)
+    return pd.DataFrame()
+
+def iter_community_vitals(columns=None, latest_only=False):
+    """Yield the vitals of one user partition at a time as a DataFrame, newest first.
     
+    Unlike get_community_vitals only one partition is in memory at once; with
+    latest_only just the last record of each partition is read.
+    """
+    for partition in list_partitions():
+        file_path = os.path.join(partition, VITALS_FILE)
+        if not os.path.exists(file_path):
+            continue
+        frame = pd.DataFrame(read_records(file_path, 'date_recorded', limit=1 if latest_only else None, columns=columns))
+        if not frame.empty:
+            yield frame
+
+def get_community_predictions(columns=None):
+    """Retrieve predictions from every user's partition, read in parallel"""
+    frames = _map_partitions(lambda path: _read_partition_frame(path, 'prediction_date', columns), PREDICTIONS_FILE)
+    frames = [frame for frame in frames if not frame.empty]
+    if frames:
+        return pd.concat(frames, ignore_index=True)
+    return pd.DataFrame()
+
+def _partition_risk_totals(file_path):
+    """Compute per-group risk sums and counts for a single partition"""
+    df = _read_partition_frame(file_path, 'date_recorded', ['age', 'gender', 'prediction_result'])
     if df.empty:
-        return pd.DataFrame(), pd.DataFrame()
+        return None
     
-    age_groups = pd.cut(df['age'], bins=[0, 30, 45, 60, 120], 
-                        labels=['Under 30', '30-45', '46-60', 'Over 60'])
-    df['age_group'] = age_groups
+    df['age_group'] = pd.cut(df['age'], bins=AGE_GROUP_BINS, labels=AGE_GROUP_LABELS)
+    age_totals = df.groupby('age_group', observed=True)['prediction_result'].agg(['sum', 'count'])
+    gender_totals = df.groupby('gender')['prediction_result'].agg(['sum', 'count'])
+    return age_totals, gender_totals
+
+def _merge_risk_totals(partials, key):
+    """Combine partial sums and counts into average risk per group"""
+    if not partials:
+        return pd.DataFrame()
+    totals = pd.concat(partials).groupby(level=0, observed=True).sum()
+    stats = pd.DataFrame({
+        key: totals.index,
+        'avg_risk': totals['sum'].values / totals['count'].values,
+        'count': totals['count'].values
+    })
+    return stats.reset_index(drop=True)
+
+def get_community_stats():
+    """Get anonymized community statistics, aggregated across user partitions in parallel"""
+    partials = [result for result in _map_partitions(_partition_risk_totals, VITALS_FILE) if result is not None]
     
-    age_stats = df.groupby('age_group').agg({
-        'prediction_result': 'mean',
-        'id': 'count'
-    }).reset_index()
-    age_stats.columns = ['age_group', 'avg_risk', 'count']
+    if not partials:
+        return pd.DataFrame(), pd.DataFrame()
     
-    gender_stats = df.groupby('gender').agg({
-        'prediction_result': 'mean',
-        'id': 'count'
-    }).reset_index()
-    gender_stats.columns = ['gender', 'avg_risk', 'count']
+    age_stats = _merge_risk_totals([age for age, _ in partials], 'age_group')
+    gender_stats = _merge_risk_totals([gender for _, gender in partials], 'gender')
     
     return age_stats, gender_stats
 
-def save_mental_health(mental_health_data):
-    """Save mental health data"""
-    data = load_data(MENTAL_HEALTH_FILE)
+def save_mental_health(mental_health_data, user_id=None, background=False):
+    """Save mental health data. With background=True the write is queued and its offset returned"""
+    user_id = user_id or get_current_user_id()
+    file_path = get_user_file(MENTAL_HEALTH_FILE, user_id)
     record = {
-        'id': len(data) + 1,
-        'user_id': 'default_user',
+        'user_id': user_id,
         'date_recorded': datetime.now().isoformat(),
         **mental_health_data
     }
-    data.append(record)
-    save_data(MENTAL_HEALTH_FILE, data)
-
-def get_mental_health_history():
-    """Retrieve mental health history"""
-    data = load_data(MENTAL_HEALTH_FILE)
-    if data:
-        df = pd.DataFrame(data)
-        df = df.sort_values('date_recorded', ascending=False)
-        return df
+    return _persist(file_path, record, background)
+
+def get_mental_health_history(limit=None, offset=0, since=None, until=None, columns=None, user_id=None):
+    """Retrieve a user's mental health history, newest first"""
+    records = read_records(get_user_file(MENTAL_HEALTH_FILE, user_id), 'date_recorded', limit, offset, since, until, columns)
+    if records:
+        return pd.DataFrame(records)
     return pd.DataFrame()
+
+def submit_outcome(input_features, outcome, prediction_date, user_id=None, background=False):
+    """Report a diagnosis (1 = heart disease, 0 = none) for a prediction's inputs, pending review.
+    
+    Submissions are keyed by (user, prediction_date); submitting again for the
+    same prediction replaces the pending one.
+    """
+    user_id = user_id or get_current_user_id()
+    record = {
+        'user_id': user_id,
+        'prediction_date': prediction_date,
+        'date_submitted': datetime.now().isoformat(),
+        **{key: value.item() if hasattr(value, 'item') else value for key, value in input_features.items()},
+        'outcome': int(outcome)
+    }
+    return _persist(get_user_file(OUTCOME_SUBMISSIONS_FILE, user_id), record, background)
+
+def _partition_pending_outcomes(submissions_path):
+    """Latest submission per prediction of one partition, skipping predictions already reviewed"""
+    outcomes_path = os.path.join(os.path.dirname(submissions_path), OUTCOMES_FILE)
+    reviewed = {record.get('prediction_date') for record in read_records(outcomes_path, 'date_recorded',
+                                                                         columns=['prediction_date'])}
+    pending = {}
+    for record in read_records(submissions_path, 'date_submitted'):
+        if record['prediction_date'] not in reviewed:
+            # Newest first, so the first submission seen for a prediction is the latest
+            pending.setdefault(record['prediction_date'], record)
+    return list(pending.values())
+
+def get_pending_outcomes():
+    """Submitted diagnoses awaiting review across all users, oldest first"""
+    pending = [record for records in _map_partitions(_partition_pending_outcomes, OUTCOME_SUBMISSIONS_FILE)
+               for record in records]
+    return sorted(pending, key=lambda record: record['date_submitted'])
+
+_review_lock = threading.Lock()
+
+def review_outcome(submission, confirmed, reviewer):
+    """Record a reviewer's decision on a pending submission.
+    
+    Confirmed outcomes are the only ones used to update the models. Each
+    (user, prediction_date) is reviewed once; returns False, writing nothing,
+    if that prediction already has a decision.
+    """
+    file_path = get_user_file(OUTCOMES_FILE, submission['user_id'])
+    with _review_lock:
+        reviewed = {record.get('prediction_date') for record in read_records(file_path, 'date_recorded',
+                                                                             columns=['prediction_date'])}
+        if submission['prediction_date'] in reviewed:
+            return False
+        record = {
+            **{key: value for key, value in submission.items() if key not in ('id', 'date_submitted')},
+            'date_recorded': datetime.now().isoformat(),
+            'status': OUTCOME_CONFIRMED if confirmed else OUTCOME_REJECTED,
+            'reviewed_by': reviewer
+        }
+        _persist(file_path, record, background=False)
+    return True
+
+def get_community_outcomes(since=None):
+    """Retrieve reviewed outcomes from every user's partition, optionally only those recorded since a date"""
+    frames = _map_partitions(
+        lambda path: pd.DataFrame(read_records(path, 'date_recorded', since=since)), OUTCOMES_FILE
+    )
+    frames = [frame for frame in frames if not frame.empty]
+    if frames:
+        return pd.concat(frames, ignore_index=True)
+    return pd.DataFrame()
+
+def save_chat_message(role, message, user_id=None, background=True):
+    """Append a chat message to the user's chat log. Queued by default so chatting never waits on disk"""
+    user_id = user_id or get_current_user_id()
+    record = {
+        'role': role,
+        'message': message,
+        'timestamp': datetime.now().isoformat()
+    }
+    return _persist(get_user_file(CHAT_HISTORY_FILE, user_id), record, background)
+
+def get_chat_history(limit=None, offset=0, user_id=None):
+    """Retrieve a user's chat messages, newest first"""
+    return read_records(get_user_file(CHAT_HISTORY_FILE, user_id), 'timestamp', limit, offset)
+
+def count_chat_messages(user_id=None, exact=True):
+    """Count a user's stored chat messages from the last record id, without scanning the log.
+    
+    With exact=False queued messages are not waited for, so the count may
+    briefly trail the chat; good enough for display on every render.
+    """
+    file_path = get_user_file(CHAT_HISTORY_FILE, user_id)
+    if exact:
+        _wait_for_pending_writes(file_path)
+    return next_record_id(file_path) - 1
+
+def clear_chat_history(user_id=None):
+    """Delete a user's chat log"""
+    file_path = get_user_file(CHAT_HISTORY_FILE, user_id)
+    _wait_for_pending_writes(file_path)
+    with get_file_lock(file_path):
+        if os.path.exists(file_path):
+            os.remove(file_path)
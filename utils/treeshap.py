@@ -0,0 +1,240 @@
+import sys
+import time
+import numpy as np
+
+# Upper bound on (samples x leaves x path slots) per chunk of a batch, to cap memory
+MAX_CHUNK_ELEMENTS = 2 ** 23
+
+class TreeShapExplainer:
+    """Exact path-dependent TreeSHAP over exported node tables (see export_tree_arrays).
+    
+    Path-dependent TreeSHAP credits every leaf's value to the distinct features
+    split on along its root path. For feature i on the path, zero_i is the share
+    of training cover that follows the path through its splits and one_i is 1
+    when the sample follows them, 0 otherwise. The Shapley weight summed over
+    all subsets of the other path features equals
+        
+        integral over t in [0, 1] of prod_{j != i} (zero_j * (1 - t) + one_j * t)
+    
+    because |S|! (d - |S| - 1)! / d! is a Beta integral. The integrand is a
+    polynomial of degree below the path length, so Gauss-Legendre quadrature
+    evaluates it exactly. That turns the recursive algorithm into array
+    operations over (samples, leaves, path features), which vectorizes over
+    a whole batch. Leaf paths are compiled once per model.
+    """
+    
+    def __init__(self, arrays, n_features, average=False, base_value=0.0):
+        from scipy import sparse
+        
+        offsets = np.asarray(arrays['tree_offsets'])
+        left = np.asarray(arrays['children_left'])
+        right = np.asarray(arrays['children_right'])
+        feature = np.asarray(arrays['feature'])
+        cover = np.asarray(arrays['cover'], dtype=np.float64)
+        self.threshold = np.asarray(arrays['threshold'], dtype=np.float64)
+        self.feature = feature
+        # XGBoost sends x < threshold (and missing values, per node) left; scikit-learn sends x <= threshold left
+        self.strict = 'children_missing' in arrays
+        self.missing_left = (np.asarray(arrays['children_missing']) == left) if self.strict else np.zeros(len(left), bool)
+        self.n_features = n_features
+        n_trees = len(offsets) - 1
+        
+        leaves = []
+        for tree in range(n_trees):
+            start = offsets[tree]
+            stack = [(start, [])]
+            while stack:
+                node, steps = stack.pop()
+                if feature[node] < 0:
+                    leaves.append((node, steps))
+                    continue
+                stack.append((start + right[node], steps + [(node, False, start + right[node])]))
+                stack.append((start + left[node], steps + [(node, True, start + left[node])]))
+        
+        max_steps = max(1, max(len(steps) for _, steps in leaves))
+        slot_count = max(1, max(len({feature[node] for node, _, _ in steps}) for _, steps in leaves))
+        L = len(leaves)
+        self.slot_feature = np.full((L, slot_count), -1, dtype=np.int64)
+        self.slot_zero = np.ones((L, slot_count))
+        self.step_node = np.zeros((L, max_steps), dtype=np.int64)
+        self.step_left = np.ones((L, max_steps), dtype=bool)
+        self.step_slot = np.zeros((L, max_steps), dtype=np.int64)
+        self.step_valid = np.zeros((L, max_steps), dtype=bool)
+        self.leaf_value = np.empty(L)
+        
+        for row, (leaf, steps) in enumerate(leaves):
+            self.leaf_value[row] = arrays['value'][leaf]
+            slots = {}
+            for step, (node, went_left, child) in enumerate(steps):
+                slot = slots.setdefault(feature[node], len(slots))
+                self.slot_feature[row, slot] = feature[node]
+                self.slot_zero[row, slot] *= cover[child] / cover[node] if cover[node] > 0 else 0.0
+                self.step_node[row, step] = node
+                self.step_left[row, step] = went_left
+                self.step_slot[row, step] = slot
+                self.step_valid[row, step] = True
+        
+        scale = 1 / n_trees if average else 1.0
+        # Cover-weighted mean of the leaves: every path's zero fractions multiply to leaf cover / root cover
+        self.expected_value = base_value + scale * float(np.sum(self.leaf_value * self.slot_zero.prod(axis=1)))
+        self.scale = scale
+        self.base_value = base_value
+        
+        # Counts, per path slot, the steps on that slot's feature a sample did not follow
+        valid = self.step_valid.reshape(-1)
+        step_rows = np.flatnonzero(valid)
+        step_cols = (np.arange(L)[:, None] * slot_count + self.step_slot).reshape(-1)[valid]
+        self.step_to_slot = sparse.csr_matrix(
+            (np.ones(len(step_rows), dtype=np.float32), (step_rows, step_cols)), shape=(L * max_steps, L * slot_count)
+        ).T.tocsr()
+        # Sums path-slot contributions into feature columns; padding slots map nowhere
+        used = self.slot_feature.reshape(-1) >= 0
+        self.slot_to_feature = sparse.csr_matrix(
+            (np.full(used.sum(), scale), (np.flatnonzero(used), self.slot_feature.reshape(-1)[used])),
+            shape=(L * slot_count, n_features)
+        )
+        # The integrand has degree below slot_count, and n-point Gauss-Legendre is exact up to degree 2n - 1
+        nodes, weights = np.polynomial.legendre.leggauss(slot_count // 2 + 1)
+        self.quadrature = list(zip((nodes + 1) / 2, weights / 2))
+    
+    def _go_left(self, X):
+        # Same float32 comparison as the libraries use at prediction time
+        values = X.astype(np.float32).astype(np.float64)[:, np.maximum(self.feature, 0)]
+        go_left = values < self.threshold if self.strict else values <= self.threshold
+        return np.where(np.isnan(values), self.missing_left, go_left)
+    
+    def _one_fractions(self, go_left):
+        # A slot's one fraction is 1 when the sample follows every step on its feature
+        missed = (go_left[:, self.step_node] != self.step_left).reshape(len(go_left), -1).T.astype(np.float32)
+        return ((self.step_to_slot @ missed).T.reshape((len(go_left),) + self.slot_zero.shape) == 0).astype(np.float64)
+    
+    def shap_values(self, X):
+        """SHAP values of a batch, shape (n_samples, n_features), in the model's output units"""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X[None, :]
+        L, D = self.slot_zero.shape
+        chunk = max(1, MAX_CHUNK_ELEMENTS // (L * D))
+        results = []
+        for start in range(0, len(X), chunk):
+            one = self._one_fractions(self._go_left(X[start:start + chunk]))
+            difference = one - self.slot_zero
+            weights = np.zeros_like(one)
+            factors = np.empty_like(one)
+            for t, w in self.quadrature:
+                np.multiply(difference, t, out=factors)
+                factors += self.slot_zero
+                # Product over the other path features. A factor is only zero when both fractions
+                # are, and then the slot contributes nothing, so those entries stay zero.
+                others = np.prod(factors, axis=-1, keepdims=True) * w
+                np.divide(others, factors, out=factors, where=factors > 0)
+                factors[factors <= 0] = 0
+                weights += factors
+            contributions = weights * difference * self.leaf_value[None, :, None]
+            results.append(np.asarray(contributions.reshape(len(one), L * D) @ self.slot_to_feature))
+        return np.concatenate(results)
+    
+    def predict(self, X):
+        """Model output (probability for forests, margin for XGBoost) from the node tables"""
+        go_left = self._go_left(np.asarray(X, dtype=np.float64).reshape(-1, self.n_features))
+        reached = np.all((go_left[:, self.step_node] == self.step_left) | ~self.step_valid, axis=2)
+        return self.base_value + self.scale * reached @ self.leaf_value
+
+def linear_shap_values(coef, X_scaled, background_mean=0.0):
+    """Exact SHAP values of a linear model in log-odds: coef * (x - background mean), on scaled inputs.
+    
+    Scaled training features have mean 0, so the default background is the training mean.
+    """
+    return np.asarray(coef) * (np.asarray(X_scaled, dtype=np.float64) - background_mean)
+
+def tree_explainer_from_bundle(bundle, model_name):
+    """Compile a TreeShapExplainer from a bundle's exported arrays"""
+    info = bundle.manifest['models'][model_name]
+    is_forest = 'base_margin' not in info
+    return TreeShapExplainer(bundle.model_arrays(model_name), len(bundle.feature_names),
+                             average=is_forest, base_value=info.get('base_margin', 0.0))
+
+def explain(bundle, model_name, X):
+    """SHAP values and expected value of a batch, from the built-in engine.
+    
+    Trees and the linear model are exact. The stacked ensemble is not additive,
+    so its attributions are the meta-weighted base attributions in log-odds:
+    forest attributions (probabilities) are rescaled so they sum to the change
+    in log-odds. Their total equals the ensemble margin minus the margin at
+    the base models' expected values.
+    """
+    from utils.ensemble import logit
+    
+    X = X[bundle.feature_names] if hasattr(X, 'columns') else X
+    model = bundle.models[model_name]
+    if hasattr(model, 'base_names'):
+        total, expected = 0.0, model.meta_intercept
+        for coef, name in zip(model.meta_coef, model.base_names):
+            values, base_expected = explain(bundle, name, X)
+            if name != 'logistic' and 'base_margin' not in bundle.manifest['models'][name]:
+                # Forest outputs are probabilities; map each sample's shift into log-odds
+                prediction = base_expected + values.sum(axis=1)
+                shift = logit(prediction) - logit(base_expected)
+                change = prediction - base_expected
+                ratio = np.where(np.abs(change) > 1e-12, shift / np.where(change == 0, 1, change),
+                                 1 / (base_expected * (1 - base_expected)))
+                values, base_expected = values * ratio[:, None], float(logit(base_expected))
+            total = total + coef * values
+            expected += coef * base_expected
+        return total, expected
+    if hasattr(model, 'coef_'):
+        return linear_shap_values(model.coef_[0], bundle.scaler.transform(X)), float(np.ravel(model.intercept_)[0])
+    explainer = bundle.tree_shap(model_name)
+    return explainer.shap_values(np.asarray(X, dtype=np.float64)), explainer.expected_value
+
+def benchmark(bundle, batch_size=256, seed=0):
+    """Time the built-in engine against shap.TreeExplainer (and XGBoost's native TreeSHAP).
+    
+    Also checks local accuracy (attributions plus expected value reproduce the
+    output). Returns one row per tree model with timings in ms and the largest
+    absolute difference from each reference.
+    """
+    from utils.model_bundle import SHAP_AVAILABLE, is_tree_model
+    
+    X = bundle.synthetic_batch(batch_size, seed)
+    rows = []
+    for name, model in bundle.models.items():
+        if not is_tree_model(model):
+            continue
+        start = time.perf_counter()
+        explainer = tree_explainer_from_bundle(bundle, name)
+        compile_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        values = explainer.shap_values(X.to_numpy())
+        row = {'model': name, 'compile_ms': compile_ms, 'builtin_ms': (time.perf_counter() - start) * 1000}
+        row['local_accuracy_error'] = float(np.max(np.abs(values.sum(axis=1) + explainer.expected_value - explainer.predict(X.to_numpy()))))
+        
+        if hasattr(model, 'get_booster'):
+            import xgboost
+            start = time.perf_counter()
+            native = model.get_booster().predict(xgboost.DMatrix(X), pred_contribs=True)[:, :-1]
+            row['xgboost_native_ms'] = (time.perf_counter() - start) * 1000
+            row['xgboost_native_max_diff'] = float(np.max(np.abs(values - native)))
+        if SHAP_AVAILABLE:
+            import shap
+            start = time.perf_counter()
+            reference = shap.TreeExplainer(model).shap_values(X)
+            row['shap_ms'] = (time.perf_counter() - start) * 1000
+            if isinstance(reference, list):
+                reference = reference[1]
+            elif np.ndim(reference) == 3:
+                reference = reference[:, :, 1]
+            row['shap_max_diff'] = float(np.max(np.abs(values - reference)))
+        rows.append(row)
+    return rows
+
+if __name__ == "__main__":
+    # python -m utils.treeshap [batch_size] benchmarks the current model bundle
+    from utils.model_bundle import load_bundle
+    import pandas as pd
+    
+    bundle = load_bundle()
+    if bundle is None:
+        sys.exit("No model bundle found; train the models first.")
+    batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    print(pd.DataFrame(benchmark(bundle, batch_size)).to_string(index=False))
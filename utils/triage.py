@@ -0,0 +1,184 @@
+import re
+import numpy as np
+
+TRIAGE_LABELS = np.array(['routine', 'urgent', 'emergency'])
+ROUTINE, URGENT, EMERGENCY = 0, 1, 2
+
+# Phrases are matched on whole tokens after plural folding, so 'palpitation'
+# also covers 'palpitations' and 'chest pain' covers 'chest pains'
+TRIAGE_LEXICON = {
+    EMERGENCY: [
+        'severe', 'chest pain', 'chest pressure', 'crushing', 'difficulty breathing',
+        'can\'t breathe', 'cannot breathe', 'couldn\'t breathe', 'unconscious', 'passed out', 'fainted'
+    ],
+    URGENT: [
+        'pain', 'painful', 'shortness of breath', 'short of breath', 'dizzy', 'dizziness',
+        'lightheaded', 'irregular heartbeat', 'racing heart', 'palpitation'
+    ]
+}
+
+NEGATION_CUES = {
+    'no', 'not', 'never', 'without', 'denies', 'deny', 'denied', 'none',
+    'don\'t', 'doesn\'t', 'didn\'t', 'haven\'t', 'hasn\'t', 'isn\'t', 'wasn\'t'
+}
+# Words that end the scope of a preceding negation, in addition to punctuation
+SCOPE_BREAKERS = {'but', 'however', 'although', 'though', 'except', 'yet'}
+# Hedges also end it: in "not sure if this is chest pain" the symptom is not denied
+HEDGE_WORDS = {'sure', 'certain', 'know', 'if', 'whether', 'maybe', 'might', 'think', 'wonder'}
+# A negation cue only applies to phrases starting within this many tokens after it
+NEGATION_WINDOW = 3
+# Phrases negation never lowers: a cue before them is not a denial, as in "no, I can't breathe"
+NEVER_NEGATED = {'can\'t breathe', 'cannot breathe', 'couldn\'t breathe'}
+
+# "can not" is the inability "cannot", not a denial
+CANNOT_PATTERN = re.compile(r"\bcan not\b")
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?|[.,;:!?\n]")
+
+# Reserved token ids; lexicon words are numbered from FIRST_WORD_ID
+OTHER_ID, BREAK_ID, BOUNDARY_ID, NEGATION_ID = 0, 1, 2, 3
+FIRST_WORD_ID = 4
+
+# Largest window code that fits the int64 arithmetic of the packed matcher
+MAX_WINDOW_CODE = np.iinfo(np.int64).max
+
+def fold_token(token):
+    """Fold simple plurals so lexicon entries match both forms"""
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss') and "'" not in token:
+        return token[:-1]
+    return token
+
+class TriageClassifier:
+    """Batch symptom triage against a precompiled phrase lexicon.
+    
+    All messages of a batch are tokenized into one id array with a boundary
+    token between messages. Phrases of each length are matched at every
+    position at once by packing token windows into integer codes, and negation
+    scope is resolved with running maxima, so the per-message work is only the
+    tokenization. Phrases too long for their code to fit in int64 are matched
+    by comparing token tuples at the positions where their first word occurs.
+    """
+    
+    def __init__(self, lexicon=TRIAGE_LEXICON, never_negated=NEVER_NEGATED):
+        self.token_ids = {}
+        # Folded like message tokens, so 'denies' is still a cue after plural folding
+        for cue in NEGATION_CUES:
+            self.token_ids[fold_token(cue)] = NEGATION_ID
+        for breaker in SCOPE_BREAKERS | HEDGE_WORDS:
+            self.token_ids[fold_token(breaker)] = BREAK_ID
+        for mark in '.,;:!?\n':
+            self.token_ids[mark] = BREAK_ID
+        
+        phrases = {}
+        next_id = FIRST_WORD_ID
+        for severity, entries in lexicon.items():
+            for entry in entries:
+                ids = []
+                for token in TOKEN_PATTERN.findall(entry.lower()):
+                    token = fold_token(token)
+                    if token not in self.token_ids:
+                        self.token_ids[token] = next_id
+                        next_id += 1
+                    ids.append(self.token_ids[token])
+                key = tuple(ids)
+                phrases[key] = max(severity, phrases.get(key, ROUTINE))
+        fixed = {tuple(self.token_ids.get(fold_token(token), OTHER_ID) for token in TOKEN_PATTERN.findall(entry.lower()))
+                 for entry in never_negated}
+        
+        # Window codes pack token ids in base next_id, so every id is a single digit
+        self.base = next_id
+        # Per phrase length: sorted window codes, the severity of each code and whether negation may lower it
+        self.phrase_tables = {}
+        # Per phrase length whose codes would overflow: {token tuple: (severity, negatable)}
+        self.long_phrases = {}
+        for length in sorted({len(key) for key in phrases}):
+            same_length = {key: (severity, key not in fixed) for key, severity in phrases.items() if len(key) == length}
+            if self.base ** length - 1 > MAX_WINDOW_CODE:
+                self.long_phrases[length] = same_length
+                continue
+            entries = sorted((self._encode(key), severity, negatable) for key, (severity, negatable) in same_length.items())
+            self.phrase_tables[length] = (
+                np.array([code for code, _, _ in entries], dtype=np.int64),
+                np.array([severity for _, severity, _ in entries], dtype=np.int8),
+                np.array([negatable for _, _, negatable in entries], dtype=bool)
+            )
+    
+    def _encode(self, ids):
+        code = 0
+        for token_id in ids:
+            code = code * self.base + token_id
+        return code
+    
+    def _match(self, ids, length):
+        """Start positions of lexicon phrases of one length in a token array, their severities and negatability"""
+        windows = np.lib.stride_tricks.sliding_window_view(ids, length)
+        if length in self.long_phrases:
+            phrases = self.long_phrases[length]
+            candidates = np.flatnonzero(np.isin(windows[:, 0], [key[0] for key in phrases]))
+            matched = [(start, *phrases[key]) for start in candidates
+                       if (key := tuple(windows[start].tolist())) in phrases]
+            return (np.array([start for start, _, _ in matched], dtype=np.int64),
+                    np.array([severity for _, severity, _ in matched], dtype=np.int8),
+                    np.array([negatable for _, _, negatable in matched], dtype=bool))
+        
+        codes, severities, negatable = self.phrase_tables[length]
+        window_codes = windows @ (self.base ** np.arange(length - 1, -1, -1, dtype=np.int64))
+        slots = np.searchsorted(codes, window_codes).clip(max=len(codes) - 1)
+        starts = np.flatnonzero(codes[slots] == window_codes)
+        return starts, severities[slots[starts]], negatable[slots[starts]]
+    
+    def tokenize_batch(self, messages):
+        """Map all messages to one token id array, each message preceded by a boundary token"""
+        token_ids = self.token_ids
+        ids = []
+        for message in messages:
+            ids.append(BOUNDARY_ID)
+            ids.extend(token_ids.get(fold_token(token), OTHER_ID)
+                       for token in TOKEN_PATTERN.findall(CANNOT_PATTERN.sub("cannot", message.lower())))
+        ids.append(BOUNDARY_ID)
+        return np.array(ids, dtype=np.int64)
+    
+    def levels(self, messages):
+        """Triage level per message: 0 routine, 1 urgent, 2 emergency"""
+        if isinstance(messages, str):
+            messages = [messages]
+        ids = self.tokenize_batch(messages)
+        positions = np.arange(len(ids))
+        
+        is_boundary = ids == BOUNDARY_ID
+        message_index = np.cumsum(is_boundary) - 1
+        last_negation = np.maximum.accumulate(np.where(ids == NEGATION_ID, positions, -1))
+        last_break = np.maximum.accumulate(np.where(is_boundary | (ids == BREAK_ID), positions, -1))
+        
+        levels = np.zeros(len(messages), dtype=np.int8)
+        for length in sorted({*self.phrase_tables, *self.long_phrases}):
+            if len(ids) < length:
+                continue
+            starts, severities, negatable = self._match(ids, length)
+            if not len(starts):
+                continue
+            
+            # Boundary tokens open every message, so a match never starts at 0
+            negation = last_negation[starts - 1]
+            negated = ((negation > last_break[starts - 1]) & (starts - negation <= NEGATION_WINDOW)
+                       & negatable)
+            np.maximum.at(levels, message_index[starts[~negated]], severities[~negated])
+        
+        return levels
+    
+    def classify(self, messages):
+        """Triage label per message: 'emergency', 'urgent' or 'routine'"""
+        return TRIAGE_LABELS[self.levels(messages)]
+
+_classifier = None
+
+def get_triage_classifier():
+    """Get the shared classifier compiled from the default lexicon"""
+    global _classifier
+    if _classifier is None:
+        _classifier = TriageClassifier()
+    return _classifier
+
+def triage_symptoms(messages):
+    """Triage a batch of free-text symptom reports into an array of labels"""
+    return get_triage_classifier().classify(messages)
@@ -0,0 +1,246 @@
+import json
+import os
+import time
+from datetime import datetime
+import numpy as np
+from utils.model_bundle import MODEL_DIR
+from utils.startup import lazy_import
+
+xgb = lazy_import('xgboost')
+
+TUNING_DIR = os.path.join(MODEL_DIR, "tuning")
+
+# Default wall-clock budget for one tuning run, in seconds
+TUNING_BUDGET_SECONDS = 120
+TUNING_FOLDS = 5
+# Successive halving: start with TUNING_CANDIDATES configurations, keep the
+# best 1/HALVING_FACTOR at every rung and give survivors HALVING_FACTOR times
+# more trees, so the last rung trains a single configuration at full size
+TUNING_CANDIDATES = 27
+HALVING_FACTOR = 3
+# XGBoost stops adding rounds once validation log loss has not improved for this many
+EARLY_STOPPING_ROUNDS = 20
+# Share of each training fold held out to pick the early stopping round; the
+# scoring fold never influences training
+EARLY_STOPPING_FRACTION = 0.15
+
+# Per model: the parameter grown across rungs, its full-size value and the sampled parameters
+SEARCH_SPACES = {
+    'random_forest': {
+        'resource': ('n_estimators', 400),
+        'params': {
+            'max_depth': [None, 4, 6, 8, 12],
+            'min_samples_leaf': [1, 2, 4, 8],
+            'max_features': ['sqrt', 'log2', 0.5, None]
+        }
+    },
+    'xgboost': {
+        'resource': ('n_estimators', 600),
+        'params': {
+            'learning_rate': [0.01, 0.03, 0.05, 0.1, 0.2, 0.3],
+            'max_depth': [2, 3, 4, 6, 8],
+            'min_child_weight': [1, 3, 5],
+            'subsample': [0.6, 0.8, 1.0],
+            'colsample_bytree': [0.6, 0.8, 1.0],
+            'reg_lambda': [0.1, 1.0, 10.0]
+        }
+    }
+}
+
+def build_model(model_name, params, n_jobs=None):
+    """Create an unfitted random forest or XGBoost classifier with the given parameters"""
+    if model_name == 'random_forest':
+        from sklearn.ensemble import RandomForestClassifier
+        return RandomForestClassifier(random_state=42, n_jobs=n_jobs, **params)
+    return xgb.XGBClassifier(random_state=42, n_jobs=n_jobs, **params)
+
+def sample_candidates(model_name, count, seed=42, include=None):
+    """Draw distinct random configurations from a model's search space.
+    
+    Configurations in include (e.g. the best one of an earlier run) come first.
+    """
+    rng = np.random.default_rng(seed)
+    space = SEARCH_SPACES[model_name]['params']
+    candidates = [dict(params) for params in include or []]
+    seen = {json.dumps(params, sort_keys=True) for params in candidates}
+    # The space may hold fewer distinct configurations than requested
+    for _ in range(count * 20):
+        if len(candidates) >= count:
+            break
+        params = {name: values[rng.integers(len(values))] for name, values in space.items()}
+        key = json.dumps(params, sort_keys=True)
+        if key not in seen:
+            seen.add(key)
+            candidates.append(params)
+    return candidates
+
+def _deadline_callback(deadline):
+    """XGBoost callback that stops boosting once the deadline has passed"""
+    class StopAtDeadline(xgb.callback.TrainingCallback):
+        def __init__(self):
+            super().__init__()
+            self.stopped = False
+        
+        def after_iteration(self, model, epoch, evals_log):
+            self.stopped = time.monotonic() > deadline
+            return self.stopped
+    
+    return StopAtDeadline()
+
+def _fit_and_score(model_name, params, X, y, train_index, test_index, deadline):
+    """Fit one configuration on one fold; returns (roc_auc, rounds) or None past the deadline"""
+    from sklearn.metrics import roc_auc_score
+    from sklearn.model_selection import train_test_split
+    
+    if time.monotonic() > deadline:
+        return None
+    # Every fold runs in its own worker, so each model uses a single thread
+    model = build_model(model_name, params, n_jobs=1)
+    X_train, X_test = X.iloc[train_index], X.iloc[test_index]
+    y_train, y_test = y.iloc[train_index], y.iloc[test_index]
+    
+    rounds = None
+    if model_name == 'xgboost':
+        # Early stopping watches an inner split of the training fold, so the fold's score stays unbiased
+        X_fit, X_valid, y_fit, y_valid = train_test_split(
+            X_train, y_train, test_size=EARLY_STOPPING_FRACTION, stratify=y_train, random_state=42)
+        stop_at_deadline = _deadline_callback(deadline)
+        model.set_params(early_stopping_rounds=EARLY_STOPPING_ROUNDS, eval_metric='logloss',
+                         callbacks=[stop_at_deadline])
+        model.fit(X_fit, y_fit, eval_set=[(X_valid, y_valid)], verbose=False)
+        if stop_at_deadline.stopped:
+            # Cut short, so not comparable with the other configurations of the rung
+            return None
+        rounds = model.best_iteration + 1
+    else:
+        model.fit(X_train, y_train)
+    return roc_auc_score(y_test, model.predict_proba(X_test)[:, 1]), rounds
+
+def successive_halving(model_name, X, y, deadline, include=None, folds=TUNING_FOLDS):
+    """Search one model's space with successive halving and k-fold cross-validation.
+    
+    Each rung cross-validates all surviving configurations in parallel across
+    cores (one job per configuration and fold), then keeps the top third for
+    the next rung with three times the trees. The cost per tree measured on
+    earlier rungs caps a rung's trees so it fits the remaining time; XGBoost
+    fits also stop boosting at the deadline. A rung with fits skipped or cut
+    short at the deadline is discarded, and the search returns the best
+    configuration of the last completed rung. Returns a dict with 'params',
+    'cv_auc' and 'history'.
+    """
+    from joblib import Parallel, delayed
+    from sklearn.model_selection import StratifiedKFold
+    
+    resource_name, max_resource = SEARCH_SPACES[model_name]['resource']
+    candidates = sample_candidates(model_name, TUNING_CANDIDATES, include=include)
+    splits = list(StratifiedKFold(n_splits=folds, shuffle=True, random_state=42).split(X, y))
+    rung_count = int(np.ceil(np.log(len(candidates)) / np.log(HALVING_FACTOR))) + 1
+    
+    best = None
+    history = []
+    # Wall-clock seconds per tree per fit, measured on the latest (largest) rung
+    tree_seconds = None
+    for rung in range(rung_count):
+        resource = max(1, int(max_resource / HALVING_FACTOR ** (rung_count - 1 - rung)))
+        fits = len(candidates) * folds
+        if tree_seconds is not None:
+            affordable = int((deadline - time.monotonic()) / (tree_seconds * fits))
+            if affordable < 1:
+                break
+            resource = min(resource, affordable)
+        configs = [{**params, resource_name: resource} for params in candidates]
+        
+        rung_start = time.monotonic()
+        results = Parallel(n_jobs=-1)(
+            delayed(_fit_and_score)(model_name, config, X, y, train_index, test_index, deadline)
+            for config in configs for train_index, test_index in splits
+        )
+        if any(result is None for result in results):
+            break
+        tree_seconds = (time.monotonic() - rung_start) / (resource * fits)
+        
+        fold_scores = np.array([score for score, _ in results]).reshape(len(configs), folds)
+        scores = fold_scores.mean(axis=1)
+        order = np.argsort(-scores, kind='stable')
+        best_config = dict(configs[order[0]])
+        if model_name == 'xgboost':
+            # Train the final model for as many rounds as early stopping found useful
+            fold_rounds = np.array([rounds for _, rounds in results]).reshape(len(configs), folds)
+            best_config[resource_name] = int(np.ceil(fold_rounds[order[0]].mean()))
+        best = {'params': best_config, 'cv_auc': float(scores[order[0]])}
+        history.append({
+            'rung': rung,
+            resource_name: resource,
+            'candidates': len(configs),
+            'best_cv_auc': float(scores[order[0]]),
+            'seconds_remaining': round(deadline - time.monotonic(), 1)
+        })
+        
+        candidates = [candidates[i] for i in order[:max(1, len(candidates) // HALVING_FACTOR)]]
+    
+    if best is None:
+        return None
+    return {**best, 'history': history}
+
+def tuning_results_path(data_hash):
+    return os.path.join(TUNING_DIR, f"{data_hash}.json")
+
+def load_tuning_results(data_hash):
+    """Get the saved tuning results of a dataset, or None if it was never tuned"""
+    if not data_hash:
+        return None
+    try:
+        with open(tuning_results_path(data_hash)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_tuning_results(data_hash, results):
+    """Write tuning results for a dataset, replacing any earlier file atomically"""
+    os.makedirs(TUNING_DIR, exist_ok=True)
+    path = tuning_results_path(data_hash)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    os.replace(tmp_path, path)
+
+def tune_hyperparameters(X, y, data_hash, budget_seconds=TUNING_BUDGET_SECONDS):
+    """Tune the random forest and XGBoost within a wall-clock budget.
+    
+    The budget is split evenly between the models, and time left over by one
+    model carries over to the next. When the same dataset was tuned before,
+    the previous best configuration competes again as the first candidate, and
+    it is kept if the new search runs out of time before beating it. Results are
+    saved under the dataset hash and returned as
+    {model: {'params', 'cv_auc', 'history'}} plus run metadata.
+    """
+    start = time.monotonic()
+    previous = load_tuning_results(data_hash) or {}
+    previous_models = previous.get('models', {})
+    
+    results = {}
+    model_names = list(SEARCH_SPACES)
+    for index, model_name in enumerate(model_names):
+        remaining = budget_seconds - (time.monotonic() - start)
+        deadline = time.monotonic() + remaining / (len(model_names) - index)
+        
+        earlier = previous_models.get(model_name)
+        resource_name = SEARCH_SPACES[model_name]['resource'][0]
+        include = [{k: v for k, v in earlier['params'].items() if k != resource_name}] if earlier else None
+        
+        found = successive_halving(model_name, X, y, deadline, include=include)
+        if earlier and (found is None or found['cv_auc'] < earlier['cv_auc']):
+            found = earlier
+        if found is not None:
+            results[model_name] = found
+    
+    tuning = {
+        'dataset_hash': data_hash,
+        'tuned_at': datetime.now().isoformat(),
+        'budget_seconds': budget_seconds,
+        'seconds': round(time.monotonic() - start, 1),
+        'models': results
+    }
+    if data_hash:
+        save_tuning_results(data_hash, tuning)
+    return tuning
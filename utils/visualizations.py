@@ -1,18 +1,17 @@
-import plotly.graph_objects as go
-import plotly.express as px
 import pandas as pd
 import numpy as np
 import streamlit as st
+from utils.models import RISK_THRESHOLDS, get_risk_category
+from utils.startup import lazy_import
+
+go = lazy_import('plotly.graph_objects')
+px = lazy_import('plotly.express')
 
 def create_risk_gauge(risk_score):
     """Create a gauge chart for risk visualization"""
     # Determine color based on risk level
-    if risk_score < 0.3:
-        color = "green"
-    elif risk_score < 0.7:
-        color = "yellow"
-    else:
-        color = "red"
+    color = {"Low Risk": "green", "Medium Risk": "yellow", "High Risk": "red"}[get_risk_category(risk_score)]
+    low_cutoff, high_cutoff = [threshold * 100 for threshold in RISK_THRESHOLDS]
     
     fig = go.Figure(go.Indicator(
         mode = "gauge+number+delta",
@@ -24,9 +23,9 @@ def create_risk_gauge(risk_score):
             'axis': {'range': [None, 100]},
             'bar': {'color': color},
             'steps': [
-                {'range': [0, 30], 'color': "lightgreen"},
-                {'range': [30, 70], 'color': "lightyellow"},
-                {'range': [70, 100], 'color': "lightcoral"}
+                {'range': [0, low_cutoff], 'color': "lightgreen"},
+                {'range': [low_cutoff, high_cutoff], 'color': "lightyellow"},
+                {'range': [high_cutoff, 100], 'color': "lightcoral"}
             ],
             'threshold': {
                 'line': {'color': "red", 'width': 4},
@@ -81,12 +80,13 @@ def create_shap_waterfall(shap_values, feature_names, input_values):
     
     return fig
 
-def create_feature_importance_chart(feature_names, importances):
-    """Create feature importance chart"""
+def create_feature_importance_chart(feature_names, importances, errors=None, xaxis_title="Importance Score"):
+    """Create feature importance chart from precomputed importances (optionally with error bars)"""
     if feature_names is None or importances is None:
         return None
     
     # Sort by importance
+    importances = np.asarray(importances)
     indices = np.argsort(importances)[-10:]  # Top 10 features
     sorted_importance = importances[indices]
     sorted_features = [feature_names[i] for i in indices]
@@ -94,13 +94,14 @@ def create_feature_importance_chart(feature_names, importances):
     fig = go.Figure(go.Bar(
         y=sorted_features,
         x=sorted_importance,
+        error_x=dict(type='data', array=np.asarray(errors)[indices]) if errors is not None else None,
         orientation='h',
         marker_color='lightblue'
     ))
     
     fig.update_layout(
         title="Feature Importance",
-        xaxis_title="Importance Score",
+        xaxis_title=xaxis_title,
         yaxis_title="Features",
         paper_bgcolor="rgba(0,0,0,0)",
         plot_bgcolor="rgba(0,0,0,0)",
@@ -110,6 +111,81 @@ def create_feature_importance_chart(feature_names, importances):
     
     return fig
 
+def create_dependence_chart(curves, feature_label, user_value=None, user_risk=None, height=350):
+    """Chart precomputed partial dependence and ICE curves, with the user's position overlaid.
+    
+    The user's marker sits at their own value and risk; 'nearest_ice', when
+    present, is shifted to pass through it as an estimate of the user's own curve.
+    """
+    if curves is None:
+        return None
+    
+    grid = np.asarray(curves['grid'])
+    fig = go.Figure()
+    
+    for i, ice in enumerate(np.asarray(curves['ice'], dtype=float)):
+        fig.add_trace(go.Scatter(
+            x=grid, y=ice * 100, mode='lines', line=dict(color='rgba(173, 216, 230, 0.25)', width=1),
+            name="Individual patients", legendgroup="ice", showlegend=(i == 0), hoverinfo='skip'
+        ))
+    
+    fig.add_trace(go.Scatter(
+        x=grid, y=np.asarray(curves['partial_dependence']) * 100, mode='lines',
+        line=dict(color='lightcoral', width=3), name="Average effect"
+    ))
+    
+    if user_value is not None and user_risk is not None:
+        if 'nearest_ice' in curves:
+            nearest = np.asarray(curves['nearest_ice'], dtype=float)
+            shifted = nearest - np.interp(user_value, grid, nearest) + user_risk
+            fig.add_trace(go.Scatter(
+                x=grid, y=np.clip(shifted, 0, 1) * 100, mode='lines',
+                line=dict(color='orange', width=2, dash='dash'), name="Patients like you"
+            ))
+        fig.add_trace(go.Scatter(
+            x=[user_value], y=[user_risk * 100], mode='markers',
+            marker=dict(color='white', size=12, line=dict(color='orange', width=2)), name="You"
+        ))
+    
+    fig.update_layout(
+        title=f"Impact of {feature_label}",
+        xaxis_title=feature_label,
+        yaxis_title="Risk (%)",
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(0,0,0,0)",
+        font={'color': "white"},
+        height=height
+    )
+    
+    return fig
+
+def create_risk_shift_chart(edges, baseline_counts, scenario_counts, title="Risk Distribution"):
+    """Overlay a cohort's risk histogram before and after a simulated intervention"""
+    baseline_counts = np.asarray(baseline_counts, dtype=float)
+    scenario_counts = np.asarray(scenario_counts, dtype=float)
+    if baseline_counts.sum() == 0:
+        return None
+    
+    centers = (np.asarray(edges[:-1]) + np.asarray(edges[1:])) / 2 * 100
+    fig = go.Figure()
+    fig.add_trace(go.Bar(x=centers, y=baseline_counts / baseline_counts.sum() * 100, name="Current",
+                         marker_color='lightblue', opacity=0.7))
+    fig.add_trace(go.Bar(x=centers, y=scenario_counts / scenario_counts.sum() * 100, name="With intervention",
+                         marker_color='lightcoral', opacity=0.7))
+    
+    fig.update_layout(
+        title=title,
+        barmode='overlay',
+        xaxis_title="Risk (%)",
+        yaxis_title="Share of cohort (%)",
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(0,0,0,0)",
+        font={'color': "white"},
+        height=350
+    )
+    
+    return fig
+
 def create_risk_trend_chart(history_df):
     """Create risk trend over time"""
     if history_df.empty: